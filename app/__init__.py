@@ -1,6 +1,7 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 from http import HTTPStatus
-from typing import Optional
+from pathlib import Path
+from typing import Iterable, Optional
 
 import click
 from flasgger import Swagger
@@ -9,16 +10,38 @@ from flask.cli import with_appcontext
 from flask.json import jsonify
 from flask.logging import create_logger
 from flask_jwt_extended import JWTManager
+from flask_jwt_extended.exceptions import UserLookupError
 from flask_migrate import Migrate
+from werkzeug.local import LocalProxy
 
-from .api import api_v1
+from .api import api_v1, well_known
 from .core.alchemy import db, init_alchemy
 from .core.config import JWTSettings
-from .core.redis import redis
+from .core.enums import ImportCollision, ImportFormat
+from .core.export import export_sessions, export_users, gzip_chunks
 from .core import tracing
-from .core import limiter
+from .core import keys, limiter
+from .core.blocklist import blocklist
+from .core.hashing import HashingUnavailable
+from .core.partitions import (
+    ExpiredAction,
+    PartitionManager,
+    Period,
+    partition_manager,
+)
+from .core.redis import keyspace_usage, redis_factory
+from .core.role_catalog import role_catalog
+from .core.session_writer import session_writer
+from .core.user_cache import user_cache
+from .core.user_import import (
+    ImportCollisionError,
+    ImportReport,
+    UserImporter,
+    load_checkpoint,
+    read_records,
+)
 from .models.db_models import User
-from .serializers.auth import ErrorBody
+from .utils import load_roles, load_user_from_replica
 
 app = Flask(__name__)
 swagger = Swagger(app)
@@ -30,14 +53,15 @@ migrate = Migrate(app, db)
 
 # Setup the Flask-JWT-Extended extension
 jwt_conf = JWTSettings()
-app.config["JWT_SECRET_KEY"] = jwt_conf.secret
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=jwt_conf.access_exp)
 app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=jwt_conf.refresh_exp)
 app.config["JWT_ERROR_MESSAGE_KEY"] = "error"
 jwt = JWTManager(app)
+keys.setup(app, jwt)
 
 # Setup routing
 app.register_blueprint(api_v1)
+app.register_blueprint(well_known)
 
 
 # cli create superuser
@@ -56,28 +80,197 @@ def create_superuser(username: str, password: str):
     db.session.commit()
 
 
+# cli manage JWT signing keys
+@app.cli.group("jwt-keys")
+def jwt_keys():
+    """Manage asymmetric JWT signing keys."""
+
+
+@jwt_keys.command("generate")
+@click.option("--kid", required=True, help="Key id, e.g. 2022-03-20")
+@click.option(
+    "--algorithm", "-a", type=click.Choice(list(keys.ALGORITHMS)), default="RS256"
+)
+@click.option("--keys-dir", default=lambda: jwt_conf.keys_dir, required=True)
+def generate_jwt_key(kid: str, algorithm: str, keys_dir: str):
+    path = keys.generate_key(keys_dir, kid, algorithm)
+    click.echo(f"{algorithm} key saved to {path}")
+
+
+# cli report redis memory by key family
+@app.cli.command("redis-usage")
+@click.option("--match", default="*", help="SCAN pattern")
+@click.option("--count", default=1000, help="SCAN batch size")
+def redis_usage(match: str, count: int):
+    rows = keyspace_usage(match, count)
+    click.echo(f"{'family':<24}{'keys':>12}{'bytes':>16}{'avg':>10}")
+    for family, keys_count, usage in rows:
+        avg = usage // keys_count
+        click.echo(f"{family:<24}{keys_count:>12}{usage:>16}{avg:>10}")
+
+
+# cli maintain sessions partitions
+@app.cli.command("sessions-partitions")
+@click.option("--period", type=click.Choice([period.value for period in Period]))
+@click.option("--ahead", type=int, help="Periods to create in advance")
+@click.option("--retention", type=int, help="Periods to keep, older are expired")
+@click.option(
+    "--expire",
+    type=click.Choice([action.value for action in ExpiredAction]),
+    help="Detach or drop expired partitions",
+)
+@click.option("--dry-run", is_flag=True, help="Show changes without applying")
+@with_appcontext
+def sessions_partitions(
+    period: str, ahead: int, retention: int, expire: str, dry_run: bool
+):
+    overrides = {
+        "period": period,
+        "ahead": ahead,
+        "retention": retention,
+        "expired_action": expire,
+    }
+    settings = partition_manager.settings.copy(
+        update={key: value for key, value in overrides.items() if value is not None}
+    )
+    report = PartitionManager(settings).run(dry_run=dry_run)
+    if not report.locked:
+        click.echo("Partitions are being maintained by another process")
+        return
+    for status in ("created", "existing", "skipped", "expired"):
+        for name in getattr(report, status):
+            click.echo(f"{status:<10}{name}")
+
+
+# cli bulk import users from legacy system
+@app.cli.command("import-users")
+@click.argument("source", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("--format", "fmt", type=click.Choice([f.value for f in ImportFormat]))
+@click.option(
+    "--on-conflict",
+    type=click.Choice([policy.value for policy in ImportCollision]),
+    default=ImportCollision.skip.value,
+    help="What to do with logins that already exist",
+)
+@click.option("--batch-size", default=5000, help="Records per transaction")
+@click.option("--workers", type=int, help="Hashing processes, 0 hashes inline")
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Progress file, defaults to <source>.checkpoint",
+)
+@click.option("--restart", is_flag=True, help="Ignore saved progress")
+@with_appcontext
+def import_users(
+    source: Path,
+    fmt: Optional[str],
+    on_conflict: str,
+    batch_size: int,
+    workers: Optional[int],
+    checkpoint: Optional[Path],
+    restart: bool,
+):
+    fmt = ImportFormat(fmt or ("jsonl" if source.suffix == ".jsonl" else "csv"))
+    checkpoint = checkpoint or source.with_name(f"{source.name}.checkpoint")
+    report = None if restart else load_checkpoint(checkpoint, source)
+    if report:
+        click.echo(f"Resuming after record {report.processed}")
+    else:
+        report = ImportReport(source=str(source.resolve()))
+
+    def progress(current: ImportReport):
+        click.echo(
+            f"processed {current.processed} created {current.created} "
+            f"updated {current.updated} skipped {current.skipped} "
+            f"invalid {current.invalid} ({current.rate:.0f} records/s)"
+        )
+
+    importer = UserImporter(ImportCollision(on_conflict), batch_size, workers)
+    try:
+        importer.run(read_records(source, fmt), report, checkpoint, progress)
+    except ImportCollisionError as exc:
+        raise click.ClickException(str(exc)) from exc
+    click.echo(
+        f"Done: roles granted {report.roles_granted}, "
+        f"social accounts attached {report.social_attached}"
+    )
+
+
+# cli dump users and sessions history
+@app.cli.group("export")
+def export():
+    """Stream NDJSON dumps, gzipped when output ends with .gz"""
+
+
+@export.command("users")
+@click.option("--role", help="Only users having the role")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default="-")
+@with_appcontext
+def export_users_command(role: Optional[str], output: str):
+    _write_chunks(export_users(role), output)
+
+
+@export.command("sessions")
+@click.option("--since", type=click.DateTime(), help="Naive UTC lower bound")
+@click.option("--until", type=click.DateTime(), help="Naive UTC upper bound")
+@click.option("--role", help="Only sessions of users having the role")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default="-")
+@with_appcontext
+def export_sessions_command(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    role: Optional[str],
+    output: str,
+):
+    _write_chunks(export_sessions(since, until, role), output)
+
+
+def _write_chunks(chunks: Iterable[bytes], output: str):
+    if output.endswith(".gz"):
+        chunks = gzip_chunks(chunks)
+    with click.open_file(output, "wb") as target:
+        for chunk in chunks:
+            target.write(chunk)
+
+
 # noinspection PyUnusedLocal
 @app.errorhandler(HTTPStatus.FORBIDDEN)
 def permission_denied(exc: BaseException):
     return jsonify({"error": "You don't have permissions"}), HTTPStatus.FORBIDDEN
 
 
+# noinspection PyUnusedLocal
+@app.errorhandler(HashingUnavailable)
+def hashing_unavailable(exc: BaseException):
+    return (
+        jsonify({"error": "Service is busy, please try again later"}),
+        HTTPStatus.SERVICE_UNAVAILABLE,
+    )
+
+
 # noinspection PyUnusedLocal
 @jwt.token_in_blocklist_loader
 def check_if_token_is_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token_in_redis = redis.get(jti)
-    return token_in_redis is not None
+    return blocklist.is_revoked(jwt_payload["jti"])
 
 
 @jwt.user_lookup_loader
-def user_lookup_callback(_jwt_header, jwt_data):
+def user_lookup_callback(jwt_header, jwt_data):
+    # Loaded on first access, so handlers authorized by claims alone
+    # don't touch the cache or database
     identity = jwt_data["sub"]["user_id"]
-    user = User.query.filter_by(id=identity).one_or_none()
-    if not user:
-        msg = "Something went wrong"
-        return ErrorBody(error=msg), HTTPStatus.CONFLICT
-    return user
+    loaded = []
+
+    def resolve():
+        if not loaded:
+            user = user_cache.get_or_load(identity, load_user_from_replica)
+            if not user:
+                msg = "Something went wrong"
+                raise UserLookupError(msg, jwt_header, jwt_data)
+            loaded.append(user)
+        return loaded[0]
+
+    return LocalProxy(resolve)
 
 
 @app.route("/health")
@@ -103,11 +296,82 @@ def health_handler():
     return {"success": True}
 
 
+@app.route("/stats")
+def stats_handler():
+    """Show worker cache and Redis pool statistics
+    ---
+    tags:
+      - utils
+    produces:
+      - application/json
+    schemes: ['http', 'https']
+    definitions:
+      CacheStats:
+        type: object
+        properties:
+          local_hits:
+            type: integer
+          redis_hits:
+            type: integer
+          misses:
+            type: integer
+          invalidations:
+            type: integer
+          local_size:
+            type: integer
+      BlocklistStats:
+        type: object
+        properties:
+          local_answers:
+            type: integer
+          redis_checks:
+            type: integer
+          fail_mode_answers:
+            type: integer
+          size:
+            type: integer
+          sync_lag:
+            type: number
+      RedisPoolStats:
+        type: object
+        properties:
+          max_connections:
+            type: integer
+          created:
+            type: integer
+          in_use:
+            type: integer
+          idle:
+            type: integer
+    responses:
+      200:
+        schema:
+          type: object
+          properties:
+            user_cache:
+              $ref: '#/definitions/CacheStats'
+            blocklist:
+              $ref: '#/definitions/BlocklistStats'
+            redis:
+              $ref: '#/definitions/RedisPoolStats'
+    """
+    return {
+        "user_cache": user_cache.stats(),
+        "blocklist": blocklist.stats(),
+        "redis": redis_factory.stats(),
+    }
+
+
 @app.before_first_request
 def on_startup():
     """Prepare application and services."""
     limiter.setup(app)
     tracing.setup(app)
+    role_catalog.ensure_fresh(load_roles)
+    user_cache.start_listener()
+    blocklist.start_listener()
+    session_writer.start(app)
+    partition_manager.start_scheduler(app)
 
 
 @app.teardown_request
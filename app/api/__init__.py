@@ -1,6 +1,9 @@
+__all__ = ["api_v1", "well_known"]
+
 from flask import Blueprint
 
 from .v1 import v1
+from .well_known import well_known
 
 api_v1 = Blueprint("api_v1", __name__, url_prefix="/api")
 api_v1.register_blueprint(v1)
@@ -1,8 +1,9 @@
 from datetime import timedelta
 from http import HTTPStatus
-from secrets import compare_digest
+from typing import Optional
+from uuid import uuid4
 
-from flask import Blueprint, request
+from flask import Blueprint, after_this_request, request
 from flask_jwt_extended import (
     current_user,
     decode_token,
@@ -11,20 +12,41 @@ from flask_jwt_extended import (
     jwt_required,
 )
 from flask_pydantic import validate
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
 
-from app.core.alchemy import db
-from app.core.redis import redis
+from app.core import versions
+from app.core.alchemy import db, replica_reads
+from app.core.blocklist import blocklist
+from app.core.config import JWTSettings
+from app.core.enums import Rotation
+from app.core.green import overlap
+from app.core.refresh_tokens import refresh_tokens
+from app.core.serialization import serializer
+from app.core.session_writer import LoginEvent, session_writer
+from app.core.user_cache import user_cache
 from app.models.db_models import Session, User
 from app.serializers.auth import (
     ErrorBody,
     HistoryBody,
+    HistoryCursor,
+    HistoryQueryBody,
+    IntrospectBody,
+    IntrospectResultBody,
     LoginBody,
     OkBody,
     RefreshBody,
     RegisterBody,
     UserBody,
 )
-from app.utils import get_new_tokens
+from app.utils import (
+    create_tokens,
+    etag,
+    history_marker,
+    introspect_tokens,
+    issue_tokens,
+    load_user,
+)
 
 auth = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -47,6 +69,7 @@ def registration(body: RegisterBody):
     new_user.set_password(body.password)
     db.session.add(new_user)
     db.session.commit()
+    versions.bump(versions.USERS_VERSION_KEY)
     return UserBody(id=new_user.id, login=new_user.login), HTTPStatus.CREATED
 
 
@@ -71,68 +94,178 @@ def change_password(body: RegisterBody):
     user.login = body.login
     user.set_password(body.password)
     db.session.commit()
+    user_cache.invalidate(user.id)
+    versions.bump(versions.USERS_VERSION_KEY)
     return UserBody(id=user.id, login=user.login), HTTPStatus.ACCEPTED
 
 
 @auth.route("/login", methods=["POST"])
 @validate()
 def login(body: LoginBody):
-    user = User.query.filter_by(login=body.login).one_or_none()
+    """
+    Load user with roles in one query, check password and issue tokens
+    Session row is inserted in the same transaction or buffered by write-behind
+    writer, refresh token is stored in redis while the session is written
+    """
+    user = (
+        User.query.options(joinedload(User.roles))
+        .filter_by(login=body.login)
+        .one_or_none()
+    )
     if not user or not user.check_password(body.password):
         msg = "User with this credentials does not exist"
         return ErrorBody(error=msg), HTTPStatus.CONFLICT
-    session = Session(user=user, user_agent=request.user_agent.string)
-    db.session.add(session)
+
+    # Upgrade hash made with outdated parameters, commits with the session
+    if user.password_needs_rehash():
+        user.set_password(body.password)
+
+    user_agent = request.user_agent.string
+    tokens, store = issue_tokens(user, user_agent)
+    storing = overlap(store)
+    session_writer.record(user.id, user_agent)
     db.session.commit()
-    return get_new_tokens(user, request.user_agent.string)
+    storing.get()
+    versions.bump_sessions(user.id)
+    return tokens
 
 
 @auth.route("/history", methods=["GET"])
-@validate(response_many=True)
 @jwt_required()
-def auth_history():
-    page = request.args.get("page", default=1, type=int)
-    page_size = request.args.get("page_size", default=10, type=int)
+@etag(history_marker)
+@validate()
+@replica_reads()
+def auth_history(query: HistoryQueryBody):
+    """
+    Return user login history newest first, page by page
+    Next page cursor is sent in X-Next-Cursor header, total count is sent
+    in X-Total-Count header only when asked with `count=true`
+    Deprecated `page` is still served with offset, marked by Deprecation header
+    """
     user_uuid = get_current_user().id
-    history = Session.query.filter_by(user_id=user_uuid).paginate(
-        page, per_page=page_size
+    queryset = db.session.query(
+        Session.id, Session.user_agent, Session.auth_date
+    ).filter(Session.user_id == user_uuid)
+    # Bounds on auth_date let postgres skip unrelated partitions
+    if query.since:
+        queryset = queryset.filter(Session.auth_date >= query.since)
+    if query.until:
+        queryset = queryset.filter(Session.auth_date < query.until)
+    # Latest login may still wait in write-behind buffer, it is the newest row
+    pending = _pending_login(user_uuid, query)
+    total = queryset.count() + bool(pending) if query.count else None
+
+    cursor = query.cursor
+    if cursor:
+        queryset = queryset.filter(
+            Session.auth_date <= cursor.auth_date,
+            tuple_(Session.auth_date, Session.id)
+            < tuple_(cursor.auth_date, cursor.session_id),
+        )
+    offset = (query.page - 1) * query.page_size if query.page else 0
+    head = [pending] if pending and not cursor and not offset else []
+    if pending and offset:
+        # Pending login holds a slot of the first page
+        offset -= 1
+    sessions = head + (
+        queryset.order_by(Session.auth_date.desc(), Session.id.desc())
+        .offset(offset)
+        .limit(query.page_size + 1 - len(head))
+        .all()
     )
 
-    return [
-        HistoryBody(user_agent=row.user_agent, auth_date=row.auth_date)
-        for row in history.items
+    next_cursor = None
+    if len(sessions) > query.page_size:
+        sessions = sessions[: query.page_size]
+        next_cursor = HistoryCursor(sessions[-1].auth_date, sessions[-1].id)
+
+    @after_this_request
+    def add_pagination_headers(response):
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = str(next_cursor)
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+        if query.page:
+            response.headers["Deprecation"] = "true"
+        return response
+
+    rows = [
+        {"user_agent": row.user_agent, "auth_date": row.auth_date} for row in sessions
     ]
+    return serializer.response(rows, HistoryBody, many=True)
 
 
 @auth.route("/refresh", methods=["POST"])
 @validate()
 def refresh(body: RefreshBody):
+    """
+    Rotate refresh token with a single atomic check in redis
+    Reuse of an already rotated token revokes the whole token family
+    """
     claims = decode_token(body.refresh_token)
-    user_id = claims["sub"]["user_id"]
-    user = User.query.filter_by(id=user_id).one_or_none()
+    if claims["type"] != "refresh" or "fam" not in claims:
+        msg = "Refresh token not valid"
+        return ErrorBody(error=msg), HTTPStatus.CONFLICT
+
+    user = user_cache.get_or_load(claims["sub"]["user_id"], load_user)
     if not user:
         msg = "Something went wrong"
         return ErrorBody(error=msg), HTTPStatus.CONFLICT
 
-    refresh_key = f"{user.id}_{request.user_agent.string}"
-    refresh_token = redis.get(refresh_key)
-    if not compare_digest(refresh_token, body.refresh_token):
+    jti = str(uuid4())
+    tokens = create_tokens(user, jti, claims["fam"])
+    rotation = refresh_tokens.rotate(
+        user.id,
+        request.user_agent.string,
+        claims["jti"],
+        claims["fam"],
+        jti,
+        ttl=timedelta(days=JWTSettings().refresh_exp),
+    )
+    if rotation == Rotation.reused:
+        msg = "Refresh token was already used, please log in again"
+        return ErrorBody(error=msg), HTTPStatus.CONFLICT
+    if rotation != Rotation.rotated:
         msg = "Refresh token not valid"
         return ErrorBody(error=msg), HTTPStatus.CONFLICT
+    return tokens
 
-    redis.delete(refresh_key)
-    return get_new_tokens(user, request.user_agent.string)
+
+@auth.route("/introspect", methods=["POST"])
+@validate()
+def introspect(body: IntrospectBody):
+    """
+    Validate a batch of tokens at once
+    Return validity, expiry, subject and roles for every token in request order
+    """
+    return IntrospectResultBody(results=introspect_tokens(body.tokens))
 
 
 @auth.route("/logout", methods=["POST"])
 @validate()
 @jwt_required()
 def logout():
-    jti = get_jwt()["jti"]
-    redis.set(jti, "", ex=timedelta(hours=1))
+    claims = get_jwt()
+    blocklist.revoke(claims["jti"], claims["exp"])
 
-    refresh_key = f"{current_user.id}_{request.user_agent.string}"
-    redis.delete(refresh_key)
+    refresh_tokens.revoke(current_user.id, request.user_agent.string)
 
     msg = "User successfully logout"
     return OkBody(result=msg), HTTPStatus.CREATED
+
+
+def _pending_login(user_id, query: HistoryQueryBody) -> Optional[LoginEvent]:
+    """Return latest login within bounds if it is not in the database yet."""
+    last_login = session_writer.last_login(user_id)
+    if (
+        last_login is None
+        or (query.since is not None and last_login.auth_date < query.since)
+        or (query.until is not None and last_login.auth_date >= query.until)
+    ):
+        return None
+    written = db.session.query(
+        db.exists().where(
+            Session.auth_date == last_login.auth_date, Session.id == last_login.id
+        )
+    ).scalar()
+    return None if written else last_login
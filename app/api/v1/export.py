@@ -0,0 +1,41 @@
+from flask import Blueprint, Response, request, stream_with_context
+from flask_pydantic import validate
+
+from app.core.enums import DefaultRole
+from app.core.export import export_sessions, export_users, gzip_chunks
+from app.serializers.export import ExportSessionsQueryBody, ExportUsersQueryBody
+from app.utils import permissions_required
+
+export = Blueprint("export", __name__, url_prefix="/export")
+
+NDJSON = "application/x-ndjson"
+
+
+@export.route("/users", methods=["GET"])
+@validate()
+@permissions_required(DefaultRole.admin)
+def users_export(query: ExportUsersQueryBody):
+    """
+    Stream all users with role names as NDJSON, optionally of one role
+    """
+    return _stream_response(export_users(query.role))
+
+
+@export.route("/sessions", methods=["GET"])
+@validate()
+@permissions_required(DefaultRole.admin)
+def sessions_export(query: ExportSessionsQueryBody):
+    """
+    Stream login history as NDJSON, optionally within `since` and `until`
+    and of users having given role
+    """
+    return _stream_response(export_sessions(query.since, query.until, query.role))
+
+
+def _stream_response(chunks) -> Response:
+    # Body is sent chunked while rows are read, nothing is buffered
+    headers = {}
+    if "gzip" in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(chunks), mimetype=NDJSON, headers=headers)
@@ -4,10 +4,11 @@ from flask import Blueprint, request
 from flask_jwt_extended import get_current_user, jwt_required
 from flask_pydantic import validate
 
-from app.core import config
+from app.core import config, versions
 from app.core.alchemy import db
 from app.core.oauth import OAuthSignIn
-from app.models.db_models import Session, SocialAccount, User
+from app.core.session_writer import session_writer
+from app.models.db_models import SocialAccount, User
 from app.serializers.auth import ErrorBody, OkBody
 from app.utils import generate_password, get_new_tokens
 
@@ -85,11 +86,9 @@ def oauth_callback(provider: str):
 
     # Authorization logic
     if social_account and not user:
-        session = Session(
-            user=social_account.user, user_agent=request.user_agent.string
-        )
-        db.session.add(session)
+        session_writer.record(social_account.user_id, request.user_agent.string)
         db.session.commit()
+        versions.bump_sessions(social_account.user_id)
         return get_new_tokens(social_account.user, request.user_agent.string)
 
     # Registration logic
@@ -99,6 +98,7 @@ def oauth_callback(provider: str):
         user.set_password(generated_password)
         db.session.add(user)
         db.session.commit()
+        versions.bump(versions.USERS_VERSION_KEY)
 
     # Add social_account logic
     if social_account:
@@ -110,9 +110,9 @@ def oauth_callback(provider: str):
 
     # If registration logic
     if generated_password:
-        session = Session(user=user, user_agent=request.user_agent.string)
-        db.session.add(session)
+        session_writer.record(user.id, request.user_agent.string)
         db.session.commit()
+        versions.bump_sessions(user.id)
         return get_new_tokens(user, request.user_agent.string)
 
     msg = f"{provider} account successfully attached"
@@ -1,65 +1,103 @@
 from http import HTTPStatus
+from typing import List
+from uuid import UUID
 
 from flask import Blueprint
 from flask_pydantic import validate
+from sqlalchemy.exc import IntegrityError
 
-from app.core.alchemy import db
+from app.core.alchemy import db, replica_reads
 from app.core.enums import DefaultRole
-from app.models.db_models import Role
+from app.core.role_catalog import role_catalog
+from app.core.serialization import serializer
+from app.core.user_cache import user_cache
+from app.models.db_models import Role, users_roles
 from app.serializers.auth import ErrorBody, OkBody
 from app.serializers.roles import RoleBody
-from app.utils import permissions_required
+from app.utils import etag, load_roles, permissions_required, roles_marker
 
 roles = Blueprint("roles", __name__, url_prefix="/roles")
 
 
 @roles.route("/", methods=["GET"])
-@validate(response_many=True)
 @permissions_required(DefaultRole.admin)
+@etag(roles_marker)
+@validate()
+@replica_reads()
 def roles_list():
-    return [RoleBody(id=role.id, name=role.name) for role in Role.query.all()]
+    role_catalog.ensure_fresh(load_roles)
+    rows = [{"id": role_id, "name": name} for role_id, name in role_catalog.roles()]
+    return serializer.response(rows, RoleBody, many=True)
 
 
 @roles.route("/", methods=["POST"])
 @validate()
-@permissions_required(DefaultRole.admin)
+@permissions_required(DefaultRole.admin, fresh=True)
 def create_role(body: RoleBody):
-    name_exist = Role.query.filter_by(name=body.name).one_or_none()
-    if name_exist:
+    role_catalog.ensure_fresh(load_roles)
+    if role_catalog.id(body.name) is not None:
         msg = "Role with this name already exist"
         return ErrorBody(error=msg), HTTPStatus.CONFLICT
     role = Role(**body.dict())
     db.session.add(role)
-    db.session.commit()
+    # Catalog may be a moment behind, unique constraint has the last word
+    if not _commit_unique_name():
+        msg = "Role with this name already exist"
+        return ErrorBody(error=msg), HTTPStatus.CONFLICT
+    role_catalog.bump(load_roles)
     return RoleBody(id=role.id, name=role.name), HTTPStatus.CREATED
 
 
-@roles.route("/<role_id>/", methods=["PATCH"])
+@roles.route("/<int:role_id>/", methods=["PATCH"])
 @validate()
-@permissions_required(DefaultRole.admin)
+@permissions_required(DefaultRole.admin, fresh=True)
 def update_role(role_id: int, body: RoleBody):
-    role = Role.query.filter_by(id=role_id).one_or_none()
+    role_catalog.ensure_fresh(load_roles)
+    role = Role.query.get(role_id)
     if not role:
         msg = "No role with this id"
         return ErrorBody(error=msg), HTTPStatus.NOT_FOUND
-    name_exist = Role.query.filter_by(name=body.name).one_or_none()
-    if name_exist:
+    if role_catalog.id(body.name) is not None:
         msg = "Role with this name already exist"
         return ErrorBody(error=msg), HTTPStatus.CONFLICT
     role.name = body.name
-    db.session.commit()
+    if not _commit_unique_name():
+        msg = "Role with this name already exist"
+        return ErrorBody(error=msg), HTTPStatus.CONFLICT
+    role_catalog.bump(load_roles)
+    user_cache.invalidate(*_member_ids(role.id))
     return RoleBody(id=role.id, name=role.name)
 
 
-@roles.route("/<role_id>/", methods=["DELETE"])
+@roles.route("/<int:role_id>/", methods=["DELETE"])
 @validate()
-@permissions_required(DefaultRole.admin)
+@permissions_required(DefaultRole.admin, fresh=True)
 def delete_role(role_id: int):
-    role = Role.query.filter_by(id=role_id).one_or_none()
+    role = Role.query.get(role_id)
     if not role:
         msg = "No role with this id"
         return ErrorBody(error=msg), HTTPStatus.NOT_FOUND
+    affected_users = _member_ids(role.id)
     db.session.delete(role)
     db.session.commit()
+    role_catalog.bump(load_roles)
+    user_cache.invalidate(*affected_users)
     msg = "Role successfully deleted"
     return OkBody(result=msg), HTTPStatus.NO_CONTENT
+
+
+def _member_ids(role_id: int) -> List[UUID]:
+    """Return ids of users with the role without loading the users."""
+    query = db.session.query(users_roles.c.user_id).filter(
+        users_roles.c.role_id == role_id
+    )
+    return [user_id for user_id, in query]
+
+
+def _commit_unique_name() -> bool:
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
@@ -1,58 +1,110 @@
+from collections import defaultdict
 from http import HTTPStatus
+from math import ceil
+from typing import List, Set, Tuple
+from uuid import UUID
 
 from flask import request, Blueprint
 from flask_pydantic import validate
-from sqlalchemy import func
+from sqlalchemy import Integer, String, cast, column, delete, select, values
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
 
-from app.core.alchemy import db
-from app.core.enums import DefaultRole
-from app.models.db_models import Role, User
+from app.core import versions
+from app.core.alchemy import db, estimate_count, replica_reads
+from app.core.enums import DefaultRole, RoleAction, RoleActionResult
+from app.core.serialization import serializer
+from app.core.user_cache import user_cache
+from app.models.db_models import Role, User, users_roles
 from app.serializers.auth import ErrorBody, UserBody
 from app.serializers.roles import RoleBody
 from app.serializers.users import (
     PaginationUsersBody,
     QueryPaginationBody,
+    RoleOperationBody,
+    RoleOperationResultBody,
+    RolesBatchBody,
+    RolesBatchResultBody,
     UserRolesBody,
 )
-from app.utils import permissions_required
+from app.utils import etag, login_filter, permissions_required, users_marker
 
 users = Blueprint("users", __name__, url_prefix="/users")
 
+OPERATION_DONE = {
+    RoleAction.grant: RoleActionResult.granted,
+    RoleAction.revoke: RoleActionResult.revoked,
+}
+OPERATION_NOOP = {
+    RoleAction.grant: RoleActionResult.already_granted,
+    RoleAction.revoke: RoleActionResult.not_granted,
+}
+
 
 @users.route("/", methods=["GET"])
-@validate()
 @permissions_required(DefaultRole.admin)
+@etag(users_marker)
+@validate()
+@replica_reads()
 def get_user_roles(query: QueryPaginationBody):
+    """
+    List users with roles ordered by login
+    Search by login prefix or, with `match=contains`, by substring
+    Pass last login of the page in `after` to get the next one without offset,
+    such page has no number, so `page` and `total_pages` are null
+    Total count is planner estimate unless `exact_count` is asked
+    """
+    queryset = User.query
     if query.search:
-        queryset = User.query.filter(
-            func.lower(User.login).startswith(query.search.lower())
-        ).order_by(User.login)
+        queryset = queryset.filter(login_filter(query.search, query.match))
+
+    if query.exact_count:
+        count = queryset.order_by(None).count()
     else:
-        queryset = User.query.order_by(User.login)
+        count = estimate_count(queryset)
 
-    pagination = queryset.paginate(
-        page=query.page, per_page=query.per_page, error_out=False
-    )
+    page_query = queryset.with_entities(User.id, User.login).order_by(User.login)
+    if query.after is not None:
+        page_query = page_query.filter(User.login > query.after)
+    else:
+        page_query = page_query.offset((query.page - 1) * query.per_page)
+    page_users = page_query.limit(query.per_page + 1).all()
 
-    results = [
-        UserRolesBody(
-            user=UserBody(id=user.id, login=user.login),
-            roles=[RoleBody(id=role.id, name=role.name) for role in user.roles],
+    next_after = None
+    if len(page_users) > query.per_page:
+        page_users = page_users[: query.per_page]
+        next_after = page_users[-1].login
+
+    user_roles = defaultdict(list)
+    if page_users:
+        role_rows = (
+            db.session.query(users_roles.c.user_id, Role.id, Role.name)
+            .join(Role, Role.id == users_roles.c.role_id)
+            .filter(users_roles.c.user_id.in_([user.id for user in page_users]))
+            .order_by(Role.id)
         )
-        for user in pagination.items
+        for user_id, role_id, name in role_rows:
+            user_roles[user_id].append({"id": role_id, "name": name})
+
+    results = [
+        {"user": user._asdict(), "roles": user_roles[user.id]} for user in page_users
     ]
 
-    return PaginationUsersBody(
-        count=pagination.total,
-        total_pages=pagination.pages,
-        page=pagination.page,
-        results=results,
-    )
+    keyset = query.after is not None
+    page = {
+        "count": count,
+        "count_is_estimate": not query.exact_count,
+        "total_pages": None if keyset else ceil(count / query.per_page),
+        "page": None if keyset else query.page,
+        "next_after": next_after,
+        "results": results,
+    }
+    return serializer.response(page, PaginationUsersBody)
 
 
 @users.route("/<user_id>/roles/<role_id>", methods=["PUT", "DELETE"])
 @validate()
-@permissions_required(DefaultRole.admin)
+@permissions_required(DefaultRole.admin, fresh=True)
 def grant_or_revoke_role(user_id: str, role_id: int):
     user = User.query.get(user_id)
     role = Role.query.get(role_id)
@@ -74,7 +126,91 @@ def grant_or_revoke_role(user_id: str, role_id: int):
             return ErrorBody(error=msg), HTTPStatus.CONFLICT
 
     db.session.commit()
+    user_cache.invalidate(user.id)
+    versions.bump(versions.USERS_VERSION_KEY)
     return UserRolesBody(
         user=UserBody(id=user.id, login=user.login),
         roles=[RoleBody(id=role.id, name=role.name) for role in user.roles],
     )
+
+
+@users.route("/roles:batch", methods=["POST"])
+@validate()
+@permissions_required(DefaultRole.admin, fresh=True)
+def grant_or_revoke_roles(body: RolesBatchBody):
+    """
+    Grant and revoke roles for many users in one transaction
+    Each action is a single set-based statement on users_roles,
+    result of every operation is reported in request order
+    """
+    grants = [op for op in body.operations if op.action == RoleAction.grant]
+    revokes = [op for op in body.operations if op.action == RoleAction.revoke]
+    granted = _grant_roles(grants) if grants else set()
+    revoked = _revoke_roles(revokes) if revokes else set()
+    db.session.commit()
+
+    changed = granted | revoked
+    if changed:
+        user_cache.invalidate(*{user_id for user_id, _ in changed})
+        versions.bump(versions.USERS_VERSION_KEY)
+
+    missed = [op for op in body.operations if (op.user_id, op.role_id) not in changed]
+    found_users, found_roles = _existing(missed)
+    results = []
+    for op in body.operations:
+        if (op.user_id, op.role_id) in changed:
+            result = OPERATION_DONE[op.action]
+        elif op.user_id in found_users and op.role_id in found_roles:
+            result = OPERATION_NOOP[op.action]
+        else:
+            result = RoleActionResult.not_found
+        results.append(RoleOperationResultBody(**op.dict(), result=result))
+    return RolesBatchResultBody(results=results)
+
+
+def _pairs(operations: List[RoleOperationBody]):
+    # Parameters of VALUES are untyped, user ids have to be cast
+    pairs = values(column("user_id", String), column("role_id", Integer), name="pairs")
+    pairs = pairs.data([(str(op.user_id), op.role_id) for op in operations])
+    return pairs, cast(pairs.c.user_id, postgresql.UUID(as_uuid=True))
+
+
+def _grant_roles(operations: List[RoleOperationBody]) -> Set[Tuple[UUID, int]]:
+    pairs, user_id = _pairs(operations)
+    # Joins skip unknown users and roles instead of failing on foreign keys
+    rows = (
+        select(user_id, pairs.c.role_id)
+        .join(User, User.id == user_id)
+        .join(Role, Role.id == pairs.c.role_id)
+    )
+    statement = (
+        insert(users_roles)
+        .from_select(["user_id", "role_id"], rows)
+        .on_conflict_do_nothing()
+        .returning(users_roles.c.user_id, users_roles.c.role_id)
+    )
+    return {tuple(row) for row in db.session.execute(statement)}
+
+
+def _revoke_roles(operations: List[RoleOperationBody]) -> Set[Tuple[UUID, int]]:
+    pairs, user_id = _pairs(operations)
+    statement = (
+        delete(users_roles)
+        .where(
+            users_roles.c.user_id == user_id,
+            users_roles.c.role_id == pairs.c.role_id,
+        )
+        .returning(users_roles.c.user_id, users_roles.c.role_id)
+    )
+    return {tuple(row) for row in db.session.execute(statement)}
+
+
+def _existing(operations: List[RoleOperationBody]) -> Tuple[Set[UUID], Set[int]]:
+    """Tell which users and roles of unchanged operations exist."""
+    if not operations:
+        return set(), set()
+    user_ids = {op.user_id for op in operations}
+    role_ids = {op.role_id for op in operations}
+    found_users = db.session.query(User.id).filter(User.id.in_(user_ids))
+    found_roles = db.session.query(Role.id).filter(Role.id.in_(role_ids))
+    return {row.id for row in found_users}, {row.id for row in found_roles}
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, request
+
+from app.core.config import JWTSettings
+from app.core.keys import key_ring
+
+well_known = Blueprint("well_known", __name__, url_prefix="/.well-known")
+
+
+@well_known.route("/jwks.json", methods=["GET"])
+def jwks():
+    """Public keys to verify access tokens
+    ---
+    tags:
+      - utils
+    produces:
+      - application/json
+    schemes: ['http', 'https']
+    definitions:
+      JWKS:
+        type: object
+        properties:
+          keys:
+            type: array
+            items:
+              type: object
+    responses:
+      200:
+        schema:
+          $ref: '#/definitions/JWKS'
+    """
+    response = jsonify(key_ring.jwks() if key_ring else {"keys": []})
+    response.cache_control.public = True
+    response.cache_control.max_age = JWTSettings().jwks_max_age
+    response.add_etag()
+    return response.make_conditional(request)
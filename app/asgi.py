@@ -0,0 +1,295 @@
+"""Asyncio serving mode for token hot paths.
+
+Serves `/api/v1/auth/introspect` and `/api/v1/auth/refresh` as a plain ASGI
+application next to the Flask one, sharing its JWT configuration, stores and
+serializers. Redis is reached through `redis.asyncio` pool, users missing in
+cache are loaded through `asyncpg` pool. Run with any ASGI server:
+
+    uvicorn app.asgi:application --host 0.0.0.0 --port 8001
+
+Everything else, including rate limits, stays with the Flask application.
+"""
+__all__ = ["AuthApplication", "application"]
+
+import asyncio
+import logging
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, PyJWTError
+from pydantic import BaseModel, ValidationError
+
+from app import app as flask_app
+from app.core.alchemy import build_url, db
+from app.core.blocklist import blocklist
+from app.core.config import JWTSettings, SQLAlchemySettings
+from app.core.enums import Rotation
+from app.core.redis import redis_factory
+from app.core.refresh_tokens import refresh_tokens
+from app.core.role_catalog import role_catalog
+from app.core.user_cache import CachedUser, user_cache
+from app.serializers.auth import (
+    ErrorBody,
+    IntrospectBody,
+    IntrospectResultBody,
+    RefreshBody,
+)
+from app.utils import create_tokens, decode_tokens, introspection_results, load_roles
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "/api/v1/auth"
+MAX_BODY_SIZE = 1024 * 1024
+
+LOAD_USER = """
+SELECT users.id, users.login, users.is_superuser,
+       array_remove(array_agg(roles.name), NULL) AS roles
+FROM users
+LEFT JOIN users_roles ON users_roles.user_id = users.id
+LEFT JOIN roles ON roles.id = users_roles.role_id
+WHERE users.id = $1
+GROUP BY users.id
+"""
+
+Reply = Tuple[HTTPStatus, BaseModel]
+Handler = Callable[[dict, bytes], Awaitable[Reply]]
+
+
+class HealthBody(BaseModel):
+    success: bool
+
+
+class ValidationErrorBody(BaseModel):
+    validation_error: Dict[str, List[dict]]
+
+
+class RequestError(Exception):
+    """Raised to answer request with error body."""
+
+    def __init__(self, status: HTTPStatus, body: BaseModel):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+
+
+class AuthApplication:
+    """ASGI application answering token introspection and refresh.
+
+    Token decoding and signing run inside Flask application context, so
+    keys, algorithms and lifetimes are exactly those of the Flask app.
+    Pools are opened on lifespan startup or by the first request, role
+    catalog is checked in a thread once per its check interval.
+    """
+
+    def __init__(self):
+        self.settings = SQLAlchemySettings()
+        self.jwt_settings = JWTSettings()
+        self.routes: Dict[Tuple[str, str], Handler] = {
+            ("POST", f"{PREFIX}/introspect"): self.introspect,
+            ("POST", f"{PREFIX}/refresh"): self.refresh,
+            ("GET", "/health"): self.health,
+        }
+        self._database = None
+        self._started: Optional[asyncio.Lock] = None
+
+    async def __call__(self, scope: dict, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def health(self, scope: dict, raw: bytes) -> Reply:
+        return HTTPStatus.OK, HealthBody(success=True)
+
+    async def introspect(self, scope: dict, raw: bytes) -> Reply:
+        body = parse(IntrospectBody, raw)
+        with flask_app.app_context():
+            results, claims = decode_tokens(body.tokens)
+        jtis = [data["jti"] for data in claims.values()]
+        revoked = await blocklist.revoked_many_async(jtis)
+        results = introspection_results(results, claims, revoked)
+        return HTTPStatus.OK, IntrospectResultBody(results=results)
+
+    async def refresh(self, scope: dict, raw: bytes) -> Reply:
+        body = parse(RefreshBody, raw)
+        with flask_app.app_context():
+            claims = decode(body.refresh_token)
+        if claims["type"] != "refresh" or "fam" not in claims:
+            return HTTPStatus.CONFLICT, ErrorBody(error="Refresh token not valid")
+
+        user_id = claims["sub"]["user_id"]
+        user = await user_cache.get_or_load_async(user_id, self.load_user)
+        if not user:
+            return HTTPStatus.CONFLICT, ErrorBody(error="Something went wrong")
+
+        if role_catalog.due:
+            await self._ensure_roles()
+        jti = str(uuid4())
+        with flask_app.app_context():
+            tokens = create_tokens(user, jti, claims["fam"])
+        rotation = await refresh_tokens.rotate_async(
+            user.id,
+            header(scope, b"user-agent"),
+            claims["jti"],
+            claims["fam"],
+            jti,
+            ttl=timedelta(days=self.jwt_settings.refresh_exp),
+        )
+        if rotation == Rotation.reused:
+            msg = "Refresh token was already used, please log in again"
+            return HTTPStatus.CONFLICT, ErrorBody(error=msg)
+        if rotation != Rotation.rotated:
+            return HTTPStatus.CONFLICT, ErrorBody(error="Refresh token not valid")
+        return HTTPStatus.OK, tokens
+
+    async def load_user(self, user_id: str) -> Optional[CachedUser]:
+        """Load user identity with roles through asyncpg pool."""
+        database = await self.database()
+        async with database.acquire(timeout=self.settings.pool_timeout) as conn:
+            row = await conn.fetchrow(LOAD_USER, user_id)
+        return CachedUser(**dict(row)) if row else None
+
+    async def database(self):
+        if self._database is None:
+            await self.startup()
+        return self._database
+
+    async def startup(self):
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is required for asyncio serving mode")
+        if self._started is None:
+            self._started = asyncio.Lock()
+        async with self._started:
+            if self._database is not None:
+                return
+            # Pool primitives have to belong to the serving loop
+            redis_factory.async_client()
+            cfg = self.settings
+            self._database = await asyncpg.create_pool(
+                build_url(cfg.copy(update={"connector": "postgresql"})),
+                min_size=1,
+                max_size=cfg.pool_size + cfg.max_overflow,
+                max_inactive_connection_lifetime=max(cfg.pool_recycle, 0),
+            )
+            user_cache.start_listener()
+            blocklist.start_listener()
+            await self._ensure_roles()
+
+    async def shutdown(self):
+        if self._database is not None:
+            await self._database.close()
+            self._database = None
+        await redis_factory.close_async()
+
+    @staticmethod
+    async def _ensure_roles():
+        # Catalog check may go to Redis and Postgres with sync clients
+        def ensure_fresh():
+            with flask_app.app_context():
+                try:
+                    role_catalog.ensure_fresh(load_roles)
+                finally:
+                    db.session.remove()
+
+        await asyncio.get_running_loop().run_in_executor(None, ensure_fresh)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.exception("Startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: dict, receive, send):
+        handler = self.routes.get((scope["method"], scope["path"]))
+        try:
+            if handler is None:
+                raise RequestError(HTTPStatus.NOT_FOUND, ErrorBody(error="Not found"))
+            status, body = await handler(scope, await read_body(receive))
+        except RequestError as exc:
+            status, body = exc.status, exc.body
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Request to %s failed", scope["path"])
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            body = ErrorBody(error="Something went wrong")
+        await respond(send, status, body)
+
+
+def parse(model, raw: bytes):
+    """Validate request body like `flask_pydantic` does."""
+    try:
+        return model.parse_raw(raw or b"{}")
+    except ValidationError as exc:
+        body = ValidationErrorBody(validation_error={"body_params": exc.errors()})
+        raise RequestError(HTTPStatus.BAD_REQUEST, body) from None
+
+
+def decode(token: str) -> dict:
+    """Decode token answering errors like Flask-JWT-Extended handlers do."""
+    try:
+        return decode_token(token)
+    except ExpiredSignatureError:
+        raise RequestError(
+            HTTPStatus.UNAUTHORIZED, ErrorBody(error="Token has expired")
+        ) from None
+    except (PyJWTError, JWTExtendedException) as exc:
+        raise RequestError(
+            HTTPStatus.UNPROCESSABLE_ENTITY, ErrorBody(error=str(exc))
+        ) from None
+
+
+def header(scope: dict, name: bytes) -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+async def read_body(receive) -> bytes:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_SIZE:
+            error = ErrorBody(error="Request body is too large")
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, error)
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def respond(send, status: HTTPStatus, body: BaseModel):
+    content = body.json().encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(content)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": content})
+
+
+application = AuthApplication()
@@ -1,20 +1,114 @@
-__all__ = ["db", "init_alchemy"]
+__all__ = [
+    "build_url",
+    "db",
+    "estimate_count",
+    "init_alchemy",
+    "read_from_replica",
+    "replica_reads",
+]
 
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+import random
+from contextlib import contextmanager
+
+from flask import Flask, g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+from sqlalchemy.orm import Query
 
 from .config import SQLAlchemySettings
+from .green import is_green
+
+REPLICA_BIND_PREFIX = "replica_"
+
+
+class RoutingSession(SignallingSession):
+    """Session sending reads to replicas inside `replica_reads`.
+
+    One replica is picked per request. Once the request flushes or runs
+    a DML statement, everything else in it goes to primary, so the request
+    reads its own writes.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if has_app_context():
+            if self._flushing or getattr(clause, "is_dml", False):
+                g.db_primary_pinned = True
+            elif self._use_replica():
+                g.db_replica_used = True
+                return self.db.get_engine(self.app, bind=g.db_replica)
+        return super().get_bind(mapper, clause)
+
+    def _use_replica(self) -> bool:
+        if not g.get("db_replica_reads") or g.get("db_primary_pinned"):
+            return False
+        if "db_replica" not in g:
+            binds = self.app.config["SQLALCHEMY_BINDS"] or {}
+            replicas = [key for key in binds if key.startswith(REPLICA_BIND_PREFIX)]
+            g.db_replica = random.choice(replicas) if replicas else None
+        return g.db_replica is not None
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 
 def init_alchemy(app: Flask):
     cfg = SQLAlchemySettings()
-    app.config["SQLALCHEMY_DATABASE_URI"] = _build_url(cfg)
+    app.config["SQLALCHEMY_DATABASE_URI"] = build_url(cfg)
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"{REPLICA_BIND_PREFIX}{number}": build_url(_replica_settings(cfg, replica))
+        for number, replica in enumerate(cfg.replicas)
+    }
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": _pool_size(cfg),
+        "max_overflow": cfg.max_overflow,
+        "pool_timeout": cfg.pool_timeout,
+        "pool_recycle": cfg.pool_recycle,
+        "pool_pre_ping": cfg.pool_pre_ping,
+    }
     db.init_app(app)
 
 
-def _build_url(cfg: SQLAlchemySettings) -> str:
+@contextmanager
+def replica_reads(enabled: bool = True):
+    """Let queries of current request go to a read replica, if any.
+
+    Works as decorator of read-only handlers too, nested `enabled=False`
+    keeps reads that must be current on primary.
+    """
+    previous = g.get("db_replica_reads", False)
+    g.db_replica_reads = enabled
+    try:
+        yield
+    finally:
+        g.db_replica_reads = previous
+
+
+def read_from_replica() -> bool:
+    """Tell whether current request has read anything from a replica."""
+    return has_app_context() and g.get("db_replica_used", False)
+
+
+def _pool_size(cfg: SQLAlchemySettings) -> int:
+    if is_green() and cfg.greenlets and "pool_size" not in cfg.__fields_set__:
+        return cfg.greenlets
+    return cfg.pool_size
+
+
+def _replica_settings(cfg: SQLAlchemySettings, replica: str) -> SQLAlchemySettings:
+    host, _, port = replica.partition(":")
+    return cfg.copy(update={"host": host, "port": int(port) if port else cfg.port})
+
+
+def build_url(cfg: SQLAlchemySettings) -> str:
     """Build database connection URL based on setting."""
     parts = [f"{cfg.connector}://"]
 
@@ -33,3 +127,14 @@ def _build_url(cfg: SQLAlchemySettings) -> str:
         parts.append(f"/{cfg.database_name}")
 
     return "".join(parts)
+
+
+def estimate_count(query: Query) -> int:
+    """Return planner estimate of query rows instead of running COUNT(*)."""
+    statement = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    plan = (
+        db.session.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", statement.params)
+        .scalar()
+    )
+    return int(plan[0]["Plan"]["Plan Rows"])
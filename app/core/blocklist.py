@@ -0,0 +1,174 @@
+__all__ = ["RevocationFilter", "blocklist"]
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Set
+
+from redis.exceptions import RedisError
+
+from .config import JWTSettings, RevocationSettings
+from .redis import async_redis, redis, redis_listener
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL = 60
+# Allowed difference between app hosts and Redis clocks
+CLOCK_SKEW = 60
+
+
+class RevocationFilter:
+    """Worker-local set of revoked token ids.
+
+    The set is fed from a Redis stream written by `revoke`, so the common
+    "not revoked" answer doesn't need a Redis round trip. While the feed is
+    stale (listener isn't caught up or Redis is unreachable for longer than
+    `max_staleness`) every check goes to Redis and falls back to the
+    configured fail mode on errors.
+
+    Stream is trimmed by id, which is the time an entry was added. Entries
+    older than `retention`, the longest token lifetime, are expired, so
+    replay from the start of the stream sees every live revocation.
+    """
+
+    def __init__(self, settings: RevocationSettings, retention: timedelta):
+        self.settings = settings
+        self.retention = retention
+        self._revoked: Dict[str, float] = {}
+        self._last_id = "0-0"
+        self._synced_at: Optional[float] = None
+        self._purged_at = 0.0
+        self._listener_pid: Optional[int] = None
+        self._counters: Dict[str, int] = {
+            "local_answers": 0,
+            "redis_checks": 0,
+            "fail_mode_answers": 0,
+        }
+
+    def revoke(self, jti: str, exp: float):
+        """Mark token as revoked until its expiration time."""
+        oldest = time.time() - self.retention.total_seconds() - CLOCK_SKEW
+        pipe = redis.pipeline(transaction=True)
+        pipe.set(self._key(jti), "", exat=int(exp))
+        pipe.xadd(
+            self.settings.stream,
+            {"jti": jti, "exp": int(exp)},
+            minid=int(oldest * 1000),
+            approximate=True,
+        )
+        pipe.execute()
+        self._revoked[jti] = exp
+
+    def is_revoked(self, jti: str) -> bool:
+        """Check token id using local set while it is fresh."""
+        return jti in self.revoked_many([jti])
+
+    def revoked_many(self, jtis: List[str]) -> Set[str]:
+        """Return revoked token ids, asking Redis at most once."""
+        if not jtis:
+            return set()
+
+        if self._is_fresh():
+            return self._local_answer(jtis)
+
+        try:
+            self._counters["redis_checks"] += 1
+            values = redis.mget([self._key(jti) for jti in jtis])
+        except RedisError as exc:
+            return self._fail_mode_answer(jtis, exc)
+        return {jti for jti, value in zip(jtis, values) if value is not None}
+
+    async def revoked_many_async(self, jtis: List[str]) -> Set[str]:
+        """Same as `revoked_many` for asyncio serving mode."""
+        if not jtis:
+            return set()
+
+        if self._is_fresh():
+            return self._local_answer(jtis)
+
+        try:
+            self._counters["redis_checks"] += 1
+            values = await async_redis.mget([self._key(jti) for jti in jtis])
+        except RedisError as exc:
+            return self._fail_mode_answer(jtis, exc)
+        return {jti for jti, value in zip(jtis, values) if value is not None}
+
+    def stats(self) -> Dict[str, float]:
+        """Return filter counters of the current worker."""
+        lag = time.monotonic() - self._synced_at if self._synced_at else -1
+        return {**self._counters, "size": len(self._revoked), "sync_lag": lag}
+
+    def start_listener(self):
+        """Start stream listener once per worker process."""
+        if not self.settings.local_filter or self._listener_pid == os.getpid():
+            return
+        self._listener_pid = os.getpid()
+        thread = threading.Thread(
+            target=self._listen, name="revocation-listener", daemon=True
+        )
+        thread.start()
+
+    def _key(self, jti: str) -> str:
+        return f"{self.settings.key_prefix}{jti}"
+
+    def _local_answer(self, jtis: List[str]) -> Set[str]:
+        self._counters["local_answers"] += len(jtis)
+        return {jti for jti in jtis if jti in self._revoked}
+
+    def _fail_mode_answer(self, jtis: List[str], exc: RedisError) -> Set[str]:
+        self._counters["fail_mode_answers"] += len(jtis)
+        logger.warning("Unable to check revoked tokens: %s", exc)
+        if self.settings.fail_mode == RevocationSettings.FailMode.closed:
+            return set(jtis)
+        return set()
+
+    def _is_fresh(self) -> bool:
+        if not self.settings.local_filter or self._synced_at is None:
+            return False
+        return time.monotonic() - self._synced_at < self.settings.max_staleness
+
+    def _listen(self):
+        while True:
+            try:
+                self._read_stream()
+            except RedisError as exc:
+                logger.warning("Revocation listener disconnected: %s", exc)
+                time.sleep(self.settings.retry_interval)
+
+    def _read_stream(self):
+        response = redis_listener.xread(
+            {self.settings.stream: self._last_id},
+            count=self.settings.batch_size,
+            block=self.settings.block_ms,
+        )
+        now = time.time()
+        received = 0
+        for _stream, messages in response:
+            for message_id, fields in messages:
+                self._last_id = message_id
+                exp = float(fields["exp"])
+                if exp > now:
+                    self._revoked[fields["jti"]] = exp
+            received += len(messages)
+
+        # Until the backlog is drained local set is incomplete
+        if received < self.settings.batch_size:
+            self._synced_at = time.monotonic()
+
+        if now - self._purged_at > PURGE_INTERVAL:
+            self._revoked = {
+                jti: exp for jti, exp in self._revoked.items() if exp > now
+            }
+            self._purged_at = now
+
+
+_jwt_settings = JWTSettings()
+blocklist = RevocationFilter(
+    RevocationSettings(),
+    retention=max(
+        timedelta(minutes=_jwt_settings.access_exp),
+        timedelta(days=_jwt_settings.refresh_exp),
+    ),
+)
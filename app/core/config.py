@@ -6,6 +6,13 @@ __all__ = [
     "RateLimitSettings",
     "TracingSettings",
     "OAuthServiceSettings",
+    "UserCacheSettings",
+    "RevocationSettings",
+    "HashingSettings",
+    "SessionWriterSettings",
+    "PartitionSettings",
+    "RoleCatalogSettings",
+    "SerializationSettings",
 ]
 
 from enum import Enum
@@ -15,7 +22,13 @@ from pydantic import BaseSettings, Field, SecretStr
 
 
 class SQLAlchemySettings(BaseSettings):
-    """Represents SQLAlchemy settings."""
+    """Represents SQLAlchemy settings.
+
+    Pool limits apply to each worker process and to each replica. Replicas
+    are `host` or `host:port` of read replicas sharing primary credentials
+    and database, given as JSON list. Under gevent runner pool size defaults
+    to the number of greenlets, so each of them can hold a connection.
+    """
 
     connector: str = Field("postgresql", env="SQLALCHEMY_SCHEMA")
     host: str = Field("postgres", env="SQLALCHEMY_HOST")
@@ -23,14 +36,34 @@ class SQLAlchemySettings(BaseSettings):
     username: Optional[str] = Field(None, env="SQLALCHEMY_USERNAME")
     password: Optional[SecretStr] = Field(None, env="SQLALCHEMY_PASSWORD")
     database_name: Optional[str] = Field(None, env="SQLALCHEMY_DATABASE_NAME")
+    pool_size: int = Field(5, env="SQLALCHEMY_POOL_SIZE")
+    max_overflow: int = Field(10, env="SQLALCHEMY_MAX_OVERFLOW")
+    pool_timeout: float = Field(30.0, env="SQLALCHEMY_POOL_TIMEOUT")
+    pool_recycle: int = Field(1800, env="SQLALCHEMY_POOL_RECYCLE")
+    pool_pre_ping: bool = Field(True, env="SQLALCHEMY_POOL_PRE_PING")
+    replicas: List[str] = Field([], env="SQLALCHEMY_REPLICAS")
+    greenlets: Optional[int] = Field(None, env="ASYNC_CORES")
 
 
 class RedisSettings(BaseSettings):
-    """Represents Redis settings."""
+    """Represents Redis settings.
+
+    Connection limits apply to each worker process. With `blocking_pool`
+    a request waits up to `pool_timeout` for a free connection instead of
+    opening a new one.
+    """
 
     host: str = Field("redis", env="REDIS_HOST")
     port: int = Field(6379, env="REDIS_PORT")
     db: int = Field(0, env="REDIS_DB")
+    max_connections: int = Field(50, env="REDIS_MAX_CONNECTIONS")
+    blocking_pool: bool = Field(True, env="REDIS_BLOCKING_POOL")
+    pool_timeout: float = Field(5.0, env="REDIS_POOL_TIMEOUT")
+    socket_timeout: Optional[float] = Field(5.0, env="REDIS_SOCKET_TIMEOUT")
+    socket_connect_timeout: Optional[float] = Field(
+        2.0, env="REDIS_SOCKET_CONNECT_TIMEOUT"
+    )
+    health_check_interval: int = Field(30, env="REDIS_HEALTH_CHECK_INTERVAL")
 
 
 class FlaskSettings(BaseSettings):
@@ -48,6 +81,10 @@ class JWTSettings(BaseSettings):
     secret: Optional[str] = Field(None, env="JWT_SECRET_KEY")
     access_exp: int = Field(60, env="JWT_ACCESS_TOKEN_EXPIRES")
     refresh_exp: int = Field(7, env="JWT_REFRESH_TOKEN_EXPIRES")
+    keys_dir: Optional[str] = Field(None, env="JWT_KEYS_DIR")
+    active_kid: Optional[str] = Field(None, env="JWT_ACTIVE_KID")
+    jwks_max_age: int = Field(300, env="JWT_JWKS_MAX_AGE")
+    introspect_max_batch: int = Field(100, env="JWT_INTROSPECT_MAX_BATCH")
 
 
 class OAuthServiceSettings(BaseSettings):
@@ -86,7 +123,14 @@ class TracingSettings(BaseSettings):
 
 
 class RateLimitSettings(BaseSettings):
-    """Represents rate limit settings."""
+    """Represents rate limit settings.
+
+    With `shared_pool` limits are kept in application Redis and share its
+    connection pool instead of `storage_uri`. `gcra` strategy needs Redis
+    storage, with `local_precheck` every worker remembers up to
+    `local_keys` limits it has hit and rejects requests over them without
+    asking Redis.
+    """
 
     class Config:
         env_prefix = "RATELIMIT_"
@@ -95,10 +139,162 @@ class RateLimitSettings(BaseSettings):
         fixed_window = "fixed-window"
         fixed_window_elastic_expiry = "fixed-window-elastic-expiry"
         moving_window = "moving-window"
+        gcra = "gcra"
 
     enabled: bool = False
     storage_uri: Optional[str] = "redis://localhost:6379/0"
+    shared_pool: bool = False
     strategy: Strategy = Strategy.moving_window
     default: List[str] = []
     default_limits_per_method: bool = True
     key_prefix: Optional[str]
+    local_precheck: bool = True
+    local_keys: int = 10000
+
+
+class UserCacheSettings(BaseSettings):
+    """Represents user cache settings.
+
+    A user isn't cached in Redis for `tombstone_ttl` seconds after its
+    invalidation, it should outlast loading a user from the database.
+    """
+
+    class Config:
+        env_prefix = "USER_CACHE_"
+
+    enabled: bool = True
+    local_size: int = 10000
+    local_ttl: int = 30
+    redis_ttl: int = 300
+    tombstone_ttl: int = 10
+    key_prefix: str = "uc:"
+    channel: str = "user_cache:invalidate"
+    retry_interval: float = 1.0
+
+
+class RevocationSettings(BaseSettings):
+    """Represents revoked tokens filter settings."""
+
+    class Config:
+        env_prefix = "REVOCATION_"
+
+    class FailMode(str, Enum):
+        open = "open"
+        closed = "closed"
+
+    local_filter: bool = True
+    fail_mode: FailMode = FailMode.closed
+    key_prefix: str = "rv:"
+    stream: str = "revoked_tokens"
+    batch_size: int = 1000
+    block_ms: int = 5000
+    max_staleness: float = 30
+    retry_interval: float = 1.0
+
+
+class HashingSettings(BaseSettings):
+    """Represents password hashing settings.
+
+    `argon2` algorithm requires `argon2-cffi` package to be installed.
+    Zero `pool_size` means hashing inline, without process pool.
+    """
+
+    class Config:
+        env_prefix = "HASHING_"
+
+    class Algorithm(str, Enum):
+        pbkdf2 = "pbkdf2"
+        scrypt = "scrypt"
+        argon2 = "argon2"
+
+    algorithm: Algorithm = Algorithm.pbkdf2
+    pbkdf2_digest: str = "sha256"
+    pbkdf2_iterations: int = 260000
+    scrypt_n: int = 2**15
+    scrypt_r: int = 8
+    scrypt_p: int = 1
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536
+    argon2_parallelism: int = 4
+    pool_size: int = 2
+    max_pending: int = 64
+    timeout: float = 5.0
+
+
+class SessionWriterSettings(BaseSettings):
+    """Represents write-behind session history settings.
+
+    Buffer is flushed once it holds `batch_size` events or every
+    `flush_interval` seconds. Logins are written synchronously while
+    the buffer holds more than `max_pending` events. Events rejected by
+    the database are moved to `dead_letters` list.
+    """
+
+    class Config:
+        env_prefix = "SESSION_WRITER_"
+
+    enabled: bool = False
+    buffer: str = "sessions:buffer"
+    dead_letters: str = "sessions:dead"
+    batch_size: int = 500
+    flush_interval: float = 1.0
+    max_pending: int = 100000
+    lock_ttl: int = 30
+    last_login_prefix: str = "ll:"
+    last_login_ttl: int = 3600
+    retry_interval: float = 1.0
+
+
+class PartitionSettings(BaseSettings):
+    """Represents `sessions` table partitions settings.
+
+    Partitions are created `ahead` periods in advance. Without `retention`
+    partitions are never expired, otherwise partitions older than
+    `retention` periods are detached or dropped.
+    """
+
+    class Config:
+        env_prefix = "PARTITIONS_"
+
+    class Period(str, Enum):
+        day = "day"
+        week = "week"
+        month = "month"
+
+    class ExpiredAction(str, Enum):
+        detach = "detach"
+        drop = "drop"
+
+    period: Period = Period.month
+    ahead: int = 3
+    retention: Optional[int] = None
+    expired_action: ExpiredAction = ExpiredAction.detach
+    scheduler: bool = False
+    interval: int = 3600
+    lock_id: int = 0x5E55_1045
+
+
+class RoleCatalogSettings(BaseSettings):
+    """Represents in-memory role catalog settings."""
+
+    class Config:
+        env_prefix = "ROLE_CATALOG_"
+
+    version_key: str = "roles:version"
+    check_interval: float = 1.0
+
+
+class SerializationSettings(BaseSettings):
+    """Represents response serialization settings.
+
+    `orjson` backend requires `orjson` package to be installed.
+    """
+
+    class Config:
+        env_prefix = "SERIALIZATION_"
+
+    class Backend(str, Enum):
+        pydantic = "pydantic"
+        orjson = "orjson"
+
+    backend: Backend = Backend.pydantic
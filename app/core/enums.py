@@ -25,3 +25,50 @@ class Provider(AutoName):
     mail = auto()
     vkontakte = auto()
     yandex = auto()
+
+
+class Rotation(AutoName):
+    """Represents refresh token rotation outcome."""
+
+    rotated = auto()
+    reused = auto()
+    invalid = auto()
+
+
+class LoginMatch(AutoName):
+    """Represents user login search mode."""
+
+    prefix = auto()
+    contains = auto()
+
+
+class RoleAction(AutoName):
+    """Represents operation of roles batch."""
+
+    grant = auto()
+    revoke = auto()
+
+
+class RoleActionResult(AutoName):
+    """Represents outcome of roles batch operation."""
+
+    granted = auto()
+    already_granted = auto()
+    revoked = auto()
+    not_granted = auto()
+    not_found = auto()
+
+
+class ImportFormat(AutoName):
+    """Represents users import file format."""
+
+    csv = auto()
+    jsonl = auto()
+
+
+class ImportCollision(AutoName):
+    """Represents handling of imported login that already exists."""
+
+    skip = auto()
+    update = auto()
+    fail = auto()
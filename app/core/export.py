@@ -0,0 +1,80 @@
+__all__ = ["export_sessions", "export_users", "gzip_chunks"]
+
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Type
+
+from pydantic import BaseModel
+from sqlalchemy import and_, func, select
+from sqlalchemy.sql import Select
+
+from ..models.db_models import Role, Session, User, users_roles
+from ..serializers.export import ExportSessionBody, ExportUserBody
+from .alchemy import db
+from .serialization import serializer
+
+CHUNK_ROWS = 1000
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def export_users(role: Optional[str] = None) -> Iterator[bytes]:
+    """Stream users with role names as NDJSON chunks."""
+    roles = func.array_remove(func.array_agg(Role.name), None).label("roles")
+    statement = (
+        select(User.id, User.login, User.is_superuser, roles)
+        .outerjoin(users_roles, users_roles.c.user_id == User.id)
+        .outerjoin(Role, Role.id == users_roles.c.role_id)
+        .group_by(User.id)
+    )
+    if role is not None:
+        statement = statement.where(_has_role(User.id, role))
+    return _stream(statement, ExportUserBody)
+
+
+def export_sessions(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    role: Optional[str] = None,
+) -> Iterator[bytes]:
+    """Stream login history as NDJSON chunks."""
+    statement = select(Session.user_id, Session.user_agent, Session.auth_date)
+    # Bounds on auth_date let postgres skip unrelated partitions
+    if since is not None:
+        statement = statement.where(Session.auth_date >= since)
+    if until is not None:
+        statement = statement.where(Session.auth_date < until)
+    if role is not None:
+        statement = statement.where(_has_role(Session.user_id, role))
+    return _stream(statement, ExportSessionBody)
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress stream chunk by chunk into a single gzip member."""
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _has_role(user_id, role: str):
+    return (
+        select(users_roles.c.user_id)
+        .join(Role, Role.id == users_roles.c.role_id)
+        .where(and_(users_roles.c.user_id == user_id, Role.name == role))
+        .exists()
+    )
+
+
+def _stream(statement: Select, model: Type[BaseModel]) -> Iterator[bytes]:
+    # Server side cursor keeps memory flat whatever the table size
+    result = db.session.execute(
+        statement,
+        execution_options={"stream_results": True, "max_row_buffer": CHUNK_ROWS},
+    )
+    try:
+        for rows in result.mappings().partitions(CHUNK_ROWS):
+            yield serializer.lines(rows, model)
+    finally:
+        result.close()
@@ -0,0 +1,149 @@
+__all__ = ["GCRARateLimiter", "LocalBuckets"]
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from limits import RateLimitItem
+from limits.storage import Storage
+from limits.strategies import RateLimiter
+
+from .config import RateLimitSettings
+
+MICROSECONDS = 1_000_000
+# Covers the time allowed hit spends on the way to and back from Redis
+LOCAL_SLACK = 50_000
+
+# Times are in microseconds of Redis clock, key holds theoretical arrival
+# time (TAT) of the next request.
+# KEYS[1] - limit key; ARGV - emission interval, period, cost
+HIT_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1]) or 0), now)
+local new_tat = math.floor(tat + interval * tonumber(ARGV[3]))
+if new_tat - now > period then
+    return 0
+end
+local ttl = math.ceil((new_tat - now) / 1000)
+redis.call("SET", KEYS[1], string.format("%d", new_tat), "PX", ttl)
+return 1
+"""
+
+# KEYS[1] - limit key
+STATE_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) * 1000000 + tonumber(now[2])
+return {tonumber(redis.call("GET", KEYS[1]) or 0), now}
+"""
+
+
+def _timing(item: RateLimitItem) -> Tuple[float, float]:
+    """Return emission interval and period of the limit in microseconds."""
+    period = item.get_expiry() * MICROSECONDS
+    return period / item.amount, period
+
+
+class LocalBuckets:
+    """Worker-local GCRA state of hits Redis has allowed.
+
+    Worker sees only a part of the hits, so its state is never ahead of
+    the shared one and a hit it rejects would be rejected by Redis too.
+    Least recently used keys are forgotten first, which only sends their
+    requests to Redis.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rejects(self, key: str, interval: float, period: float, cost: int) -> bool:
+        now = time.monotonic() * MICROSECONDS
+        with self._lock:
+            tat = self._tat.get(key)
+        if tat is None:
+            return False
+        return max(tat, now) + interval * cost - now > period + LOCAL_SLACK
+
+    def hit(self, key: str, interval: float, cost: int):
+        now = time.monotonic() * MICROSECONDS
+        with self._lock:
+            self._tat[key] = max(self._tat.get(key, now), now) + interval * cost
+            self._tat.move_to_end(key)
+            while len(self._tat) > self.size:
+                self._tat.popitem(last=False)
+
+    def clear(self, key: str):
+        with self._lock:
+            self._tat.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+
+class GCRARateLimiter(RateLimiter):
+    """Generic cell rate algorithm over Redis storage.
+
+    A limit of `amount` per `period` lets a request in every
+    `period / amount` on average with bursts up to `amount`. Each limit is
+    a single Redis key updated by a single script call. With local
+    pre-check a worker rejects hits over the limit by its own count
+    without the call.
+    """
+
+    def __init__(self, storage: Storage, settings: Optional[RateLimitSettings] = None):
+        client = getattr(storage, "storage", None)
+        if not hasattr(client, "register_script"):
+            raise NotImplementedError(
+                f"GCRA rate limiting is not implemented for storage "
+                f"of type {storage.__class__}"
+            )
+        super().__init__(storage)
+        self.settings = settings or RateLimitSettings()
+        self._hit = client.register_script(HIT_SCRIPT)
+        self._state = client.register_script(STATE_SCRIPT)
+        self._local = (
+            LocalBuckets(self.settings.local_keys)
+            if self.settings.local_precheck
+            else None
+        )
+        self._counters: Dict[str, int] = {"local_rejects": 0, "redis_checks": 0}
+
+    def hit(self, item: RateLimitItem, *identifiers, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        interval, period = _timing(item)
+        if self._local is not None and self._local.rejects(key, interval, period, cost):
+            self._counters["local_rejects"] += 1
+            return False
+
+        self._counters["redis_checks"] += 1
+        allowed = bool(self._hit(keys=[key], args=[interval, period, cost]))
+        if allowed and self._local is not None:
+            self._local.hit(key, interval, cost)
+        return allowed
+
+    def test(self, item: RateLimitItem, *identifiers) -> bool:
+        return self.get_window_stats(item, *identifiers)[1] > 0
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers) -> Tuple[int, int]:
+        """Return time the next hit is allowed at and hits left in a burst."""
+        interval, period = _timing(item)
+        tat, now = self._state(keys=[item.key_for(*identifiers)])
+        tat = max(tat, now)
+        remaining = min(item.amount, int((period - (tat - now)) // interval))
+        reset = max(now, tat + interval - period)
+        return int(reset // MICROSECONDS), max(0, remaining)
+
+    def clear(self, item: RateLimitItem, *identifiers) -> None:
+        if self._local is not None:
+            self._local.clear(item.key_for(*identifiers))
+        super().clear(item, *identifiers)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of the current worker."""
+        local_keys = len(self._local) if self._local is not None else 0
+        return {**self._counters, "local_keys": local_keys}
@@ -0,0 +1,48 @@
+__all__ = ["is_green", "overlap", "patch_psycopg", "wait_callback"]
+
+from typing import Callable
+
+import gevent
+from gevent.event import AsyncResult
+from gevent.socket import wait_read, wait_write
+from psycopg2 import OperationalError, extensions
+
+
+def wait_callback(conn, timeout=None):
+    """Wait for psycopg connection yielding to other greenlets.
+
+    psycopg calls it instead of blocking in libpq, so a query parks only
+    the greenlet running it.
+    """
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def patch_psycopg():
+    """Make psycopg cooperative, call it before any connection is made."""
+    extensions.set_wait_callback(wait_callback)
+
+
+def is_green() -> bool:
+    return extensions.get_wait_callback() is wait_callback
+
+
+def overlap(func: Callable, *args, **kwargs):
+    """Start call so its I/O overlaps queries the caller runs meanwhile.
+
+    Call runs in its own greenlet when psycopg is cooperative, right away
+    otherwise. Either way its result or exception is taken with `get()`.
+    """
+    if is_green():
+        return gevent.spawn(func, *args, **kwargs)
+    result = AsyncResult()
+    result.set(func(*args, **kwargs))
+    return result
@@ -0,0 +1,182 @@
+__all__ = [
+    "HashingUnavailable",
+    "PasswordHasher",
+    "hash_password",
+    "hasher",
+    "verify_password",
+]
+
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+from gevent.monkey import get_original
+from werkzeug.security import check_password_hash, gen_salt, generate_password_hash
+
+from .config import HashingSettings
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+Algorithm = HashingSettings.Algorithm
+SALT_LENGTH = 16
+PARENT_CHECK_INTERVAL = 1
+
+T = TypeVar("T")
+
+
+class HashingUnavailable(Exception):
+    """Raised when hashing pool is overloaded or doesn't answer in time."""
+
+
+def hash_password(password: str, settings: HashingSettings) -> str:
+    """Hash password with configured algorithm and cost parameters."""
+    if settings.algorithm == Algorithm.argon2:
+        return _argon2_hasher(settings).hash(password)
+
+    if settings.algorithm == Algorithm.scrypt:
+        n, r, p = settings.scrypt_n, settings.scrypt_r, settings.scrypt_p
+        salt = gen_salt(SALT_LENGTH)
+        return f"scrypt:{n}:{r}:{p}${salt}${_scrypt(password, salt, n, r, p)}"
+
+    method = f"pbkdf2:{settings.pbkdf2_digest}:{settings.pbkdf2_iterations}"
+    return generate_password_hash(password, method=method, salt_length=SALT_LENGTH)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """Check password against hash made by any supported algorithm."""
+    if pwhash.startswith("$argon2"):
+        if argon2 is None:
+            raise RuntimeError("argon2-cffi is required to verify argon2 hashes")
+        try:
+            return argon2.PasswordHasher().verify(pwhash, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHash):
+            return False
+
+    if pwhash.startswith("scrypt:"):
+        method, salt, hashval = pwhash.split("$", 2)
+        n, r, p = (int(arg) for arg in method[len("scrypt:") :].split(":"))
+        return hmac.compare_digest(_scrypt(password, salt, n, r, p), hashval)
+
+    return check_password_hash(pwhash, password)
+
+
+def _scrypt(password: str, salt: str, n: int, r: int, p: int) -> str:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt.encode(),
+        n=n,
+        r=r,
+        p=p,
+        # What OpenSSL allocates for the parameters
+        maxmem=128 * r * (n + p + 2),
+    ).hex()
+
+
+def _argon2_hasher(settings: HashingSettings):
+    if argon2 is None:
+        raise RuntimeError("argon2-cffi is required for argon2 algorithm")
+    return argon2.PasswordHasher(
+        time_cost=settings.argon2_time_cost,
+        memory_cost=settings.argon2_memory_cost,
+        parallelism=settings.argon2_parallelism,
+    )
+
+
+def _watch_parent(parent_pid: int):
+    """Exit pool worker once the app worker owning it is gone.
+
+    Runs in a real thread, main one is blocked reading tasks from the pipe
+    even when gevent has patched the process.
+    """
+    sleep = get_original("time", "sleep")
+
+    def watch():
+        while os.getppid() == parent_pid:
+            sleep(PARENT_CHECK_INTERVAL)
+        os._exit(0)
+
+    get_original("_thread", "start_new_thread")(watch, ())
+
+
+class PasswordHasher:
+    """Password hashing service backed by process pool.
+
+    CPU-bound hashing is moved out of the worker, so it doesn't block
+    gevent hub. Number of pending tasks is bounded by `max_pending`,
+    both waiting for a free slot and for the result are limited by
+    `timeout`.
+    """
+
+    def __init__(self, settings: HashingSettings):
+        self.settings = settings
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(settings.max_pending)
+
+    def hash(self, password: str) -> str:
+        """Hash password with configured algorithm."""
+        return self._run(hash_password, password, self.settings)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Check password against stored hash."""
+        return self._run(verify_password, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Check if stored hash was made with outdated algorithm or cost."""
+        cfg = self.settings
+        if cfg.algorithm == Algorithm.argon2:
+            return not pwhash.startswith("$argon2") or _argon2_hasher(
+                cfg
+            ).check_needs_rehash(pwhash)
+
+        if cfg.algorithm == Algorithm.scrypt:
+            prefix = f"scrypt:{cfg.scrypt_n}:{cfg.scrypt_r}:{cfg.scrypt_p}$"
+        else:
+            prefix = f"pbkdf2:{cfg.pbkdf2_digest}:{cfg.pbkdf2_iterations}$"
+        return not pwhash.startswith(prefix)
+
+    def _run(self, func: Callable[..., T], *args) -> T:
+        if not self.settings.pool_size:
+            return func(*args)
+
+        if not self._slots.acquire(timeout=self.settings.timeout):
+            raise HashingUnavailable("Too many pending hashing tasks")
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.settings.timeout)
+        except FutureTimeoutError as exc:
+            raise HashingUnavailable("Hashing timed out") from exc
+        except BrokenProcessPool as exc:
+            self._executor_pid = None
+            raise HashingUnavailable("Hashing pool is broken") from exc
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Pool must be created after uwsgi forks the worker
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.settings.pool_size,
+                    initializer=_watch_parent,
+                    initargs=(os.getpid(),),
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+hasher = PasswordHasher(HashingSettings())
@@ -0,0 +1,176 @@
+__all__ = ["KeyRing", "generate_key", "key_ring", "setup"]
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+from jwt.exceptions import InvalidTokenError
+from jwt.utils import base64url_encode
+
+from .config import JWTSettings
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = {
+    "RS256": (rsa.RSAPublicKey, RSAAlgorithm),
+    "ES256": (ec.EllipticCurvePublicKey, ECAlgorithm),
+    "EdDSA": (ed25519.Ed25519PublicKey, OKPAlgorithm),
+}
+
+
+def _to_jwk(alg: str, public_key) -> Dict[str, str]:
+    if alg == "ES256":
+        # PyJWT 2.3 can't export EC keys, coordinates are fixed size
+        numbers = public_key.public_numbers()
+        return {
+            "kty": "EC",
+            "crv": "P-256",
+            "x": base64url_encode(numbers.x.to_bytes(32, "big")).decode(),
+            "y": base64url_encode(numbers.y.to_bytes(32, "big")).decode(),
+        }
+    return json.loads(ALGORITHMS[alg][1].to_jwk(public_key))
+
+
+def _algorithm_for(public_key) -> str:
+    for name, (key_type, _) in ALGORITHMS.items():
+        if isinstance(public_key, key_type):
+            return name
+    raise ValueError(f"Unsupported key type: {type(public_key).__name__}")
+
+
+class KeyRing:
+    """Asymmetric JWT keys indexed by `kid`.
+
+    Keys are read from `<kid>.pem` files: a private key can sign and verify,
+    a public key can only verify. Rotation without downtime:
+
+    1. put a new key into the directory and restart - it gets published
+       in JWKS, but the old key still signs;
+    2. once consumers have refreshed JWKS, point `JWT_ACTIVE_KID` to it;
+    3. remove the old key after its last token has expired.
+    """
+
+    def __init__(self, active_kid: str, private_keys: Dict[str, Any], public_keys):
+        if active_kid not in private_keys:
+            raise ValueError(f"No private key for active kid {active_kid!r}")
+        self.active_kid = active_kid
+        self._private_keys = private_keys
+        self._public_keys: Dict[str, Any] = public_keys
+        self._jwks: Optional[Dict[str, List[Dict[str, str]]]] = None
+
+    @classmethod
+    def load(cls, keys_dir: str, active_kid: Optional[str] = None) -> "KeyRing":
+        """Load all `*.pem` keys from directory."""
+        private_keys, public_keys = {}, {}
+        for path in sorted(Path(keys_dir).glob("*.pem")):
+            data = path.read_bytes()
+            if b"PRIVATE KEY" in data:
+                key = serialization.load_pem_private_key(data, password=None)
+                private_keys[path.stem] = key
+                public_keys[path.stem] = key.public_key()
+            else:
+                public_keys[path.stem] = serialization.load_pem_public_key(data)
+
+        if not private_keys:
+            raise ValueError(f"No private keys found in {keys_dir}")
+
+        # Newest key by name is used by default, so name keys sortable
+        active_kid = active_kid or sorted(private_keys)[-1]
+        logger.warning("JWT keys loaded: %s, active: %s", list(public_keys), active_kid)
+        return cls(active_kid, private_keys, public_keys)
+
+    @property
+    def algorithm(self) -> str:
+        """Signing algorithm of active key."""
+        return _algorithm_for(self._public_keys[self.active_kid])
+
+    @property
+    def algorithms(self) -> List[str]:
+        """All algorithms accepted for verification."""
+        return sorted({_algorithm_for(key) for key in self._public_keys.values()})
+
+    def signing_key(self):
+        return self._private_keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]):
+        try:
+            return self._public_keys[kid]
+        except KeyError:
+            raise InvalidTokenError(f"Unknown key id: {kid}") from None
+
+    def jwks(self) -> Dict[str, List[Dict[str, str]]]:
+        """Return public keys as JSON Web Key Set."""
+        if self._jwks is None:
+            keys = []
+            for kid, public_key in self._public_keys.items():
+                alg = _algorithm_for(public_key)
+                jwk = _to_jwk(alg, public_key)
+                jwk.update(kid=kid, alg=alg, use="sig")
+                keys.append(jwk)
+            self._jwks = {"keys": keys}
+        return self._jwks
+
+
+def generate_key(keys_dir: str, kid: str, algorithm: str) -> Path:
+    """Generate private key file for the key ring."""
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    path = Path(keys_dir) / f"{kid}.pem"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(
+            key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption(),
+            )
+        )
+    return path
+
+
+def setup(app: Flask, jwt: JWTManager):
+    """Configure JWT signing with the key ring or shared secret."""
+    if key_ring is None:
+        app.config["JWT_SECRET_KEY"] = _settings.secret
+        return
+
+    app.config["JWT_ALGORITHM"] = key_ring.algorithm
+    app.config["JWT_DECODE_ALGORITHMS"] = key_ring.algorithms
+
+    # noinspection PyUnusedLocal
+    @jwt.encode_key_loader
+    def encode_key(identity):
+        return key_ring.signing_key()
+
+    # noinspection PyUnusedLocal
+    @jwt.additional_headers_loader
+    def kid_header(identity):
+        return {"kid": key_ring.active_kid}
+
+    # noinspection PyUnusedLocal
+    @jwt.decode_key_loader
+    def decode_key(jwt_header, jwt_payload):
+        return key_ring.verification_key(jwt_header.get("kid"))
+
+
+_settings = JWTSettings()
+key_ring: Optional[KeyRing] = (
+    KeyRing.load(_settings.keys_dir, _settings.active_kid)
+    if _settings.keys_dir
+    else None
+)
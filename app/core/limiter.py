@@ -1,25 +1,51 @@
 from flask import Flask
-from flask_jwt_extended import current_user
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from jwt import PyJWTError
+from limits.strategies import STRATEGIES
+from werkzeug.local import LocalProxy
 
 from .config import RateLimitSettings
+from .gcra import GCRARateLimiter
+from .redis import redis_factory
+
+STRATEGIES[RateLimitSettings.Strategy.gcra.value] = GCRARateLimiter
 
 
 def key_function() -> str:
-    """Return user's id or ip."""
+    """
+    Return user's id from access token claims or ip
+    Limits are checked before the view verifies the token, then it's verified
+    here; user loader is lazy, so neither way touches the user cache or database
+    """
     try:
-        user = current_user()
+        claims = get_jwt()
     except RuntimeError:
-        return get_remote_address()
-    else:
-        return str(user.id)
+        try:
+            verify_jwt_in_request(optional=True)
+            claims = get_jwt()
+        except (JWTExtendedException, PyJWTError):
+            claims = {}
+    identity = claims.get("sub")
+    if isinstance(identity, dict) and identity.get("user_id"):
+        return str(identity["user_id"])
+    return get_remote_address()
 
 
 limiter_settings = RateLimitSettings()
+if limiter_settings.shared_pool:
+    # Scheme only selects storage, connections come from the shared pool
+    storage_uri = "redis://"
+    storage_options = {"connection_pool": LocalProxy(redis_factory.pool)}
+else:
+    storage_uri, storage_options = limiter_settings.storage_uri, {}
+
 limiter = Limiter(
     key_func=key_function,
-    storage_uri=limiter_settings.storage_uri,
+    storage_uri=storage_uri,
+    storage_options=storage_options,
     strategy=limiter_settings.strategy,
     default_limits=limiter_settings.default,
     default_limits_per_method=limiter_settings.default_limits_per_method,
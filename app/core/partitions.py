@@ -0,0 +1,214 @@
+__all__ = [
+    "ExpiredAction",
+    "PartitionManager",
+    "PartitionReport",
+    "Period",
+    "partition_manager",
+]
+
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from .alchemy import db
+from .config import PartitionSettings
+
+logger = logging.getLogger(__name__)
+
+Period = PartitionSettings.Period
+ExpiredAction = PartitionSettings.ExpiredAction
+
+TABLE = "sessions"
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+PARTITIONS_QUERY = text(
+    """
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :table
+    ORDER BY child.relname
+    """
+)
+
+
+class PartitionReport(BaseModel):
+    """Represents result of partitions maintenance run."""
+
+    locked: bool = True
+    created: List[str] = []
+    existing: List[str] = []
+    skipped: List[str] = []
+    expired: List[str] = []
+
+
+def period_start(day: date, period: Period) -> date:
+    """Return first day of period containing `day`."""
+    if period == Period.day:
+        return day
+    if period == Period.week:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(start: date, period: Period) -> date:
+    if period == Period.day:
+        return start + timedelta(days=1)
+    if period == Period.week:
+        return start + timedelta(weeks=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def previous_period(start: date, period: Period) -> date:
+    if period == Period.day:
+        return start - timedelta(days=1)
+    if period == Period.week:
+        return start - timedelta(weeks=1)
+    return period_start(start - timedelta(days=1), period)
+
+
+def partition_name(start: date, period: Period) -> str:
+    """Name partition like the ones from initial migration."""
+    if period == Period.day:
+        return f"{TABLE}_y{start:%Y}m{start:%m}d{start:%d}"
+    if period == Period.week:
+        year, week, _ = start.isocalendar()
+        return f"{TABLE}_y{year}w{week:02d}"
+    return f"{TABLE}_y{start:%Y}m{start:%m}"
+
+
+class PartitionManager:
+    """Keeps `sessions` partitions ahead of time and expires old ones.
+
+    Every run is idempotent and holds a transaction level advisory lock,
+    so it's safe to run from every replica: the one that didn't get the lock
+    just skips the run. Each partition is created in its own savepoint,
+    a range clashing with a manually created partition is skipped.
+    """
+
+    def __init__(self, settings: PartitionSettings):
+        self.settings = settings
+        self._scheduler_pid: Optional[int] = None
+
+    def plan(self, today: date) -> Iterator[Tuple[str, date, date]]:
+        """Yield `(name, from, to)` for current period and `ahead` next ones."""
+        start = period_start(today, self.settings.period)
+        for _ in range(self.settings.ahead + 1):
+            end = next_period(start, self.settings.period)
+            yield partition_name(start, self.settings.period), start, end
+            start = end
+
+    def cutoff(self, today: date) -> Optional[date]:
+        """Return date partitions ending before are expired."""
+        if self.settings.retention is None:
+            return None
+        start = period_start(today, self.settings.period)
+        for _ in range(self.settings.retention):
+            start = previous_period(start, self.settings.period)
+        return start
+
+    def run(
+        self, today: Optional[date] = None, dry_run: bool = False
+    ) -> PartitionReport:
+        """Create missing partitions and expire old ones."""
+        today = today or datetime.utcnow().date()
+        report = PartitionReport()
+        with db.engine.connect() as connection:
+            with connection.begin() as transaction:
+                locked = connection.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:id)"),
+                    {"id": self.settings.lock_id},
+                ).scalar()
+                if not locked:
+                    report.locked = False
+                    return report
+
+                rows = connection.execute(PARTITIONS_QUERY, {"table": TABLE})
+                existing = {name: bound for name, bound in rows}
+                for name, start, end in self.plan(today):
+                    if name in existing:
+                        report.existing.append(name)
+                    elif self._create(connection, name, start, end):
+                        report.created.append(name)
+                    else:
+                        report.skipped.append(name)
+
+                for name in self._expired(existing, today):
+                    self._expire(connection, name)
+                    report.expired.append(name)
+
+                # DDL is transactional, so dry run reports real outcome
+                if dry_run:
+                    transaction.rollback()
+        return report
+
+    def start_scheduler(self, app: Flask):
+        """Start periodic maintenance once per worker process."""
+        if not self.settings.scheduler or self._scheduler_pid == os.getpid():
+            return
+        self._scheduler_pid = os.getpid()
+        thread = threading.Thread(
+            target=self._schedule, args=(app,), name="partitions", daemon=True
+        )
+        thread.start()
+
+    def _expired(self, partitions: Dict[str, str], today: date) -> Iterator[str]:
+        cutoff = self.cutoff(today)
+        if cutoff is None:
+            return
+        for name, bound in partitions.items():
+            # Default partition has no upper bound
+            upper = UPPER_BOUND.search(bound)
+            if upper and date.fromisoformat(upper.group(1)[:10]) <= cutoff:
+                yield name
+
+    @staticmethod
+    def _create(connection: Connection, name: str, start: date, end: date) -> bool:
+        savepoint = connection.begin_nested()
+        try:
+            connection.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                    "FOR VALUES FROM (:start) TO (:end)"
+                ),
+                {"start": start, "end": end},
+            )
+        except DBAPIError as exc:
+            savepoint.rollback()
+            logger.warning("Partition %s skipped: %s", name, exc.orig)
+            return False
+        savepoint.commit()
+        return True
+
+    def _expire(self, connection: Connection, name: str):
+        if self.settings.expired_action == ExpiredAction.drop:
+            connection.execute(text(f"DROP TABLE {name}"))
+        else:
+            connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+
+    def _schedule(self, app: Flask):
+        while True:
+            try:
+                with app.app_context():
+                    report = self.run()
+                if report.created or report.expired:
+                    logger.warning("Sessions partitions updated: %s", report)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Sessions partitions maintenance failed: %s", exc)
+            time.sleep(self.settings.interval)
+
+
+partition_manager = PartitionManager(PartitionSettings())
@@ -0,0 +1,49 @@
+__all__ = ["PermissionTable", "permission_table"]
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from .enums import DefaultRole
+
+CUSTOM_ROLES_OFFSET = 32
+
+
+class PermissionTable:
+    """Maps role names to bits of a compact permission mask.
+
+    Default roles take low bits in declaration order, roles from `roles`
+    table are placed after them by id, so masks stay the same across
+    workers and restarts.
+    """
+
+    def __init__(self):
+        self._bits: Dict[str, int] = self._default_bits()
+
+    def compile(self, roles: Iterable[Tuple[int, str]]):
+        """Rebuild table from `(id, name)` pairs of `roles` table."""
+        bits = self._default_bits()
+        for role_id, name in roles:
+            bits.setdefault(name, CUSTOM_ROLES_OFFSET + role_id)
+        self._bits = bits
+
+    def encode(self, role_names: Iterable[str]) -> str:
+        """Pack role names into hex mask for token claims."""
+        mask = 0
+        for name in role_names:
+            bit = self._bits.get(name)
+            if bit is not None:
+                mask |= 1 << bit
+        return format(mask, "x")
+
+    def allows(self, mask: str, role: str) -> Optional[bool]:
+        """Check role in mask, `None` if role is unknown to this table."""
+        bit = self._bits.get(role)
+        if bit is None:
+            return None
+        return bool(int(mask, 16) >> bit & 1)
+
+    @staticmethod
+    def _default_bits() -> Dict[str, int]:
+        return {role.value: bit for bit, role in enumerate(DefaultRole)}
+
+
+permission_table = PermissionTable()
@@ -1,10 +1,199 @@
-__all__ = ["redis"]
+__all__ = [
+    "RedisFactory",
+    "async_redis",
+    "keyspace_usage",
+    "redis",
+    "redis_factory",
+    "redis_listener",
+]
 
-from redis import Redis
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from redis import BlockingConnectionPool, ConnectionPool, Redis
+from redis import asyncio as aioredis
+from werkzeug.local import LocalProxy
 
 from .config import RedisSettings
 
-_cfg = RedisSettings()
-redis = Redis(
-    host=_cfg.host, port=_cfg.port, db=_cfg.db, encoding="utf-8", decode_responses=True
-)
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    postfork = None
+
+# Key family is everything up to the first separator
+FAMILY_PATTERN = re.compile(r"^[^:/]*[:/]")
+OTHER_FAMILY = "<other>"
+
+Pool = Union[ConnectionPool, aioredis.ConnectionPool]
+
+
+def key_family(key: str) -> str:
+    """Return prefix grouping the key, e.g. `rt:` for refresh tokens."""
+    match = FAMILY_PATTERN.match(key)
+    return match.group() if match else OTHER_FAMILY
+
+
+def _scan_batches(match: str, count: int) -> Iterator[List[str]]:
+    cursor = None
+    while cursor != 0:
+        cursor, keys = redis.scan(cursor or 0, match=match, count=count)
+        if keys:
+            yield keys
+
+
+def keyspace_usage(match: str = "*", count: int = 1000) -> List[Tuple[str, int, int]]:
+    """
+    Walk keyspace with SCAN and sum MEMORY USAGE by key family
+    Return `(family, keys, bytes)` sorted by memory, largest first
+    """
+    keys_by_family: Dict[str, int] = defaultdict(int)
+    bytes_by_family: Dict[str, int] = defaultdict(int)
+    for keys in _scan_batches(match, count):
+        pipe = redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+        for key, usage in zip(keys, pipe.execute()):
+            family = key_family(key)
+            keys_by_family[family] += 1
+            # Key may expire between SCAN and MEMORY USAGE
+            bytes_by_family[family] += usage or 0
+
+    rows = [
+        (family, keys_by_family[family], bytes_by_family[family])
+        for family in keys_by_family
+    ]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+class RedisFactory:
+    """Connection pools of the current process.
+
+    Pools are created on first use in every process, so connections opened
+    by uwsgi master are never shared by forked workers. Clients hold a proxy
+    resolving to the pool of the current process, so they and the scripts
+    registered on them may be created at import time. Blocking pool makes
+    greenlets queue for a free connection when all `max_connections` are
+    busy. Listeners waiting on blocking reads use a separate small pool
+    without socket timeout. Asyncio serving mode gets its own client with
+    a pool of the same size, opened from its event loop on startup.
+    """
+
+    LISTENER_CONNECTIONS = 4
+
+    def __init__(self, settings: RedisSettings):
+        self.settings = settings
+        self._pools: Dict[str, Pool] = {}
+        self._async_client: Optional[aioredis.Redis] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def pool(self) -> ConnectionPool:
+        return self._get("main")
+
+    def listener_pool(self) -> ConnectionPool:
+        return self._get("listener")
+
+    def async_pool(self) -> aioredis.ConnectionPool:
+        return self._get("async")
+
+    def async_client(self) -> aioredis.Redis:
+        """Return asyncio client, call it from the loop going to use it."""
+        pool = self.async_pool()
+        client = self._async_client
+        if client is None or client.connection_pool is not pool:
+            client = self._async_client = aioredis.Redis(connection_pool=pool)
+        return client
+
+    async def close_async(self):
+        """Disconnect asyncio client of the current process, if any."""
+        pool = self._pools.pop("async", None) if self._pid == os.getpid() else None
+        self._async_client = None
+        if pool is not None:
+            await pool.disconnect()
+
+    def reset(self):
+        """Forget pools inherited from parent process.
+
+        Inherited sockets are dropped without closing, they still belong
+        to the parent.
+        """
+        with self._lock:
+            self._pools = {}
+            self._async_client = None
+            self._pid = os.getpid()
+
+    def stats(self) -> Dict[str, int]:
+        """Return connections usage of the main pool in this process."""
+        pool = self._pools.get("main") if self._pid == os.getpid() else None
+        if pool is None:
+            created = idle = 0
+        # Neither pool exposes its counters publicly
+        elif isinstance(pool, BlockingConnectionPool):
+            created = len(pool._connections)
+            idle = sum(1 for connection in list(pool.pool.queue) if connection)
+        else:
+            created = pool._created_connections
+            idle = len(pool._available_connections)
+        return {
+            "max_connections": self.settings.max_connections,
+            "created": created,
+            "in_use": created - idle,
+            "idle": idle,
+        }
+
+    def _get(self, name: str) -> Pool:
+        if self._pid != os.getpid():
+            self.reset()
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = self._pools[name] = self._create(name)
+        return pool
+
+    def _create(self, name: str) -> Pool:
+        cfg = self.settings
+        kwargs = {
+            "host": cfg.host,
+            "port": cfg.port,
+            "db": cfg.db,
+            "encoding": "utf-8",
+            "decode_responses": True,
+            "socket_connect_timeout": cfg.socket_connect_timeout,
+            "health_check_interval": cfg.health_check_interval,
+        }
+        if name == "listener":
+            return ConnectionPool(max_connections=self.LISTENER_CONNECTIONS, **kwargs)
+
+        kwargs["socket_timeout"] = cfg.socket_timeout
+        if name == "async":
+            if cfg.blocking_pool:
+                return aioredis.BlockingConnectionPool(
+                    max_connections=cfg.max_connections,
+                    timeout=cfg.pool_timeout,
+                    **kwargs,
+                )
+            return aioredis.ConnectionPool(
+                max_connections=cfg.max_connections, **kwargs
+            )
+
+        if cfg.blocking_pool:
+            return BlockingConnectionPool(
+                max_connections=cfg.max_connections, timeout=cfg.pool_timeout, **kwargs
+            )
+        return ConnectionPool(max_connections=cfg.max_connections, **kwargs)
+
+
+redis_factory = RedisFactory(RedisSettings())
+redis = Redis(connection_pool=LocalProxy(redis_factory.pool))
+redis_listener = Redis(connection_pool=LocalProxy(redis_factory.listener_pool))
+# Resolved on use only, so processes not serving asyncio never create it
+async_redis = LocalProxy(redis_factory.async_client)
+
+if postfork is not None:
+    postfork(redis_factory.reset)
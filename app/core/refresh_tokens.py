@@ -0,0 +1,146 @@
+__all__ = ["RefreshTokenStore", "device_id", "refresh_tokens"]
+
+from datetime import timedelta
+from hashlib import blake2b
+from typing import Optional, Union
+from uuid import UUID
+
+from redis.commands.core import AsyncScript
+
+from .enums import Rotation
+from .redis import async_redis, redis
+
+KEY_PREFIX = "rt:"
+DEVICE_ID_SIZE = 8
+
+# Every field holds `<jti>|<family>|<exp>`, fields past their expiry are
+# dropped and the hash expires with the latest of the rest. ARGV[#ARGV] is
+# lifetime of a new token.
+PRUNE = """
+local now = tonumber(redis.call("TIME")[1])
+local ttl = tonumber(ARGV[#ARGV])
+local latest = 0
+local fields = redis.call("HGETALL", KEYS[1])
+for i = 1, #fields, 2 do
+    local exp = tonumber(string.match(fields[i + 1], "^[^|]*|[^|]*|(%d+)$"))
+    if not exp then
+        -- Stored without expiry, it's no later than a new token one
+        exp = now + ttl
+        redis.call("HSET", KEYS[1], fields[i], fields[i + 1] .. "|" .. exp)
+    end
+    if exp <= now then
+        redis.call("HDEL", KEYS[1], fields[i])
+    elseif exp > latest then
+        latest = exp
+    end
+end
+
+local function put(device, jti, family)
+    local exp = now + ttl
+    redis.call("HSET", KEYS[1], device, jti .. "|" .. family .. "|" .. exp)
+    redis.call("EXPIREAT", KEYS[1], math.max(latest, exp))
+end
+"""
+
+# KEYS[1] - user key; ARGV - device, jti, family, ttl
+STORE_SCRIPT = (
+    PRUNE
+    + """
+put(ARGV[1], ARGV[2], ARGV[3])
+"""
+)
+
+# KEYS[1] - user key; ARGV - device, presented jti, family, new jti, ttl
+ROTATE_SCRIPT = (
+    PRUNE
+    + """
+local state = redis.call("HGET", KEYS[1], ARGV[1])
+if not state then
+    return "invalid"
+end
+local jti, family = string.match(state, "^([^|]*)|([^|]*)")
+if family ~= ARGV[3] then
+    return "invalid"
+end
+if jti ~= ARGV[2] then
+    redis.call("HDEL", KEYS[1], ARGV[1])
+    return "reused"
+end
+put(ARGV[1], ARGV[4], ARGV[3])
+return "rotated"
+"""
+)
+
+UserId = Union[str, UUID]
+
+
+def device_id(user_agent: str) -> str:
+    """Short stable digest of User-Agent header."""
+    return blake2b(user_agent.encode(), digest_size=DEVICE_ID_SIZE).hexdigest()
+
+
+class RefreshTokenStore:
+    """Current refresh token of every user device.
+
+    All devices of a user share one hash `rt:<user id>`, a field per device
+    holds `<jti>|<family>|<exp>` of its last refresh token. Family is started
+    on login and inherited by every rotated token, so presenting an already
+    rotated token of the family means it has leaked: the whole family is
+    dropped and the device has to log in again. Every write drops fields of
+    expired tokens, the hash lives as long as the latest token issued to any
+    of the user devices.
+    """
+
+    def __init__(self):
+        self._store = redis.register_script(STORE_SCRIPT)
+        self._rotate = redis.register_script(ROTATE_SCRIPT)
+        self._rotate_async: Optional[AsyncScript] = None
+
+    def store(
+        self, user_id: UserId, user_agent: str, jti: str, family: str, ttl: timedelta
+    ):
+        """Start new token family for device."""
+        args = [device_id(user_agent), jti, family, int(ttl.total_seconds())]
+        self._store(keys=[self._key(user_id)], args=args)
+
+    def rotate(
+        self,
+        user_id: UserId,
+        user_agent: str,
+        jti: str,
+        family: str,
+        new_jti: str,
+        ttl: timedelta,
+    ) -> Rotation:
+        """Replace presented token with the new one in a single round trip."""
+        args = [device_id(user_agent), jti, family, new_jti, int(ttl.total_seconds())]
+        return Rotation(self._rotate(keys=[self._key(user_id)], args=args))
+
+    async def rotate_async(
+        self,
+        user_id: UserId,
+        user_agent: str,
+        jti: str,
+        family: str,
+        new_jti: str,
+        ttl: timedelta,
+    ) -> Rotation:
+        """Same as `rotate` for asyncio serving mode."""
+        if self._rotate_async is None:
+            self._rotate_async = async_redis.register_script(ROTATE_SCRIPT)
+        args = [device_id(user_agent), jti, family, new_jti, int(ttl.total_seconds())]
+        result = await self._rotate_async(
+            keys=[self._key(user_id)], args=args, client=async_redis
+        )
+        return Rotation(result)
+
+    def revoke(self, user_id: UserId, user_agent: str):
+        """Drop device token family."""
+        redis.hdel(self._key(user_id), device_id(user_agent))
+
+    @staticmethod
+    def _key(user_id: UserId) -> str:
+        return f"{KEY_PREFIX}{user_id}"
+
+
+refresh_tokens = RefreshTokenStore()
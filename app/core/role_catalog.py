@@ -0,0 +1,88 @@
+__all__ = ["RoleCatalog", "role_catalog"]
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import versions
+from .config import RoleCatalogSettings
+from .permissions import permission_table
+
+RolesLoader = Callable[[], Iterable[Tuple[int, str]]]
+
+# Version of a copy loaded while Redis was unreachable
+UNVERSIONED = ""
+
+
+class RoleCatalog:
+    """Process-wide copy of `roles` table tagged with a version.
+
+    The version is a marker in Redis replaced after every committed change,
+    each worker compares it with the version of its copy at most once per
+    `check_interval` and reloads the table when they differ. Permission
+    table is recompiled on every reload.
+    """
+
+    def __init__(self, settings: RoleCatalogSettings):
+        self.settings = settings
+        self._by_id: Dict[int, str] = {}
+        self._by_name: Dict[str, int] = {}
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    def roles(self) -> List[Tuple[int, str]]:
+        """Return `(id, name)` pairs ordered by id."""
+        return sorted(self._by_id.items())
+
+    def name(self, role_id: int) -> Optional[str]:
+        return self._by_id.get(role_id)
+
+    def id(self, name: str) -> Optional[int]:
+        return self._by_name.get(name)
+
+    @property
+    def due(self) -> bool:
+        """Tell whether `ensure_fresh` is going to check the version."""
+        return (
+            self._version is None
+            or time.monotonic() - self._checked_at >= self.settings.check_interval
+        )
+
+    def ensure_fresh(self, loader: RolesLoader):
+        """Reload catalog if its version in Redis has changed."""
+        if not self.due:
+            return
+
+        with self._lock:
+            version = versions.marker(self.settings.version_key)
+            if version is None:
+                if self._version is not None:
+                    return
+                version = UNVERSIONED
+            self._checked_at = time.monotonic()
+            if version != self._version:
+                self._load(loader, version)
+
+    def bump(self, loader: RolesLoader):
+        """Announce committed change of roles and reload local copy."""
+        version = versions.bump(self.settings.version_key) or UNVERSIONED
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load(loader, version)
+
+    def _load(self, loader: RolesLoader, version: str):
+        # Version is read before loading, so a concurrent change leaves
+        # the copy older than its version and it's reloaded on next check
+        roles = list(loader())
+        self._by_id = dict(roles)
+        self._by_name = {name: role_id for role_id, name in roles}
+        self._version = version
+        permission_table.compile(roles)
+
+
+role_catalog = RoleCatalog(RoleCatalogSettings())
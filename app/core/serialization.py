@@ -0,0 +1,65 @@
+__all__ = ["Serializer", "serializer"]
+
+from http import HTTPStatus
+from typing import Any, Iterable, Mapping, Type
+
+from flask import Response, make_response
+from pydantic import BaseModel
+
+from .config import SerializationSettings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Backend = SerializationSettings.Backend
+
+
+class Serializer:
+    """Turns plain data shaped like a response model into JSON response.
+
+    Handlers build dicts straight from SQLAlchemy result rows, keyed by
+    fields of the response model. With `orjson` backend they are dumped as
+    is, without building a model per row. Default backend parses them with
+    the model and encodes like `flask_pydantic` does, so the model stays
+    the documented schema of both.
+    """
+
+    def __init__(self, settings: SerializationSettings):
+        self.settings = settings
+        if settings.backend == Backend.orjson and orjson is None:
+            raise RuntimeError("orjson is required for orjson serialization backend")
+
+    @property
+    def fast(self) -> bool:
+        return self.settings.backend == Backend.orjson
+
+    def response(
+        self,
+        content: Any,
+        model: Type[BaseModel],
+        many: bool = False,
+        status: HTTPStatus = HTTPStatus.OK,
+    ) -> Response:
+        if self.fast:
+            body = orjson.dumps(content)
+        elif many:
+            body = f"[{', '.join(model.parse_obj(item).json() for item in content)}]"
+        else:
+            body = model.parse_obj(content).json()
+        response = make_response(body, status)
+        response.mimetype = "application/json"
+        return response
+
+    def lines(self, rows: Iterable[Mapping], model: Type[BaseModel]) -> bytes:
+        """Encode rows as newline delimited JSON."""
+        if self.fast:
+            encoded = [orjson.dumps(dict(row)) for row in rows]
+        else:
+            encoded = [model.parse_obj(row).json().encode() for row in rows]
+        encoded.append(b"")
+        return b"\n".join(encoded)
+
+
+serializer = Serializer(SerializationSettings())
@@ -0,0 +1,214 @@
+__all__ = ["LoginEvent", "SessionWriter", "session_writer"]
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Union
+from uuid import UUID, uuid4
+
+from flask import Flask
+from pydantic import BaseModel, Field, ValidationError
+from redis.exceptions import RedisError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from ..models.db_models import Session
+from . import versions
+from .alchemy import db
+from .config import SessionWriterSettings
+from .redis import redis
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 0.1
+
+# KEYS - buffer, last login key; ARGV - event, max pending, last login ttl
+PUSH_SCRIPT = """
+if redis.call("LLEN", KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("RPUSH", KEYS[1], ARGV[1])
+redis.call("SET", KEYS[2], ARGV[1], "EX", ARGV[3])
+return 1
+"""
+
+# KEYS - buffer, lock, dead letters; ARGV - lock token, written, dead events
+TRIM_SCRIPT = """
+if redis.call("GET", KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+redis.call("LTRIM", KEYS[1], ARGV[2], -1)
+for i = 3, #ARGV do
+    redis.call("RPUSH", KEYS[3], ARGV[i])
+end
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+UserId = Union[str, UUID]
+
+
+class LoginEvent(BaseModel):
+    """Represents login waiting to be written into sessions history."""
+
+    id: UUID = Field(default_factory=uuid4)
+    user_id: UUID
+    user_agent: str
+    auth_date: datetime = Field(default_factory=datetime.utcnow)
+
+
+class SessionWriter:
+    """Write-behind buffer for sessions history.
+
+    When enabled, logins are pushed to a Redis list and bulk inserted by
+    a flusher thread, only one worker flushes at a time. Events are removed
+    from the buffer after commit and inserted ignoring conflicts, so a
+    flusher dying half way can't lose or duplicate rows. The last login of
+    every user is kept aside until it surely reached the database.
+
+    Batch is trimmed only while its flusher still holds the lock, a batch
+    outliving the lock is left for the next flush. Events the database
+    rejects are moved to `dead_letters` list, so they can't block the
+    buffer.
+    """
+
+    def __init__(self, settings: SessionWriterSettings):
+        self.settings = settings
+        self._push = redis.register_script(PUSH_SCRIPT)
+        self._trim = redis.register_script(TRIM_SCRIPT)
+        self._release = redis.register_script(RELEASE_SCRIPT)
+        self._app: Optional[Flask] = None
+        self._flusher_pid: Optional[int] = None
+
+    def record(self, user_id: UserId, user_agent: str):
+        """Put login into buffer or add it to current transaction.
+
+        Caller commits the transaction in both cases.
+        """
+        event = LoginEvent(user_id=user_id, user_agent=user_agent)
+        if self.settings.enabled and self._buffer(event):
+            return
+        db.session.execute(insert(Session).values(event.dict()))
+
+    def last_login(self, user_id: UserId) -> Optional[LoginEvent]:
+        """Return user's latest login if it may be still buffered."""
+        if not self.settings.enabled:
+            return None
+        try:
+            raw = redis.get(self._last_login_key(user_id))
+        except RedisError as exc:
+            logger.warning("Unable to read last login of %s: %s", user_id, exc)
+            return None
+        return LoginEvent.parse_raw(raw) if raw else None
+
+    def start(self, app: Flask):
+        """Start flusher once per worker process."""
+        if not self.settings.enabled or self._flusher_pid == os.getpid():
+            return
+        self._app = app
+        self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        thread.start()
+        atexit.register(self.flush_all)
+
+    def flush(self) -> int:
+        """Write one batch from buffer, return number of events written."""
+        token = str(uuid4())
+        lock = f"{self.settings.buffer}:lock"
+        if not redis.set(lock, token, nx=True, ex=self.settings.lock_ttl):
+            return 0
+
+        try:
+            end = self.settings.batch_size - 1
+            raw_events = redis.lrange(self.settings.buffer, 0, end)
+            if not raw_events:
+                return 0
+            dead = self._write(raw_events)
+            keys = [self.settings.buffer, lock, self.settings.dead_letters]
+            if not self._trim(keys=keys, args=[token, len(raw_events), *dead]):
+                logger.warning("Sessions flush outlived its lock, batch is kept")
+                return 0
+            return len(raw_events)
+        finally:
+            self._release(keys=[lock], args=[token])
+
+    def flush_all(self):
+        """Drain buffer, used on shutdown."""
+        try:
+            while redis.llen(self.settings.buffer) and self.flush():
+                pass
+        except RedisError as exc:
+            logger.warning("Unable to flush sessions on shutdown: %s", exc)
+
+    def _buffer(self, event: LoginEvent) -> bool:
+        keys = [self.settings.buffer, self._last_login_key(event.user_id)]
+        args = [event.json(), self.settings.max_pending, self.settings.last_login_ttl]
+        try:
+            if self._push(keys=keys, args=args):
+                return True
+            logger.warning("Sessions buffer is full, writing synchronously")
+        except RedisError as exc:
+            logger.warning("Unable to buffer session, writing synchronously: %s", exc)
+        return False
+
+    def _write(self, raw_events: List[str]) -> List[str]:
+        """Insert events, return those the database will never accept."""
+        events, dead = [], []
+        for raw in raw_events:
+            try:
+                events.append((raw, LoginEvent.parse_raw(raw)))
+            except ValidationError as exc:
+                logger.warning("Bad session event %r: %s", raw, exc)
+                dead.append(raw)
+        if not events:
+            return dead
+
+        try:
+            self._insert([event for _raw, event in events])
+        except (DataError, IntegrityError):
+            # A single bad row fails the whole batch, find it row by row
+            for raw, event in events:
+                try:
+                    self._insert([event])
+                except (DataError, IntegrityError) as exc:
+                    logger.warning("Session %s is rejected: %s", event.id, exc.orig)
+                    dead.append(raw)
+        return dead
+
+    def _insert(self, events: List[LoginEvent]):
+        with self._app.app_context():
+            statement = insert(Session).values([event.dict() for event in events])
+            db.session.execute(statement.on_conflict_do_nothing())
+            db.session.commit()
+        # Earlier logins of a user were hidden behind the last one until now
+        versions.bump_sessions(*(event.user_id for event in events))
+
+    def _run(self):
+        flushed_at = time.monotonic()
+        while True:
+            try:
+                pending = redis.llen(self.settings.buffer)
+                due = time.monotonic() - flushed_at >= self.settings.flush_interval
+                if pending >= self.settings.batch_size or (pending and due):
+                    self.flush()
+                    flushed_at = time.monotonic()
+                else:
+                    time.sleep(CHECK_INTERVAL)
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.warning("Unable to flush sessions: %s", exc)
+                time.sleep(self.settings.retry_interval)
+
+    def _last_login_key(self, user_id: UserId) -> str:
+        return f"{self.settings.last_login_prefix}{user_id}"
+
+
+session_writer = SessionWriter(SessionWriterSettings())
@@ -0,0 +1,239 @@
+__all__ = ["CachedUser", "UserCache", "user_cache"]
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from uuid import UUID
+
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from .config import UserCacheSettings
+from .redis import async_redis, redis, redis_listener
+
+logger = logging.getLogger(__name__)
+
+UserId = Union[str, UUID]
+
+# Left in Redis by invalidation in place of the user
+TOMBSTONE = "-"
+
+
+class CachedUser(BaseModel):
+    """Represents user identity kept in cache."""
+
+    id: UUID
+    login: str
+    is_superuser: bool = False
+    roles: List[str] = []
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        """Build identity from `User` model instance."""
+        return cls(
+            id=user.id,
+            login=user.login,
+            is_superuser=bool(user.is_superuser),
+            roles=[role.name for role in user.roles],
+        )
+
+
+class UserCache:
+    """Two-tier user identity cache.
+
+    First tier is an in-process LRU with TTL, second one is shared Redis.
+    Invalidations are broadcast through Redis pub/sub, so every worker
+    drops its local copy as soon as user data changes.
+
+    A user loaded before an invalidation must not be cached after it.
+    Invalidation leaves a short-lived tombstone in Redis, loaded users
+    are stored only where there is neither the user nor a tombstone, and
+    a worker doesn't keep locally what it read before its own last
+    invalidation.
+    """
+
+    def __init__(self, settings: UserCacheSettings):
+        self.settings = settings
+        self._local: "OrderedDict[str, Tuple[float, CachedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener_pid: Optional[int] = None
+        self._generation = 0
+        self._counters: Dict[str, int] = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "invalidations": 0,
+        }
+
+    def get_or_load(
+        self, user_id: UserId, loader: Callable[[str], Optional[CachedUser]]
+    ) -> Optional[CachedUser]:
+        """Return cached user or load it with `loader` and cache the result."""
+        user_id = str(user_id)
+        if not self.settings.enabled:
+            return loader(user_id)
+
+        user = self._get_local(user_id)
+        if user is not None:
+            self._counters["local_hits"] += 1
+            return user
+
+        generation = self._generation
+        user = self._get_redis(user_id)
+        if user is not None:
+            self._counters["redis_hits"] += 1
+            self._set_local(user_id, user, generation)
+            return user
+
+        self._counters["misses"] += 1
+        user = loader(user_id)
+        if user is not None:
+            self._set_local(user_id, user, generation)
+            try:
+                redis.set(self._key(user_id), user.json(), **self._set_options())
+            except RedisError as exc:
+                logger.warning("Unable to store user %s in cache: %s", user_id, exc)
+        return user
+
+    async def get_or_load_async(
+        self,
+        user_id: UserId,
+        loader: Callable[[str], Awaitable[Optional[CachedUser]]],
+    ) -> Optional[CachedUser]:
+        """Same as `get_or_load` for asyncio serving mode."""
+        user_id = str(user_id)
+        if not self.settings.enabled:
+            return await loader(user_id)
+
+        user = self._get_local(user_id)
+        if user is not None:
+            self._counters["local_hits"] += 1
+            return user
+
+        generation = self._generation
+        try:
+            user = self._parse(await async_redis.get(self._key(user_id)))
+        except RedisError as exc:
+            logger.warning("Unable to read user %s from cache: %s", user_id, exc)
+        if user is not None:
+            self._counters["redis_hits"] += 1
+            self._set_local(user_id, user, generation)
+            return user
+
+        self._counters["misses"] += 1
+        user = await loader(user_id)
+        if user is not None:
+            self._set_local(user_id, user, generation)
+            try:
+                await async_redis.set(
+                    self._key(user_id), user.json(), **self._set_options()
+                )
+            except RedisError as exc:
+                logger.warning("Unable to store user %s in cache: %s", user_id, exc)
+        return user
+
+    def invalidate(self, *user_ids: UserId):
+        """Drop users from every tier and notify other workers."""
+        user_ids = tuple(str(user_id) for user_id in user_ids)
+        if not user_ids or not self.settings.enabled:
+            return
+
+        self._drop_local(user_ids)
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.set(self._key(user_id), TOMBSTONE, ex=self.settings.tombstone_ttl)
+            pipe.publish(self.settings.channel, ",".join(user_ids))
+            pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to invalidate users %s: %s", user_ids, exc)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters of the current worker."""
+        return {**self._counters, "local_size": len(self._local)}
+
+    def start_listener(self):
+        """Start invalidation listener once per worker process."""
+        if not self.settings.enabled or self._listener_pid == os.getpid():
+            return
+        self._listener_pid = os.getpid()
+        thread = threading.Thread(
+            target=self._listen, name="user-cache-listener", daemon=True
+        )
+        thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = redis_listener.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.settings.channel)
+                # Messages published while we were offline are lost,
+                # so local copies can't be trusted anymore
+                self._clear_local()
+                for message in pubsub.listen():
+                    self._drop_local(message["data"].split(","))
+            except RedisError as exc:
+                logger.warning("User cache listener disconnected: %s", exc)
+                time.sleep(self.settings.retry_interval)
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.settings.key_prefix}{user_id}"
+
+    def _set_options(self) -> dict:
+        # Neither a fresher copy nor a tombstone may be overwritten
+        return {"ex": self.settings.redis_ttl, "nx": True}
+
+    @staticmethod
+    def _parse(raw: Optional[str]) -> Optional[CachedUser]:
+        if not raw or raw == TOMBSTONE:
+            return None
+        return CachedUser.parse_raw(raw)
+
+    def _get_local(self, user_id: str) -> Optional[CachedUser]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return user
+
+    def _set_local(self, user_id: str, user: CachedUser, generation: int):
+        expires_at = time.monotonic() + self.settings.local_ttl
+        with self._lock:
+            # Read before an invalidation seen by this worker
+            if generation != self._generation:
+                return
+            self._local[user_id] = (expires_at, user)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.settings.local_size:
+                self._local.popitem(last=False)
+
+    def _get_redis(self, user_id: str) -> Optional[CachedUser]:
+        try:
+            raw = redis.get(self._key(user_id))
+        except RedisError as exc:
+            logger.warning("Unable to read user %s from cache: %s", user_id, exc)
+            return None
+        return self._parse(raw)
+
+    def _drop_local(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+        self._counters["invalidations"] += len(user_ids)
+
+    def _clear_local(self):
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+
+
+user_cache = UserCache(UserCacheSettings())
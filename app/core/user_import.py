@@ -0,0 +1,357 @@
+__all__ = [
+    "ImportCollisionError",
+    "ImportRecord",
+    "ImportReport",
+    "UserImporter",
+    "load_checkpoint",
+    "read_records",
+    "save_checkpoint",
+]
+
+import csv
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, ValidationError, root_validator, validator
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from . import versions
+from .alchemy import db
+from .config import HashingSettings
+from .enums import ImportCollision, ImportFormat, Provider
+from .hashing import hash_password
+from .user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+LIST_SEPARATOR = ";"
+
+STAGING_TABLES = """
+CREATE TEMP TABLE IF NOT EXISTS import_users (
+    id uuid, login text, password text, is_superuser boolean
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_roles (
+    login text, role text
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS import_social (
+    id uuid, login text, social_id text, social_name text
+) ON COMMIT DELETE ROWS;
+"""
+
+ON_CONFLICT = {
+    ImportCollision.skip: "ON CONFLICT (login) DO NOTHING",
+    ImportCollision.update: (
+        "ON CONFLICT (login) DO UPDATE SET "
+        "password = EXCLUDED.password, is_superuser = EXCLUDED.is_superuser"
+    ),
+    ImportCollision.fail: "",
+}
+
+# Users, their roles and social accounts go in one statement, roles and
+# accounts are attached only to users actually written by this batch
+MERGE = """
+WITH affected AS (
+    INSERT INTO users (id, login, password, is_superuser)
+    SELECT id, login, password, is_superuser FROM import_users
+    {on_conflict}
+    RETURNING id, login, xmax = 0 AS created
+), granted AS (
+    INSERT INTO users_roles (user_id, role_id)
+    SELECT affected.id, roles.id
+    FROM affected
+    JOIN import_roles ON import_roles.login = affected.login
+    JOIN roles ON roles.name = import_roles.role
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+), attached AS (
+    INSERT INTO social_account (id, user_id, social_id, social_name)
+    SELECT import_social.id, affected.id, social_id, social_name
+    FROM affected
+    JOIN import_social ON import_social.login = affected.login
+    ON CONFLICT DO NOTHING
+    RETURNING 1
+)
+SELECT id, created, (SELECT count(*) FROM granted), (SELECT count(*) FROM attached)
+FROM affected
+"""
+
+
+class ImportCollisionError(Exception):
+    """Raised when imported login exists and collisions are not allowed."""
+
+
+class SocialRecord(BaseModel):
+    social_name: Provider
+    social_id: str
+
+
+class ImportRecord(BaseModel):
+    """Represents user to import, either plain or hashed password is given."""
+
+    login: str
+    password: Optional[str]
+    password_hash: Optional[str]
+    is_superuser: bool = False
+    roles: List[str] = []
+    social: List[SocialRecord] = []
+
+    @root_validator(pre=True)
+    def blanks_to_none(cls, values):
+        # Empty CSV cells mean missing values
+        return {key: value for key, value in values.items() if value != ""}
+
+    @root_validator(skip_on_failure=True)
+    def password_given(cls, values):
+        if bool(values.get("password")) == bool(values.get("password_hash")):
+            raise ValueError("Either password or password_hash is required")
+        return values
+
+    @validator("roles", pre=True)
+    def split_roles(cls, value):
+        if isinstance(value, str):
+            return [role for role in value.split(LIST_SEPARATOR) if role]
+        return value
+
+    @validator("social", pre=True)
+    def split_social(cls, value):
+        # CSV cell holds `<provider>:<id>;<provider>:<id>`
+        if isinstance(value, str):
+            pairs = (item.split(":", 1) for item in value.split(LIST_SEPARATOR) if item)
+            return [{"social_name": name, "social_id": sid} for name, sid in pairs]
+        return value
+
+
+class ImportReport(BaseModel):
+    """Represents progress of users import, saved as checkpoint."""
+
+    source: str
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    roles_granted: int = 0
+    social_attached: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+def read_records(path: Path, fmt: ImportFormat) -> Iterator[Dict]:
+    """Stream raw records from CSV with header or JSON lines file."""
+    with path.open(newline="", encoding="utf-8") as source:
+        if fmt == ImportFormat.csv:
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+class UserImporter:
+    """Bulk loads users with roles and social accounts.
+
+    Records are processed in batches, each batch is copied into temporary
+    staging tables with COPY and merged by a single statement in its own
+    transaction. Plain passwords are hashed across a process pool, hashes
+    made by any supported algorithm are taken as is. Logins that already
+    exist are skipped, updated or stop the import depending on collision
+    policy. Report is saved to checkpoint file after every committed batch,
+    so an interrupted import resumes after the last one.
+    """
+
+    def __init__(
+        self,
+        collision: ImportCollision = ImportCollision.skip,
+        batch_size: int = 5000,
+        workers: Optional[int] = None,
+        hashing: Optional[HashingSettings] = None,
+    ):
+        self.collision = collision
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.hashing = hashing or HashingSettings()
+
+    def run(
+        self,
+        records: Iterable[Dict],
+        report: ImportReport,
+        checkpoint: Optional[Path] = None,
+        progress: Optional[Callable[[ImportReport], None]] = None,
+    ) -> ImportReport:
+        records = islice(records, report.processed, None)
+        executor = ProcessPoolExecutor(self.workers) if self.workers else None
+        started = time.monotonic() - report.elapsed
+        try:
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                self._import_batch(batch, report, executor)
+                report.elapsed = time.monotonic() - started
+                if checkpoint:
+                    save_checkpoint(checkpoint, report)
+                if progress:
+                    progress(report)
+        finally:
+            if executor:
+                executor.shutdown()
+        return report
+
+    def _import_batch(
+        self,
+        raw_records: List[Dict],
+        report: ImportReport,
+        executor: Optional[ProcessPoolExecutor],
+    ):
+        records: Dict[str, ImportRecord] = {}
+        invalid = 0
+        for number, raw in enumerate(raw_records, report.processed + 1):
+            try:
+                record = ImportRecord.parse_obj(raw)
+            except ValidationError as exc:
+                invalid += 1
+                logger.warning("Record %s skipped: %s", number, exc)
+                continue
+            # Last occurrence of a login wins
+            records[record.login] = record
+
+        records = self._resolve_collisions(records)
+        hashes = self._hash_passwords(list(records.values()), executor)
+        self._copy(list(records.values()), hashes)
+        statement = MERGE.format(on_conflict=ON_CONFLICT[self.collision])
+        try:
+            rows = db.session.execute(text(statement)).all()
+        except IntegrityError as exc:
+            db.session.rollback()
+            if self.collision != ImportCollision.fail:
+                raise
+            # Login taken by a concurrent writer after the check above
+            raise _collision_error(self._existing_logins(list(records))) from exc
+        db.session.commit()
+
+        updated = [user_id for user_id, created, _, _ in rows if not created]
+        if updated:
+            user_cache.invalidate(*updated)
+        if rows:
+            versions.bump(versions.USERS_VERSION_KEY)
+
+        _account(report, len(raw_records), invalid, rows)
+
+    def _resolve_collisions(
+        self, records: Dict[str, ImportRecord]
+    ) -> Dict[str, ImportRecord]:
+        """Drop or reject records of logins that already exist."""
+        existing = self._existing_logins(list(records))
+        if existing and self.collision == ImportCollision.fail:
+            raise _collision_error(existing)
+        if self.collision != ImportCollision.skip:
+            return records
+        return {
+            login: record for login, record in records.items() if login not in existing
+        }
+
+    @staticmethod
+    def _existing_logins(logins: List[str]) -> List[str]:
+        if not logins:
+            return []
+        rows = db.session.execute(
+            text("SELECT login FROM users WHERE login = ANY(:logins)"),
+            {"logins": logins},
+        )
+        return [login for login, in rows]
+
+    def _hash_passwords(
+        self, records: List[ImportRecord], executor: Optional[ProcessPoolExecutor]
+    ) -> List[str]:
+        plain = [record.password for record in records if record.password_hash is None]
+        if executor and plain:
+            chunksize = max(1, len(plain) // (self.workers * 4))
+            settings = repeat(self.hashing)
+            hashed = executor.map(hash_password, plain, settings, chunksize=chunksize)
+        else:
+            hashed = (hash_password(password, self.hashing) for password in plain)
+        hashed = iter(hashed)
+        return [record.password_hash or next(hashed) for record in records]
+
+    @staticmethod
+    def _copy(records: List[ImportRecord], hashes: List[str]):
+        users, roles, social = io.StringIO(), io.StringIO(), io.StringIO()
+        users_writer = csv.writer(users)
+        roles_writer = csv.writer(roles)
+        social_writer = csv.writer(social)
+        for record, password in zip(records, hashes):
+            users_writer.writerow(
+                [uuid.uuid4(), record.login, password, record.is_superuser]
+            )
+            for role in record.roles:
+                roles_writer.writerow([record.login, role])
+            for account in record.social:
+                social_writer.writerow(
+                    [
+                        uuid.uuid4(),
+                        record.login,
+                        account.social_id,
+                        account.social_name.value,
+                    ]
+                )
+
+        db.session.execute(text(STAGING_TABLES))
+        cursor = db.session.connection().connection.cursor()
+        try:
+            for table, columns, buffer in (
+                ("import_users", "id, login, password, is_superuser", users),
+                ("import_roles", "login, role", roles),
+                ("import_social", "id, login, social_id, social_name", social),
+            ):
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+        finally:
+            cursor.close()
+
+
+def _account(report: ImportReport, processed: int, invalid: int, rows: List):
+    # Every merged row holds batch-wide counts of granted roles and accounts
+    updated = sum(1 for _, created, _, _ in rows if not created)
+    report.processed += processed
+    report.invalid += invalid
+    report.created += len(rows) - updated
+    report.updated += updated
+    report.skipped += processed - invalid - len(rows)
+    if rows:
+        report.roles_granted += rows[0][2]
+        report.social_attached += rows[0][3]
+
+
+def _collision_error(logins: List[str]) -> ImportCollisionError:
+    return ImportCollisionError(
+        f"Logins already exist: {', '.join(sorted(logins)[:10])}"
+    )
+
+
+def load_checkpoint(path: Path, source: Path) -> Optional[ImportReport]:
+    """Read report of interrupted import of the same source file."""
+    if not path.exists():
+        return None
+    report = ImportReport.parse_file(path)
+    return report if report.source == str(source.resolve()) else None
+
+
+def save_checkpoint(path: Path, report: ImportReport):
+    # Replace atomically, so a crash never leaves a truncated checkpoint
+    temporary = path.with_name(f"{path.name}.tmp")
+    temporary.write_text(report.json())
+    os.replace(temporary, path)
@@ -0,0 +1,72 @@
+__all__ = [
+    "USERS_VERSION_KEY",
+    "bump",
+    "bump_sessions",
+    "marker",
+    "session_marker",
+    "session_version_key",
+]
+
+import logging
+from datetime import timedelta
+from typing import Optional, Union
+from uuid import UUID, uuid4
+
+from redis.exceptions import RedisError
+
+from .redis import redis
+
+logger = logging.getLogger(__name__)
+
+USERS_VERSION_KEY = "users:version"
+SESSION_VERSION_PREFIX = "sv:"
+SESSION_VERSION_TTL = timedelta(days=7)
+
+UserId = Union[str, UUID]
+
+
+# Markers are random tokens rather than counters, so a marker lost to expiry
+# or Redis restart never comes back with a value some client has seen.
+# Bump only after commit, otherwise a reader may tag old data with new marker
+
+
+def session_version_key(user_id: UserId) -> str:
+    return f"{SESSION_VERSION_PREFIX}{user_id}"
+
+
+def marker(key: str, ttl: Optional[timedelta] = None) -> Optional[str]:
+    """Return current version marker, creating it on first use."""
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.set(key, uuid4().hex, nx=True, ex=ttl)
+        pipe.get(key)
+        return pipe.execute()[1]
+    except RedisError as exc:
+        logger.warning("Unable to read version marker %s: %s", key, exc)
+        return None
+
+
+def bump(key: str, ttl: Optional[timedelta] = None) -> Optional[str]:
+    """Replace version marker after data it guards has changed."""
+    version = uuid4().hex
+    try:
+        redis.set(key, version, ex=ttl)
+    except RedisError as exc:
+        logger.warning("Unable to bump version marker %s: %s", key, exc)
+        return None
+    return version
+
+
+def session_marker(user_id: UserId) -> Optional[str]:
+    return marker(session_version_key(user_id), SESSION_VERSION_TTL)
+
+
+def bump_sessions(*user_ids: UserId):
+    """Replace sessions history markers of users in one round trip."""
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for user_id in set(user_ids):
+            pipe.set(session_version_key(user_id), uuid4().hex, ex=SESSION_VERSION_TTL)
+        pipe.execute()
+    except RedisError as exc:
+        logger.warning("Unable to bump sessions markers: %s", exc)
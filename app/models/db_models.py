@@ -1,17 +1,18 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import UUID
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from ..core.alchemy import db
+from ..core.hashing import hasher
 
 users_roles = db.Table(
     "users_roles",
     db.Model.metadata,
     db.Column("user_id", db.ForeignKey("users.id")),
     db.Column("role_id", db.ForeignKey("roles.id")),
+    UniqueConstraint("user_id", "role_id", name="uq_users_roles_user_id_role_id"),
 )
 
 
@@ -30,14 +31,27 @@ class User(db.Model):
     is_superuser = db.Column(db.Boolean, unique=False, default=False)
     roles = db.relationship("Role", secondary=users_roles, back_populates="users")
 
+    # Substring search pg_trgm index needs an extension, so only migration
+    # creates it
+    __table_args__ = (
+        Index(
+            "ix_users_login_lower_pattern",
+            func.lower(login).label("login_lower"),
+            postgresql_ops={"login_lower": "text_pattern_ops"},
+        ),
+    )
+
     def __repr__(self):
         return f"<User {self.login}>"
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return hasher.verify(self.password, password)
+
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password)
 
 
 class Role(db.Model):
@@ -55,6 +69,7 @@ class Session(db.Model):
     __tablename__ = "sessions"
     __table_args__ = (
         UniqueConstraint("id", "auth_date"),
+        Index("ix_sessions_user_id_auth_date_id", "user_id", "auth_date", "id"),
         {
             "postgresql_partition_by": "Range (auth_date)",
         },
@@ -1,8 +1,12 @@
 import re
-from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone
+from typing import List, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, conint, conlist, validator
+
+from app.core.config import JWTSettings
 
 
 class UserBody(BaseModel):
@@ -50,3 +54,72 @@ class RefreshBody(BaseModel):
 class HistoryBody(BaseModel):
     user_agent: str
     auth_date: datetime
+
+
+class HistoryCursor:
+    """Represents position in history ordered by `(auth_date, id)` descending."""
+
+    def __init__(self, auth_date: datetime, session_id: UUID):
+        self.auth_date = auth_date
+        self.session_id = session_id
+
+    def __str__(self) -> str:
+        raw = f"{self.auth_date.isoformat()}|{self.session_id}"
+        return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value) -> "HistoryCursor":
+        if isinstance(value, cls):
+            return value
+        try:
+            raw = urlsafe_b64decode(value + "=" * (-len(value) % 4)).decode()
+            auth_date, session_id = raw.split("|")
+            return cls(datetime.fromisoformat(auth_date), UUID(session_id))
+        except (TypeError, ValueError) as exc:
+            raise ValueError("Invalid cursor") from exc
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # auth_date is stored as naive UTC
+    if value and value.tzinfo:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class HistoryQueryBody(BaseModel):
+    page_size: conint(ge=1, le=100) = 10
+    cursor: Optional[HistoryCursor]
+    # Deprecated offset paging, left for clients not using the cursor yet
+    page: Optional[conint(ge=1)]
+    since: Optional[datetime]
+    until: Optional[datetime]
+    count: bool = False
+
+    @validator("page")
+    def page_without_cursor(cls, value, values):
+        if value is not None and values.get("cursor"):
+            raise ValueError("page can't be combined with cursor")
+        return value
+
+    _naive_bounds = validator("since", "until", allow_reuse=True)(to_naive_utc)
+
+
+class IntrospectBody(BaseModel):
+    tokens: conlist(str, min_items=1, max_items=JWTSettings().introspect_max_batch)
+
+
+class IntrospectionBody(BaseModel):
+    active: bool
+    token_type: Optional[str]
+    exp: Optional[int]
+    sub: Optional[UUID]
+    roles: List[str] = []
+    error: Optional[str]
+
+
+class IntrospectResultBody(BaseModel):
+    results: List[IntrospectionBody]
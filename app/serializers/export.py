@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Extra, validator
+
+from .auth import to_naive_utc
+
+
+class ExportUsersQueryBody(BaseModel):
+    role: Optional[str]
+
+    class Config:
+        # Users have no date to filter by, `since` and `until` get 400, not ignored
+        extra = Extra.forbid
+
+
+class ExportSessionsQueryBody(BaseModel):
+    role: Optional[str]
+    since: Optional[datetime]
+    until: Optional[datetime]
+
+    _naive_bounds = validator("since", "until", allow_reuse=True)(to_naive_utc)
+
+
+class ExportUserBody(BaseModel):
+    id: UUID
+    login: str
+    is_superuser: bool
+    roles: List[str]
+
+
+class ExportSessionBody(BaseModel):
+    user_id: UUID
+    user_agent: Optional[str]
+    auth_date: datetime
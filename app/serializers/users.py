@@ -1,10 +1,15 @@
 from typing import List, Optional
+from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, conint, conlist, validator
+
+from app.core.enums import LoginMatch, RoleAction, RoleActionResult
 
 from .auth import UserBody
 from .roles import RoleBody
 
+ROLES_BATCH_MAX_SIZE = 1000
+
 
 class UserRolesBody(BaseModel):
     user: UserBody
@@ -13,12 +18,43 @@ class UserRolesBody(BaseModel):
 
 class PaginationUsersBody(BaseModel):
     count: int
-    total_pages: int
-    page: int
+    count_is_estimate: bool = False
+    # Unknown when the page is requested by `after`
+    total_pages: Optional[int]
+    page: Optional[int]
+    next_after: Optional[str]
     results: List[UserRolesBody]
 
 
 class QueryPaginationBody(BaseModel):
     search: Optional[str]
-    page: int = 1
-    per_page: int = 20
+    match: LoginMatch = LoginMatch.prefix
+    after: Optional[str]
+    page: conint(ge=1) = 1
+    per_page: conint(ge=1, le=100) = 20
+    exact_count: bool = False
+
+
+class RoleOperationBody(BaseModel):
+    user_id: UUID
+    role_id: int
+    action: RoleAction
+
+
+class RolesBatchBody(BaseModel):
+    operations: conlist(RoleOperationBody, min_items=1, max_items=ROLES_BATCH_MAX_SIZE)
+
+    @validator("operations")
+    def pairs_unique(cls, value):
+        pairs = {(operation.user_id, operation.role_id) for operation in value}
+        if len(pairs) != len(value):
+            raise ValueError("Every user and role pair may appear only once")
+        return value
+
+
+class RoleOperationResultBody(RoleOperationBody):
+    result: RoleActionResult
+
+
+class RolesBatchResultBody(BaseModel):
+    results: List[RoleOperationResultBody]
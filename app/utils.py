@@ -1,25 +1,38 @@
 import random
 import string
 from datetime import timedelta
-from functools import wraps
+from functools import partial, wraps
+from hashlib import blake2b
 from http import HTTPStatus
-from typing import Union
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from uuid import uuid4
 
-from flask import abort
+from flask import abort, make_response, request
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
     current_user,
+    decode_token,
     get_jwt,
     verify_jwt_in_request,
 )
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, PyJWTError
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 
+from app.core import versions
+from app.core.alchemy import db, read_from_replica, replica_reads
+from app.core.blocklist import blocklist
 from app.core.config import JWTSettings
-from app.core.enums import DefaultRole
-from app.core.redis import redis
+from app.core.enums import DefaultRole, LoginMatch
+from app.core.permissions import permission_table
+from app.core.refresh_tokens import refresh_tokens
+from app.core.role_catalog import role_catalog
 from app.core.tracing import tracer
-from app.models.db_models import User
-from app.serializers.auth import TokenBody
+from app.core.user_cache import CachedUser
+from app.models.db_models import Role, User
+from app.serializers.auth import IntrospectionBody, TokenBody
 
 from .core.enums import DefaultRole
 
@@ -28,19 +41,148 @@ from .core.enums import DefaultRole
 def get_new_tokens(user: User, user_agent: str) -> TokenBody:
     """
     Create new access and refresh tokens with user id and roles
+    Start new refresh token family for user device
     """
-    identity = {"user_id": user.id, "roles": [role.name for role in user.roles]}
-    access_token = create_access_token(identity=identity)
-    refresh_token = create_refresh_token(identity=identity)
-    refresh_key = f"{user.id}_{user_agent}"
+    tokens, store = issue_tokens(user, user_agent)
+    store()
+    return tokens
 
-    # Put refresh token in redis for validate refreshing
-    redis.set(refresh_key, refresh_token, ex=timedelta(days=JWTSettings().refresh_exp))
+
+def issue_tokens(user: User, user_agent: str) -> Tuple[TokenBody, Callable[[], None]]:
+    """
+    Sign tokens of a new refresh token family, return them with the call
+    putting refresh token id in redis, it's up to caller when to make it
+    """
+    jti, family = str(uuid4()), str(uuid4())
+    tokens = create_tokens(CachedUser.from_user(user), jti, family)
+    ttl = timedelta(days=JWTSettings().refresh_exp)
+    return tokens, partial(refresh_tokens.store, user.id, user_agent, jti, family, ttl)
+
+
+def create_tokens(user: CachedUser, refresh_jti: str, family: str) -> TokenBody:
+    """
+    Sign access and refresh tokens, refresh one gets given id and family
+    """
+    identity = {"user_id": user.id, "roles": user.roles}
+    claims = {
+        "su": user.is_superuser,
+        "perms": permission_table.encode(user.roles),
+    }
+    access_token = create_access_token(identity=identity, additional_claims=claims)
+    refresh_token = create_refresh_token(
+        identity=identity,
+        additional_claims={**claims, "jti": refresh_jti, "fam": family},
+    )
     return TokenBody(access_token=access_token, refresh_token=refresh_token)
 
 
+@tracer("introspect_tokens", __name__)
+def introspect_tokens(tokens: List[str]) -> List[IntrospectionBody]:
+    """
+    Decode tokens in one pass and check them for revocation with
+    a single blocklist lookup
+    """
+    results, claims = decode_tokens(tokens)
+    revoked = blocklist.revoked_many([data["jti"] for data in claims.values()])
+    return introspection_results(results, claims, revoked)
+
+
+def decode_tokens(
+    tokens: List[str],
+) -> Tuple[List[Optional[IntrospectionBody]], Dict[int, dict]]:
+    """
+    Decode tokens, return results of invalid ones and claims of valid ones
+    by position, results of valid tokens wait for revocation check
+    """
+    results, claims = [], {}
+    for index, token in enumerate(tokens):
+        try:
+            claims[index] = decode_token(token)
+        except ExpiredSignatureError as exc:
+            results.append(_introspection(exc.jwt_data, error="Token has expired"))
+        except (PyJWTError, JWTExtendedException) as exc:
+            results.append(IntrospectionBody(active=False, error=str(exc)))
+        else:
+            results.append(None)
+    return results, claims
+
+
+def introspection_results(
+    results: List[Optional[IntrospectionBody]],
+    claims: Dict[int, dict],
+    revoked: Set[str],
+) -> List[IntrospectionBody]:
+    """Complete results of decoded tokens with revocation check answer."""
+    for index, data in claims.items():
+        error = "Token has been revoked" if data["jti"] in revoked else None
+        results[index] = _introspection(data, active=error is None, error=error)
+    return results
+
+
+def _introspection(
+    claims: dict, active: bool = False, error: Optional[str] = None
+) -> IntrospectionBody:
+    identity = claims.get("sub") or {}
+    return IntrospectionBody(
+        active=active,
+        token_type=claims.get("type"),
+        exp=claims.get("exp"),
+        sub=identity.get("user_id"),
+        roles=identity.get("roles", []),
+        error=error,
+    )
+
+
+def load_user(user_id: str, session: Optional[Session] = None) -> Optional[CachedUser]:
+    """Load user identity with roles from database in one query."""
+    session = session or db.session
+    user = (
+        session.query(User)
+        .options(joinedload(User.roles))
+        .filter_by(id=user_id)
+        .one_or_none()
+    )
+    return CachedUser.from_user(user) if user else None
+
+
+def load_user_from_replica(user_id: str) -> Optional[CachedUser]:
+    """Load user from replica, falling back to primary for a fresh user."""
+    # Replica rows are kept out of request session, otherwise its primary
+    # reads would get the lagging instances back from the identity map
+    session = db.create_session({})()
+    try:
+        with replica_reads():
+            user = load_user(user_id, session)
+    finally:
+        session.close()
+    return user or load_user(user_id)
+
+
+def login_filter(search: str, match: LoginMatch = LoginMatch.prefix):
+    """
+    Build case-insensitive login condition matching `lower(login)` indexes
+    Prefix search uses text_pattern_ops index, substring one uses pg_trgm index
+    """
+    login = func.lower(User.login)
+    if match == LoginMatch.contains:
+        return login.contains(search.lower(), autoescape=True)
+    return login.startswith(search.lower(), autoescape=True)
+
+
+def load_roles() -> List[Tuple[int, str]]:
+    """Read role catalog from roles table."""
+    # Catalog is tagged with the version it was loaded at, a lagging replica
+    # would keep it stale until the next bump
+    with replica_reads(enabled=False):
+        return db.session.query(Role.id, Role.name).all()
+
+
 @tracer("check_permissions", __name__)
-def permissions_required(role: Union[str, DefaultRole]):
+def permissions_required(role: Union[str, DefaultRole], fresh: bool = False):
+    """
+    Check role by token claims only, without loading the user
+    With `fresh` the user and roles are read from database instead
+    """
     if isinstance(role, DefaultRole):
         role = role.value
 
@@ -48,8 +190,12 @@ def permissions_required(role: Union[str, DefaultRole]):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
-            user_roles = get_jwt()["sub"]["roles"]
-            if current_user.is_superuser or role in user_roles:
+            claims = get_jwt()
+            if fresh:
+                allowed = _has_fresh_permission(claims, role)
+            else:
+                allowed = _has_permission(claims, role)
+            if allowed:
                 return fn(*args, **kwargs)
             return abort(HTTPStatus.FORBIDDEN)
 
@@ -58,6 +204,74 @@ def permissions_required(role: Union[str, DefaultRole]):
     return wrapper
 
 
+def etag(marker: Callable[[], Optional[str]]):
+    """
+    Answer GET with strong ETag built from version marker and request URL
+    Matching If-None-Match gets 304 before the view runs, so put it between
+    authorization and `validate`; without a marker the view runs as usual
+    """
+
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            version = marker()
+            if version is None:
+                return fn(*args, **kwargs)
+
+            payload = f"{version}|{request.full_path}".encode()
+            tag = blake2b(payload, digest_size=16).hexdigest()
+            if request.if_none_match.contains(tag):
+                response = make_response("", HTTPStatus.NOT_MODIFIED)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                # Replica may lag behind the marker, its data can't get the tag
+                if response.status_code != HTTPStatus.OK or read_from_replica():
+                    return response
+            response.set_etag(tag)
+            return response
+
+        return decorator
+
+    return wrapper
+
+
+def roles_marker() -> Optional[str]:
+    role_catalog.ensure_fresh(load_roles)
+    return role_catalog.version or None
+
+
+def users_marker() -> Optional[str]:
+    # Listing shows role names too
+    roles_version = roles_marker()
+    users_version = versions.marker(versions.USERS_VERSION_KEY)
+    if roles_version is None or users_version is None:
+        return None
+    return f"{users_version}:{roles_version}"
+
+
+def history_marker() -> Optional[str]:
+    return versions.session_marker(get_jwt()["sub"]["user_id"])
+
+
+def _has_permission(claims: dict, role: str) -> bool:
+    # Tokens issued before permission claims were added
+    if "su" not in claims:
+        return current_user.is_superuser or role in claims["sub"]["roles"]
+
+    if claims["su"]:
+        return True
+    role_catalog.ensure_fresh(load_roles)
+    allowed = permission_table.allows(claims["perms"], role)
+    if allowed is None:
+        return role in claims["sub"]["roles"]
+    return allowed
+
+
+def _has_fresh_permission(claims: dict, role: str) -> bool:
+    user = load_user(claims["sub"]["user_id"])
+    return user is not None and (user.is_superuser or role in user.roles)
+
+
 def generate_password():
     lower = string.ascii_lowercase
     upper = string.ascii_uppercase
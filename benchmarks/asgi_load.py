@@ -0,0 +1,182 @@
+"""Compare asyncio serving mode with gevent runner on token hot paths.
+
+Starts gevent runner under gevent WSGI server, under uwsgi `--gevent` like
+the production image when `uwsgi` is on PATH, and `app.asgi` under uvicorn
+when it is installed. Then holds `--connections` keep-alive connections to
+each and drives `/auth/introspect` and `/auth/refresh` for `--seconds`. Every refresh
+client is a separate device rotating its own token chain. Against
+configured Postgres and Redis:
+
+    python -m benchmarks.asgi_load --connections 1000 --seconds 10
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+import aiohttp
+
+from benchmarks.concurrency import PASSWORD, wait_ready
+
+LOGIN_PATH = "/api/v1/auth/login"
+INTROSPECT_PATH = "/api/v1/auth/introspect"
+REFRESH_PATH = "/api/v1/auth/refresh"
+
+
+def start_gevent(port: int, cores: int) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.concurrency", "--serve"]
+    command += ["--port", str(port), "--cores", str(cores)]
+    return subprocess.Popen(command, env={**os.environ, "ASYNC_CORES": str(cores)})
+
+
+def start_uwsgi(port: int, cores: int) -> subprocess.Popen:
+    command = ["uwsgi", "--master", "--single-interpreter", "--workers", "1"]
+    command += ["--gevent", str(cores), "--http", f"127.0.0.1:{port}"]
+    command += ["--http-keepalive", "--disable-logging", "--die-on-term"]
+    command += ["--module", "gevent_runner:application"]
+    env = {**os.environ, "ASYNC_CORES": str(cores)}
+    return subprocess.Popen(command, env=env, stderr=subprocess.DEVNULL)
+
+
+def start_uvicorn(port: int) -> subprocess.Popen:
+    command = [sys.executable, "-m", "uvicorn", "app.asgi:application"]
+    command += ["--port", str(port), "--no-access-log", "--log-level", "warning"]
+    return subprocess.Popen(command)
+
+
+async def login_devices(session, base: str, devices: int) -> List[Dict[str, str]]:
+    """Log the same user in from many devices, return their tokens."""
+    credentials = {"login": f"bench-{uuid.uuid4().hex[:12]}", "password": PASSWORD}
+    await session.post(f"{base}/api/v1/auth/registration", json=credentials)
+    tokens = []
+    for device in range(devices):
+        headers = {"User-Agent": f"load-{device}"}
+        async with session.post(
+            f"{base}{LOGIN_PATH}", json=credentials, headers=headers
+        ) as response:
+            tokens.append({**await response.json(), "device": f"load-{device}"})
+    return tokens
+
+
+async def drive(base: str, connections: int, seconds: float, make_call) -> Dict:
+    """Run a client per connection until deadline, collect latencies."""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(base, connector=connector) as session:
+
+        async def client(number: int):
+            nonlocal errors
+            call = make_call(number)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                if not await call(session):
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(client(number) for number in range(connections)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    return {"rps": len(latencies) / elapsed, "p99": p99, "errors": errors}
+
+
+def introspect_call(token: str):
+    def make_call(_number: int):
+        async def call(session) -> bool:
+            body = {"tokens": [token]}
+            async with session.post(INTROSPECT_PATH, json=body) as response:
+                await response.read()
+                return response.status == 200
+
+        return call
+
+    return make_call
+
+
+def refresh_call(devices: List[Dict[str, str]]):
+    def make_call(number: int):
+        device = devices[number]
+
+        async def call(session) -> bool:
+            body = {"refresh_token": device["refresh_token"]}
+            headers = {"User-Agent": device["device"]}
+            async with session.post(
+                REFRESH_PATH, json=body, headers=headers
+            ) as response:
+                if response.status != 200:
+                    return False
+                device["refresh_token"] = (await response.json())["refresh_token"]
+                return True
+
+        return call
+
+    return make_call
+
+
+async def run(args, servers: Dict[str, str]):
+    setup_base = servers["gevent"]
+    async with aiohttp.ClientSession() as session:
+        devices = await login_devices(session, setup_base, args.refresh_clients)
+    print(
+        f"{'server':<8} {'endpoint':<11} {'conns':>6} {'rps':>9} {'p99 ms':>8} errors"
+    )
+    for name, base in servers.items():
+        rows = [
+            (
+                "introspect",
+                args.connections,
+                introspect_call(devices[0]["access_token"]),
+            ),
+            ("refresh", args.refresh_clients, refresh_call(devices)),
+        ]
+        for endpoint, connections, make_call in rows:
+            result = await drive(base, connections, args.seconds, make_call)
+            print(
+                f"{name:<8} {endpoint:<11} {connections:>6} {result['rps']:>9.1f}"
+                f" {result['p99']:>8.1f} {result['errors']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--refresh-clients", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--cores", type=int, default=1000, help="gevent greenlets")
+    parser.add_argument("--port", type=int, default=3100)
+    args = parser.parse_args()
+
+    servers = {"gevent": f"http://127.0.0.1:{args.port}"}
+    processes = [start_gevent(args.port, args.cores)]
+    if shutil.which("uwsgi"):
+        servers["uwsgi"] = f"http://127.0.0.1:{args.port + 2}"
+        processes.append(start_uwsgi(args.port + 2, args.cores))
+    else:
+        print("uwsgi: skipped, uwsgi is not installed")
+    if importlib.util.find_spec("uvicorn"):
+        servers["asgi"] = f"http://127.0.0.1:{args.port + 1}"
+        processes.append(start_uvicorn(args.port + 1))
+    else:
+        print("asgi: skipped, uvicorn is not installed")
+    try:
+        for process, base in zip(processes, servers.values()):
+            wait_ready(base, process)
+        asyncio.run(run(args, servers))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
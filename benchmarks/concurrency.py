@@ -0,0 +1,142 @@
+"""Measure throughput of gevent runner as the number of greenlets grows.
+
+Starts the app under gevent WSGI server for every `ASYNC_CORES` value, the
+same way uwsgi `--gevent` runs `gevent_runner`, and drives `/auth/login`
+and `/auth/history` with as many concurrent clients. Against configured
+Postgres and Redis, with cheap hashing to keep the database in focus:
+
+    python -m benchmarks.concurrency --cores 1,10,50 --seconds 5
+
+`--blocking` runs the app without psycopg wait callback for comparison.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+os.environ.setdefault("HASHING_ALGORITHM", "pbkdf2")
+os.environ.setdefault("HASHING_PBKDF2_ITERATIONS", "1")
+os.environ.setdefault("HASHING_POOL_SIZE", "0")
+
+PASSWORD = "QWERTy90!"
+LOGIN_PATH = "/api/v1/auth/login"
+HISTORY_PATH = "/api/v1/auth/history"
+
+
+def serve(port: int, cores: int, blocking: bool):
+    """Run in a child process, mirrors uwsgi `--gevent` worker."""
+    # pylint: disable=import-outside-toplevel
+    from gevent import monkey
+
+    monkey.patch_all()
+
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    if blocking:
+        from app import app as application
+    else:
+        from gevent_runner import application
+
+    server = WSGIServer(("127.0.0.1", port), application, spawn=Pool(cores), log=None)
+    server.serve_forever()
+
+
+def request(url: str, body: Optional[dict] = None, token: Optional[str] = None) -> Dict:
+    headers = {"Content-Type": "application/json", "User-Agent": "benchmark"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    with urllib.request.urlopen(
+        urllib.request.Request(url, data=data, headers=headers), timeout=60
+    ) as response:
+        return json.loads(response.read())
+
+
+def wait_ready(base: str, process: subprocess.Popen):
+    for _ in range(200):
+        if process.poll() is not None:
+            raise RuntimeError("Server exited before getting ready")
+        try:
+            urllib.request.urlopen(f"{base}/health", timeout=1).close()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise RuntimeError("Server is not ready")
+
+
+def drive(clients: int, seconds: float, call) -> float:
+    """Call endpoint from concurrent clients, return requests per second."""
+    deadline = time.monotonic() + seconds
+
+    def loop() -> int:
+        done = 0
+        while time.monotonic() < deadline:
+            call()
+            done += 1
+        return done
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(clients) as executor:
+        total = sum(executor.map(lambda _: loop(), range(clients)))
+    return total / (time.monotonic() - started)
+
+
+def measure(args, cores: int) -> Dict[str, float]:
+    base = f"http://127.0.0.1:{args.port}"
+    command = [sys.executable, "-m", "benchmarks.concurrency", "--serve"]
+    command += ["--port", str(args.port), "--cores", str(cores)]
+    if args.blocking:
+        command.append("--blocking")
+    env = {**os.environ, "ASYNC_CORES": str(cores)}
+    process = subprocess.Popen(command, env=env)
+    try:
+        wait_ready(base, process)
+        credentials = {"login": f"bench-{uuid.uuid4().hex[:12]}", "password": PASSWORD}
+        request(f"{base}/api/v1/auth/registration", credentials)
+        token = request(f"{base}{LOGIN_PATH}", credentials)["access_token"]
+        return {
+            "login": drive(
+                cores, args.seconds, lambda: request(f"{base}{LOGIN_PATH}", credentials)
+            ),
+            "history": drive(
+                cores,
+                args.seconds,
+                lambda: request(f"{base}{HISTORY_PATH}", token=token),
+            ),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cores", default="1,10,50")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--blocking", action="store_true")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, int(args.cores), args.blocking)
+        return
+
+    mode = "blocking" if args.blocking else "green"
+    print(f"{mode} psycopg, requests per second")
+    print(f"{'cores':>6} {'login':>9} {'history':>9}")
+    for cores in (int(value) for value in args.cores.split(",")):
+        rates = measure(args, cores)
+        print(f"{cores:>6} {rates['login']:>9.1f} {rates['history']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
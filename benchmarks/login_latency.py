@@ -0,0 +1,69 @@
+"""Measure login latency in-process against configured Postgres and Redis.
+
+Password hashing dominates login time, so cheap hashing is used by default
+to make database and Redis round trips visible:
+
+    python -m benchmarks.login_latency --requests 2000
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+os.environ.setdefault("HASHING_ALGORITHM", "pbkdf2")
+os.environ.setdefault("HASHING_PBKDF2_ITERATIONS", "1")
+os.environ.setdefault("HASHING_POOL_SIZE", "0")
+
+# pylint: disable=wrong-import-position
+from app import app  # noqa: E402
+from app.core.alchemy import db  # noqa: E402
+from app.models.db_models import Role, User  # noqa: E402
+
+PASSWORD = "QWERTy90!"
+
+
+def create_user(roles: int) -> str:
+    login = f"bench-{uuid.uuid4().hex[:12]}"
+    user = User(login=login)
+    user.set_password(PASSWORD)
+    user.roles = Role.query.limit(roles).all()
+    db.session.add(user)
+    db.session.commit()
+    return login
+
+
+def percentile(samples, fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--roles", type=int, default=3)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    with app.app_context():
+        login = create_user(args.roles)
+
+    body = {"login": login, "password": PASSWORD}
+    samples = []
+    for i in range(args.warmup + args.requests):
+        started = time.perf_counter()
+        response = client.post("/api/v1/auth/login", json=body)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.get_data(as_text=True)
+        if i >= args.warmup:
+            samples.append(elapsed * 1000)
+
+    samples.sort()
+    print(f"requests: {len(samples)}")
+    print(f"mean:     {statistics.mean(samples):.2f} ms")
+    print(f"p50:      {percentile(samples, 0.50):.2f} ms")
+    print(f"p99:      {percentile(samples, 0.99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
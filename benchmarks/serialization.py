@@ -0,0 +1,88 @@
+"""Compare list response serialization paths on a page of users with roles.
+
+Runs without database, rows are made up in memory:
+
+    python -m benchmarks.serialization --rows 100 --roles 3
+"""
+import argparse
+import timeit
+import uuid
+
+from app import app
+from app.core.config import SerializationSettings
+from app.core.serialization import Serializer
+from app.serializers.auth import UserBody
+from app.serializers.roles import RoleBody
+from app.serializers.users import PaginationUsersBody, UserRolesBody
+
+Backend = SerializationSettings.Backend
+
+
+def make_rows(rows: int, roles: int):
+    users = [(uuid.uuid4(), f"user-{i:06d}") for i in range(rows)]
+    user_roles = [(role_id, f"role-{role_id}") for role_id in range(roles)]
+    return users, user_roles
+
+
+def page(results) -> dict:
+    return {
+        "count": len(results),
+        "count_is_estimate": True,
+        "total_pages": 1,
+        "page": 1,
+        "next_after": None,
+        "results": results,
+    }
+
+
+def models_path(users, user_roles) -> bytes:
+    """Previous handler: a model per row encoded by flask_pydantic."""
+    results = [
+        UserRolesBody(
+            user=UserBody(id=user_id, login=login),
+            roles=[RoleBody(id=role_id, name=name) for role_id, name in user_roles],
+        )
+        for user_id, login in users
+    ]
+    return PaginationUsersBody(**page(results)).json().encode()
+
+
+def rows_path(serializer: Serializer, users, user_roles) -> bytes:
+    """Current handler: dicts from result rows encoded by serializer."""
+    results = [
+        {
+            "user": {"id": user_id, "login": login},
+            "roles": [{"id": role_id, "name": name} for role_id, name in user_roles],
+        }
+        for user_id, login in users
+    ]
+    return serializer.response(page(results), PaginationUsersBody).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--roles", type=int, default=3)
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+
+    users, user_roles = make_rows(args.rows, args.roles)
+    paths = {"models": lambda: models_path(users, user_roles)}
+    for backend in Backend:
+        try:
+            serializer = Serializer(SerializationSettings(backend=backend))
+        except RuntimeError as exc:
+            print(f"{backend.value}: skipped, {exc}")
+            continue
+        paths[backend.value] = lambda serializer=serializer: rows_path(
+            serializer, users, user_roles
+        )
+
+    with app.test_request_context():
+        for name, path in paths.items():
+            seconds = min(timeit.repeat(path, number=args.number, repeat=5))
+            print(f"{name:<9} {seconds / args.number * 1000:.3f} ms per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,4 +4,9 @@ from gevent import monkey
 
 monkey.patch_all()
 
+# pylint: disable=wrong-import-position
+from app.core.green import patch_psycopg  # noqa: E402
+
+patch_psycopg()
+
 from app import app as application  # noqa: E402
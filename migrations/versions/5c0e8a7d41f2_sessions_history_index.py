@@ -0,0 +1,27 @@
+"""sessions history index
+
+Revision ID: 5c0e8a7d41f2
+Revises: ad1f929c6e10
+Create Date: 2026-10-17 20:10:12.408215
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c0e8a7d41f2"
+down_revision = "ad1f929c6e10"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Created on every partition, serves keyset pagination of user history
+    op.create_index(
+        "ix_sessions_user_id_auth_date_id",
+        "sessions",
+        ["user_id", "auth_date", "id"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_sessions_user_id_auth_date_id", table_name="sessions")
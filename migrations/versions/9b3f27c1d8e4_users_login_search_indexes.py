@@ -0,0 +1,44 @@
+"""users login search indexes
+
+Revision ID: 9b3f27c1d8e4
+Revises: 5c0e8a7d41f2
+Create Date: 2026-10-17 20:31:47.118530
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b3f27c1d8e4"
+down_revision = "5c0e8a7d41f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently to keep users table writable on large installations
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_login_lower_pattern "
+            "ON users (lower(login) text_pattern_ops)"
+        )
+
+        # Substring search index is optional, pg_trgm is a contrib extension
+        has_trgm = (
+            op.get_bind()
+            .execute(
+                sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+            )
+            .scalar()
+        )
+        if has_trgm:
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_login_lower_trgm "
+                "ON users USING gin (lower(login) gin_trgm_ops)"
+            )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_users_login_lower_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_users_login_lower_pattern")
@@ -0,0 +1,35 @@
+"""users roles unique pair
+
+Revision ID: e4a1c2b7f9d3
+Revises: 9b3f27c1d8e4
+Create Date: 2026-10-17 20:40:31.517204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e4a1c2b7f9d3"
+down_revision = "9b3f27c1d8e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Roles granted twice before the constraint keep a single row
+    op.execute(
+        """
+        DELETE FROM users_roles duplicate
+        USING users_roles kept
+        WHERE duplicate.user_id = kept.user_id
+          AND duplicate.role_id = kept.role_id
+          AND duplicate.ctid > kept.ctid
+        """
+    )
+    # Target of ON CONFLICT in batch grants
+    op.create_unique_constraint(
+        "uq_users_roles_user_id_role_id", "users_roles", ["user_id", "role_id"]
+    )
+
+
+def downgrade():
+    op.drop_constraint("uq_users_roles_user_id_role_id", "users_roles", type_="unique")
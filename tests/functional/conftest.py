@@ -1,16 +1,20 @@
 import asyncio
 import logging
+from contextlib import contextmanager
 from http import HTTPStatus
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import aioredis
 import asyncpg
 import backoff
+import pytest
 import pytest_asyncio
 from aiohttp import ClientSession
 from aioredis import Redis
 from asyncpg import Connection
+from flask.testing import FlaskClient
 from pydantic import BaseModel
+from sqlalchemy import event
 
 from .settings import TestSettings
 
@@ -72,20 +76,22 @@ def make_request_fixture(http_client: ClientSession):
         params: Optional[Dict[str, Any]] = None,
         json: Optional[Dict[str, Any]] = None,
         jwt: Optional[str] = None,
+        headers: Optional[Dict[str, str]] = None,
     ) -> HTTPResponse:
         params = params or {}
         json = json or {}
-        headers = {}
+        headers = dict(headers or {})
 
         if jwt:
-            headers = {"Authorization": "Bearer {}".format(jwt)}
+            headers["Authorization"] = "Bearer {}".format(jwt)
 
         logger.debug("URL: %s", url)
 
         async with http_client.request(
             method, url, params=params, json=json, headers=headers
         ) as response:
-            body = await response.json()
+            # Empty body of 304 Not Modified is read as None
+            body = await response.json(content_type=None)
             logger.warning("Response: %s", body)
 
             return HTTPResponse(
@@ -128,6 +134,45 @@ async def superadmin_token_fixture(make_request):
     )
 
 
+@pytest.fixture(name="app_client", scope="session")
+def app_client_fixture() -> FlaskClient:
+    """Represents in-process client of the application.
+
+    Talks to the same database and Redis as the served app, useful when
+    a test needs to look inside request handling.
+    """
+    from app import app  # pylint: disable=import-outside-toplevel
+
+    client = app.test_client()
+    # Run startup hooks, so they don't count in tests
+    client.get("/health")
+    yield client
+
+
+@pytest.fixture(name="count_queries", scope="session")
+def count_queries_fixture(app_client: FlaskClient):
+    """Collect SQL statements executed inside the block."""
+    from app.core.alchemy import db  # pylint: disable=import-outside-toplevel
+
+    with app_client.application.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def inner() -> Iterator[List[str]]:
+        statements: List[str] = []
+
+        def collect(_conn, _cursor, statement, *_args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", collect)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", collect)
+
+    return inner
+
+
 async def wait_for_ping(client: Union[Redis, Connection], settings: TestSettings):
     """Wait for service client to answer"""
     client_name = type(client).__name__
@@ -0,0 +1,90 @@
+import json
+import subprocess
+import sys
+from http import HTTPStatus
+from typing import Optional, Tuple
+
+import pytest
+
+from app.asgi import application
+
+pytestmark = pytest.mark.asyncio
+
+PATH = "/api/v1/auth"
+USER_AGENT = "asgi-test"
+
+
+async def call(method: str, path: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+    """Run request through ASGI application in-process."""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(b"user-agent", USER_AGENT.encode())],
+    }
+    messages = [{"type": "http.request", "body": json.dumps(body or {}).encode()}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+class TestAsgi:
+    """Test asyncio serving mode answers like the Flask application."""
+
+    user = {"login": "AsgiUser", "password": "QWERTy90!"}
+
+    async def test_introspect(self, make_request, superadmin_token: str):
+        status, body = await call(
+            "POST", f"{PATH}/introspect", {"tokens": [superadmin_token, "bad"]}
+        )
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/introspect",
+            json={"tokens": [superadmin_token, "bad"]},
+        )
+        assert status == HTTPStatus.OK
+        assert body == response.body
+
+    async def test_validation_error(self):
+        status, body = await call("POST", f"{PATH}/introspect", {"tokens": []})
+        assert status == HTTPStatus.BAD_REQUEST
+        assert "body_params" in body["validation_error"]
+
+    async def test_refresh(self, make_request):
+        await make_request(method="POST", url=f"{PATH}/registration", json=self.user)
+        headers = {"User-Agent": USER_AGENT}
+        response = await make_request(
+            method="POST", url=f"{PATH}/login", json=self.user, headers=headers
+        )
+        # Flask refresh puts the user in cache, so no database is needed here
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/refresh",
+            json={"refresh_token": response.body["refresh_token"]},
+            headers=headers,
+        )
+        assert response.status == HTTPStatus.OK
+        presented = {"refresh_token": response.body["refresh_token"]}
+
+        status, body = await call("POST", f"{PATH}/refresh", presented)
+        assert status == HTTPStatus.OK
+        assert body["refresh_token"] != presented["refresh_token"]
+
+        status, body = await call("POST", f"{PATH}/refresh", presented)
+        assert status == HTTPStatus.CONFLICT
+        assert "already used" in body["error"]
+
+    async def test_import_creates_no_async_pool(self):
+        """Test processes not serving asyncio don't get asyncio Redis pool."""
+        code = (
+            "import app.asgi; from app.core.redis import redis_factory; "
+            "assert 'async' not in redis_factory._pools"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
@@ -61,6 +61,108 @@ class TestUserAuth:
         assert response.status == HTTPStatus.OK
         logger.info("Response status : %s", response.status)
 
+    async def test_history_cursor(self, make_request):
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/login",
+            json=self.change_name,
+        )
+        assert response.status == HTTPStatus.OK
+        # New login on the same device replaces its refresh token
+        self.tokens["access_token"] = response.body["access_token"]
+        self.tokens["refresh_token"] = response.body["refresh_token"]
+
+        params = {"page_size": 1, "count": "true"}
+        response = await make_request(
+            params=params,
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        assert response.status == HTTPStatus.OK
+        assert len(response.body) == 1
+        assert response.headers["X-Total-Count"] == "2"
+        newest = response.body[0]
+
+        params = {"page_size": 1, "cursor": response.headers["X-Next-Cursor"]}
+        response = await make_request(
+            params=params,
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        assert response.status == HTTPStatus.OK
+        assert len(response.body) == 1
+        assert response.body[0]["auth_date"] < newest["auth_date"]
+        assert "X-Next-Cursor" not in response.headers
+        logger.info("Response status : %s", response.status)
+
+    async def test_history_page_fallback(self, make_request):
+        params = {"page_size": 1}
+        response = await make_request(
+            params=params,
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = await make_request(
+            params={**params, "cursor": cursor},
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        second = response.body
+
+        response = await make_request(
+            params={**params, "page": 2},
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        assert response.status == HTTPStatus.OK
+        assert response.body == second
+        assert response.headers["Deprecation"] == "true"
+
+        response = await make_request(
+            params={**params, "page": 2, "cursor": cursor},
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        assert response.status == HTTPStatus.BAD_REQUEST
+
+    async def test_history_not_modified(self, make_request):
+        params = {"page_size": 1}
+        response = await make_request(
+            params=params,
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+        )
+        etag = response.headers["Etag"]
+
+        response = await make_request(
+            params=params,
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+            headers={"If-None-Match": etag},
+        )
+        assert response.status == HTTPStatus.NOT_MODIFIED
+
+        # Other page is another representation
+        response = await make_request(
+            params={"page_size": 2},
+            method="GET",
+            url=f"{PATH}/history",
+            jwt=self.tokens["access_token"],
+            headers={"If-None-Match": etag},
+        )
+        assert response.status == HTTPStatus.OK
+        logger.info("Response status : %s", response.status)
+
     async def test_refresh_token(self, make_request):
         response = await make_request(
             method="POST",
@@ -69,10 +171,41 @@ class TestUserAuth:
         )
         assert response.status == HTTPStatus.OK
         self.tokens["access_token"] = response.body["access_token"]
+        self.tokens["used_refresh_token"] = self.tokens["refresh_token"]
         self.tokens["refresh_token"] = response.body["refresh_token"]
 
         logger.info("Response status : %s", response.status)
 
+    async def test_refresh_token_reuse(self, make_request):
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/refresh",
+            json={"refresh_token": self.tokens["used_refresh_token"]},
+        )
+        assert response.status == HTTPStatus.CONFLICT
+
+        # Reuse revokes the whole family, including the latest token
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/refresh",
+            json={"refresh_token": self.tokens["refresh_token"]},
+        )
+        assert response.status == HTTPStatus.CONFLICT
+        logger.info("Response status : %s", response.status)
+
+    async def test_introspect(self, make_request):
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/introspect",
+            json={"tokens": [self.tokens["access_token"], "not-a-token"]},
+        )
+        assert response.status == HTTPStatus.OK
+        valid, invalid = response.body["results"]
+        assert valid["active"] is True
+        assert valid["token_type"] == "access"
+        assert invalid["active"] is False
+        logger.info("Response status : %s", response.status)
+
     async def test_logout(self, make_request):
         response = await make_request(
             method="POST",
@@ -83,6 +216,16 @@ class TestUserAuth:
         assert response.status == HTTPStatus.CREATED
         logger.info("Response status : %s", response.status)
 
+    async def test_introspect_revoked(self, make_request):
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/introspect",
+            json={"tokens": [self.tokens["access_token"]]},
+        )
+        assert response.status == HTTPStatus.OK
+        assert response.body["results"][0]["active"] is False
+        logger.info("Response status : %s", response.status)
+
 
 class TestAuthNegative:
     user_wrong_password = {"login": "Test", "password": "1234"}
@@ -0,0 +1,92 @@
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+from redis.exceptions import RedisError
+
+from app.core import blocklist as blocklist_module
+from app.core.blocklist import RevocationFilter
+from app.core.config import RevocationSettings
+from app.core.redis import redis
+
+pytestmark = pytest.mark.asyncio
+
+
+class UnreachableRedis:
+    def mget(self, *_args, **_kwargs):
+        raise RedisError("Connection refused")
+
+
+@pytest.fixture(name="make_filter")
+def make_filter_fixture():
+    """Create filters sharing a stream of their own."""
+    stream = f"revoked_tokens_test_{uuid4().hex}"
+
+    def inner(**options) -> RevocationFilter:
+        settings = RevocationSettings(stream=stream, block_ms=10, **options)
+        return RevocationFilter(settings, retention=timedelta(hours=1))
+
+    yield inner
+    redis.delete(stream)
+
+
+def revoke(revocation_filter: RevocationFilter) -> str:
+    jti = uuid4().hex
+    revocation_filter.revoke(jti, time.time() + 60)
+    return jti
+
+
+class TestRevocationFilter:
+    """Test revocation checks are answered by worker-local filter."""
+
+    async def test_replay_answers_locally(self, make_filter):
+        jti = revoke(make_filter())
+        worker = make_filter()
+        worker._read_stream()
+
+        assert worker.revoked_many([jti, uuid4().hex]) == {jti}
+        stats = worker.stats()
+        assert stats["local_answers"] == 2
+        assert stats["redis_checks"] == 0
+
+    async def test_replay_skips_expired(self, make_filter):
+        writer = make_filter()
+        expired = uuid4().hex
+        writer.revoke(expired, time.time() - 1)
+        live = revoke(writer)
+        worker = make_filter()
+        worker._read_stream()
+
+        assert worker.stats()["size"] == 1
+        assert worker.revoked_many([expired, live]) == {live}
+
+    async def test_stale_filter_asks_redis(self, make_filter):
+        worker = make_filter(max_staleness=30)
+        worker._read_stream()
+        # Revoked by another worker, not yet seen in the stream
+        jti = revoke(make_filter())
+        assert not worker.is_revoked(jti)
+
+        worker._synced_at = time.monotonic() - 31
+        assert worker.is_revoked(jti)
+        assert worker.stats()["redis_checks"] == 1
+
+    async def test_not_synced_filter_asks_redis(self, make_filter):
+        jti = revoke(make_filter())
+        worker = make_filter()
+        assert worker.is_revoked(jti)
+        assert worker.stats()["redis_checks"] == 1
+
+    @pytest.mark.parametrize(
+        "fail_mode, revoked",
+        [
+            (RevocationSettings.FailMode.closed, True),
+            (RevocationSettings.FailMode.open, False),
+        ],
+    )
+    async def test_fail_mode(self, make_filter, monkeypatch, fail_mode, revoked):
+        worker = make_filter(fail_mode=fail_mode)
+        monkeypatch.setattr(blocklist_module, "redis", UnreachableRedis())
+        assert worker.is_revoked(uuid4().hex) is revoked
+        assert worker.stats()["fail_mode_answers"] == 1
@@ -0,0 +1,37 @@
+import time
+
+import gevent
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+from app.core.green import is_green, patch_psycopg
+
+pytestmark = pytest.mark.asyncio
+
+SLEEP = 0.3
+
+
+@pytest.fixture(name="green")
+def green_fixture():
+    patch_psycopg()
+    yield
+    extensions.set_wait_callback(None)
+
+
+class TestGreenPsycopg:
+    """Test psycopg queries yield to other greenlets with wait callback."""
+
+    @staticmethod
+    def sleep(dsn: str):
+        with psycopg2.connect(dsn) as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_sleep(%s)", (SLEEP,))
+        conn.close()
+
+    async def test_queries_run_concurrently(self, app_client, green):
+        assert is_green()
+        dsn = app_client.application.config["SQLALCHEMY_DATABASE_URI"]
+        started = time.monotonic()
+        greenlets = [gevent.spawn(self.sleep, dsn) for _ in range(3)]
+        gevent.joinall(greenlets, raise_error=True)
+        assert time.monotonic() - started < SLEEP * 2
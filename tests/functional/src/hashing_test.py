@@ -0,0 +1,89 @@
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+
+from app.core.config import HashingSettings
+from app.core.hashing import HashingUnavailable, PasswordHasher, hasher
+from app.models.db_models import User
+
+pytestmark = pytest.mark.asyncio
+
+Algorithm = HashingSettings.Algorithm
+PASSWORD = "SuperStr0ng!"
+# Cheapest parameters, tests are about hash format, not its strength
+CHEAP = {
+    "pbkdf2_iterations": 1000,
+    "scrypt_n": 2**4,
+    "argon2_time_cost": 1,
+    "argon2_memory_cost": 8,
+    "argon2_parallelism": 1,
+    "pool_size": 0,
+}
+COSTLIER = {
+    Algorithm.pbkdf2: {"pbkdf2_iterations": 2000},
+    Algorithm.scrypt: {"scrypt_n": 2**5},
+    Algorithm.argon2: {"argon2_time_cost": 2},
+}
+
+
+@pytest.fixture(name="inline_hasher")
+def inline_hasher_fixture(monkeypatch):
+    """Make application hasher cheap and inline."""
+    for name, value in CHEAP.items():
+        monkeypatch.setattr(hasher.settings, name, value)
+    return hasher
+
+
+class TestPasswordHasher:
+    """Test password hashing algorithms and pool limits."""
+
+    @pytest.mark.parametrize("algorithm", list(Algorithm))
+    async def test_needs_rehash(self, algorithm):
+        pwhash = PasswordHasher(HashingSettings(algorithm=algorithm, **CHEAP)).hash(
+            PASSWORD
+        )
+        for other in Algorithm:
+            settings = HashingSettings(algorithm=other, **CHEAP)
+            assert PasswordHasher(settings).needs_rehash(pwhash) is (other != algorithm)
+        costlier = HashingSettings(
+            algorithm=algorithm, **{**CHEAP, **COSTLIER[algorithm]}
+        )
+        assert PasswordHasher(costlier).needs_rehash(pwhash)
+        assert PasswordHasher(costlier).verify(pwhash, PASSWORD)
+
+    async def test_no_free_slot(self):
+        pool_hasher = PasswordHasher(
+            HashingSettings(pool_size=1, max_pending=1, timeout=0.01)
+        )
+        pool_hasher._slots.acquire()
+        with pytest.raises(HashingUnavailable):
+            pool_hasher.hash(PASSWORD)
+
+    async def test_overloaded_login_is_unavailable(self, app_client, monkeypatch):
+        monkeypatch.setattr(hasher.settings, "pool_size", 1)
+        monkeypatch.setattr(hasher.settings, "timeout", 0.01)
+        monkeypatch.setattr(hasher, "_slots", PasswordHasher(hasher.settings)._slots)
+        for _ in range(hasher.settings.max_pending):
+            hasher._slots.acquire()
+
+        response = app_client.post(
+            "/api/v1/auth/login",
+            json={"login": "superuser", "password": "superpassword"},
+        )
+        assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+    async def test_login_upgrades_hash(self, app_client, inline_hasher, monkeypatch):
+        credentials = {"login": f"rehash_{uuid4().hex[:8]}", "password": PASSWORD}
+        monkeypatch.setattr(inline_hasher.settings, "pbkdf2_iterations", 2000)
+        response = app_client.post("/api/v1/auth/registration", json=credentials)
+        assert response.status_code == HTTPStatus.CREATED
+
+        monkeypatch.setattr(inline_hasher.settings, "pbkdf2_iterations", 3000)
+        response = app_client.post("/api/v1/auth/login", json=credentials)
+        assert response.status_code == HTTPStatus.OK
+        with app_client.application.app_context():
+            user = User.query.filter_by(login=credentials["login"]).one()
+            assert user.password.startswith("pbkdf2:sha256:3000$")
+        response = app_client.post("/api/v1/auth/login", json=credentials)
+        assert response.status_code == HTTPStatus.OK
@@ -0,0 +1,133 @@
+import importlib
+import os
+from http import HTTPStatus
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, decode_token
+from jwt.exceptions import InvalidTokenError
+
+from app.core import keys
+from app.core.keys import KeyRing, generate_key
+
+pytestmark = pytest.mark.asyncio
+
+well_known_module = importlib.import_module("app.api.well_known")
+
+
+@pytest.fixture(name="keys_dir")
+def keys_dir_fixture(tmp_path):
+    generate_key(str(tmp_path), "2022-01-01", "RS256")
+    generate_key(str(tmp_path), "2022-02-01", "ES256")
+    return tmp_path
+
+
+def sign(key_ring: KeyRing, claims: dict) -> str:
+    return jwt.encode(
+        claims,
+        key_ring.signing_key(),
+        algorithm=key_ring.algorithm,
+        headers={"kid": key_ring.active_kid},
+    )
+
+
+def verify(key_ring: KeyRing, token: str) -> dict:
+    kid = jwt.get_unverified_header(token)["kid"]
+    return jwt.decode(
+        token, key_ring.verification_key(kid), algorithms=key_ring.algorithms
+    )
+
+
+class TestKeyRing:
+    """Test asymmetric signing keys and their rotation."""
+
+    async def test_newest_key_signs(self, keys_dir):
+        key_ring = KeyRing.load(str(keys_dir))
+        assert key_ring.active_kid == "2022-02-01"
+        assert key_ring.algorithm == "ES256"
+        assert key_ring.algorithms == ["ES256", "RS256"]
+
+    async def test_rotated_out_key_still_verifies(self, keys_dir):
+        old_ring = KeyRing.load(str(keys_dir), active_kid="2022-01-01")
+        token = sign(old_ring, {"sub": "user"})
+
+        key_ring = KeyRing.load(str(keys_dir))
+        assert verify(key_ring, token) == {"sub": "user"}
+
+        # Old key removed after its last token has expired
+        (keys_dir / "2022-01-01.pem").unlink()
+        with pytest.raises(InvalidTokenError):
+            verify(KeyRing.load(str(keys_dir)), token)
+
+    async def test_public_key_only_verifies(self, keys_dir):
+        key_ring = KeyRing.load(str(keys_dir))
+        public_key = key_ring.verification_key("2022-01-01")
+        (keys_dir / "2021-12-01.pem").write_bytes(
+            public_key.public_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+        )
+        assert KeyRing.load(str(keys_dir)).verification_key("2021-12-01")
+        with pytest.raises(ValueError):
+            KeyRing.load(str(keys_dir), active_kid="2021-12-01")
+
+    async def test_tokens_carry_kid(self, keys_dir, monkeypatch):
+        key_ring = KeyRing.load(str(keys_dir))
+        monkeypatch.setattr(keys, "key_ring", key_ring)
+        app = Flask(__name__)
+        keys.setup(app, JWTManager(app))
+
+        with app.app_context():
+            token = create_access_token(identity="user")
+            assert jwt.get_unverified_header(token)["kid"] == key_ring.active_kid
+            assert decode_token(token)["sub"] == "user"
+
+
+class TestJWKS:
+    """Test publishing of verification keys."""
+
+    async def test_conditional_get(self, app_client, keys_dir, monkeypatch):
+        key_ring = KeyRing.load(str(keys_dir))
+        monkeypatch.setattr(well_known_module, "key_ring", key_ring)
+
+        response = app_client.get("/.well-known/jwks.json")
+        assert response.status_code == HTTPStatus.OK
+        published = {jwk["kid"]: jwk["alg"] for jwk in response.json["keys"]}
+        assert published == {"2022-01-01": "RS256", "2022-02-01": "ES256"}
+        assert all(jwk["use"] == "sig" for jwk in response.json["keys"])
+        assert response.cache_control.public
+
+        headers = {"If-None-Match": response.headers["ETag"]}
+        response = app_client.get("/.well-known/jwks.json", headers=headers)
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    async def test_published_keys_verify_tokens(self, keys_dir):
+        for kid in ("2022-01-01", "2022-02-01"):
+            key_ring = KeyRing.load(str(keys_dir), active_kid=kid)
+            token = sign(key_ring, {"sub": "user"})
+            jwk = next(jwk for jwk in key_ring.jwks()["keys"] if jwk["kid"] == kid)
+            claims = jwt.decode(
+                token, jwt.PyJWK(jwk).key, algorithms=[key_ring.algorithm]
+            )
+            assert claims == {"sub": "user"}
+
+
+class TestGenerateCommand:
+    """Test `flask jwt-keys generate` command."""
+
+    async def test_generate(self, app_client, tmp_path):
+        runner = app_client.application.test_cli_runner()
+        args = ["jwt-keys", "generate", "--kid", "2022-03-20", "-a", "EdDSA"]
+        args += ["--keys-dir", str(tmp_path)]
+
+        result = runner.invoke(args=args)
+        assert result.exit_code == 0, result.output
+        path = tmp_path / "2022-03-20.pem"
+        assert os.stat(path).st_mode & 0o777 == 0o600
+        assert KeyRing.load(str(tmp_path)).algorithm == "EdDSA"
+
+        # Existing key is never overwritten
+        assert runner.invoke(args=args).exit_code != 0
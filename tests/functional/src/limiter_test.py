@@ -0,0 +1,61 @@
+from uuid import uuid4
+
+import pytest
+from limits import parse
+from limits.storage import RedisStorage
+
+from app.core.config import RateLimitSettings
+from app.core.gcra import GCRARateLimiter
+from app.core.limiter import key_function
+from app.core.redis import redis_factory
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(name="gcra")
+def gcra_fixture() -> GCRARateLimiter:
+    storage = RedisStorage("redis://", connection_pool=redis_factory.pool())
+    limiter = GCRARateLimiter(storage, RateLimitSettings(local_precheck=True))
+    # Limiter keeps weak reference to its storage
+    limiter.keep_storage = storage
+    return limiter
+
+
+class TestGCRA:
+    """Test GCRA strategy over application Redis."""
+
+    async def test_burst_then_reject(self, gcra):
+        item, key = parse("3/minute"), uuid4().hex
+        assert [gcra.hit(item, key) for _ in range(4)] == [True, True, True, False]
+        reset, remaining = gcra.get_window_stats(item, key)
+        assert remaining == 0
+        assert not gcra.test(item, key)
+
+        gcra.clear(item, key)
+        assert gcra.test(item, key)
+        assert gcra.hit(item, key)
+
+    async def test_local_precheck_skips_redis(self, gcra):
+        item, key = parse("2/minute"), uuid4().hex
+        for _ in range(2):
+            gcra.hit(item, key)
+        checks = gcra.stats()["redis_checks"]
+        assert not gcra.hit(item, key)
+        assert not gcra.hit(item, key)
+        assert gcra.stats()["redis_checks"] == checks
+        assert gcra.stats()["local_rejects"] == 2
+
+
+class TestKeyFunction:
+    """Test rate limit key comes from token claims."""
+
+    async def test_key_from_token(self, app_client, superadmin_token: str):
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        app = app_client.application
+        with app.test_request_context(headers=headers):
+            key = key_function()
+        with app.test_request_context(environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+            anonymous = key_function()
+        assert key != "10.0.0.1"
+        assert len(key) == 36
+        assert anonymous == "10.0.0.1"
@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+
+from app.core.config import PartitionSettings
+from app.core.partitions import (
+    PartitionManager,
+    Period,
+    next_period,
+    partition_name,
+    period_start,
+    previous_period,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestPeriods:
+    """Test period math of sessions partitions."""
+
+    @pytest.mark.parametrize(
+        "day, period, start",
+        [
+            (date(2022, 3, 20), Period.day, date(2022, 3, 20)),
+            # Weeks start on Monday
+            (date(2022, 3, 20), Period.week, date(2022, 3, 14)),
+            (date(2022, 3, 14), Period.week, date(2022, 3, 14)),
+            (date(2022, 3, 31), Period.month, date(2022, 3, 1)),
+        ],
+    )
+    async def test_period_start(self, day, period, start):
+        assert period_start(day, period) == start
+
+    @pytest.mark.parametrize(
+        "start, period, following",
+        [
+            (date(2022, 2, 28), Period.day, date(2022, 3, 1)),
+            (date(2021, 12, 27), Period.week, date(2022, 1, 3)),
+            (date(2022, 1, 1), Period.month, date(2022, 2, 1)),
+            (date(2022, 12, 1), Period.month, date(2023, 1, 1)),
+        ],
+    )
+    async def test_next_and_previous(self, start, period, following):
+        assert next_period(start, period) == following
+        assert previous_period(following, period) == start
+
+    @pytest.mark.parametrize(
+        "start, period, name",
+        [
+            (date(2022, 3, 5), Period.day, "sessions_y2022m03d05"),
+            (date(2022, 3, 14), Period.week, "sessions_y2022w11"),
+            # ISO year of the week, not the calendar one
+            (date(2024, 12, 30), Period.week, "sessions_y2025w01"),
+            (date(2022, 3, 1), Period.month, "sessions_y2022m03"),
+        ],
+    )
+    async def test_partition_name(self, start, period, name):
+        assert partition_name(start, period) == name
+
+
+class TestPartitionManager:
+    """Test planning and expiry of sessions partitions."""
+
+    async def test_plan_crosses_year(self):
+        manager = PartitionManager(PartitionSettings(period=Period.month, ahead=2))
+        assert list(manager.plan(date(2022, 11, 15))) == [
+            ("sessions_y2022m11", date(2022, 11, 1), date(2022, 12, 1)),
+            ("sessions_y2022m12", date(2022, 12, 1), date(2023, 1, 1)),
+            ("sessions_y2023m01", date(2023, 1, 1), date(2023, 2, 1)),
+        ]
+
+    async def test_cutoff(self):
+        manager = PartitionManager(PartitionSettings(period=Period.week))
+        assert manager.cutoff(date(2022, 3, 20)) is None
+
+        manager.settings.retention = 2
+        assert manager.cutoff(date(2022, 3, 20)) == date(2022, 2, 28)
+
+    async def test_expired(self):
+        manager = PartitionManager(PartitionSettings(period=Period.month, retention=1))
+        partitions = {
+            "sessions_y2022m01": "FOR VALUES FROM ('2022-01-01') TO ('2022-02-01')",
+            "sessions_y2022m02": "FOR VALUES FROM ('2022-02-01') TO ('2022-03-01')",
+            "sessions_y2022m03": "FOR VALUES FROM ('2022-03-01') TO ('2022-04-01')",
+            "sessions_default": "DEFAULT",
+        }
+        expired = manager._expired(partitions, date(2022, 3, 20))
+        assert list(expired) == ["sessions_y2022m01"]
+
+    async def test_dry_run(self, app_client):
+        manager = PartitionManager(PartitionSettings(period=Period.month, ahead=1))
+        today = date(2031, 5, 10)
+        with app_client.application.app_context():
+            report = manager.run(today, dry_run=True)
+            assert report.locked
+            assert report.created == ["sessions_y2031m05", "sessions_y2031m06"]
+            # Nothing is left after the dry run
+            assert manager.run(today, dry_run=True).created == report.created
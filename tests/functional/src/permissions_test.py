@@ -0,0 +1,93 @@
+from uuid import uuid4
+
+import pytest
+from werkzeug.exceptions import Forbidden
+
+from app.core.alchemy import db
+from app.core.enums import DefaultRole
+from app.core.permissions import CUSTOM_ROLES_OFFSET, PermissionTable
+from app.core.role_catalog import role_catalog
+from app.core.user_cache import CachedUser
+from app.models.db_models import Role
+from app.utils import create_tokens, load_roles, permissions_required
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(name="custom_role")
+def custom_role_fixture(app_client) -> str:
+    name = f"perm_{uuid4().hex[:8]}"
+    with app_client.application.app_context():
+        db.session.add(Role(name=name))
+        db.session.commit()
+        role_catalog.bump(load_roles)
+    yield name
+    with app_client.application.app_context():
+        Role.query.filter_by(name=name).delete()
+        db.session.commit()
+        role_catalog.bump(load_roles)
+
+
+def mask_bits(mask: str) -> set:
+    value = int(mask, 16)
+    return {bit for bit in range(value.bit_length()) if value >> bit & 1}
+
+
+class TestPermissionTable:
+    """Test packing roles into permission mask."""
+
+    async def test_default_roles_by_declaration_order(self):
+        table = PermissionTable()
+        assert mask_bits(table.encode(["visitor", "admin"])) == {1, 4}
+        assert table.encode([]) == "0"
+
+    async def test_custom_roles_after_default_ones(self):
+        table = PermissionTable()
+        table.compile([(1, "admin"), (2, "editor"), (7, "moderator")])
+
+        mask = table.encode(["editor", "moderator", "unknown"])
+        assert mask_bits(mask) == {CUSTOM_ROLES_OFFSET + 2, CUSTOM_ROLES_OFFSET + 7}
+        # Default role keeps its bit even when it's in roles table too
+        assert mask_bits(table.encode(["admin"])) == {4}
+
+    async def test_allows(self):
+        table = PermissionTable()
+        table.compile([(3, "editor")])
+        mask = table.encode(["editor", "user"])
+
+        assert table.allows(mask, "editor")
+        assert table.allows(mask, DefaultRole.user.value)
+        assert table.allows(mask, DefaultRole.admin.value) is False
+        assert table.allows(mask, "unknown") is None
+
+
+class TestPermissionsRequired:
+    """Test role checks by token claims."""
+
+    @staticmethod
+    def call(app_client, role: str, roles, is_superuser: bool = False) -> bool:
+        app = app_client.application
+        with app.app_context():
+            user = CachedUser(
+                id=uuid4(), login="perm", is_superuser=is_superuser, roles=roles
+            )
+            token = create_tokens(user, uuid4().hex, uuid4().hex).access_token
+
+        view = permissions_required(role)(lambda: True)
+        headers = {"Authorization": f"Bearer {token}"}
+        with app.test_request_context(headers=headers):
+            try:
+                return view()
+            except Forbidden:
+                return False
+
+    async def test_custom_role(self, app_client, custom_role):
+        assert self.call(app_client, custom_role, [custom_role])
+        assert not self.call(app_client, custom_role, ["user", "admin"])
+        assert self.call(app_client, custom_role, [], is_superuser=True)
+
+    async def test_role_unknown_to_table(self, app_client):
+        # Created by another worker, not yet in the catalog of this one
+        role = f"ghost_{uuid4().hex[:8]}"
+        assert self.call(app_client, role, [role])
+        assert not self.call(app_client, role, ["user"])
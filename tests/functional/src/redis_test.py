@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from app.core.redis import redis, redis_factory
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestRedisFactory:
+    """Test per process Redis connection pools."""
+
+    async def test_stats(self, app_client):
+        response = app_client.get("/stats")
+        stats = response.json["redis"]
+        assert stats["created"] >= 1
+        assert stats["in_use"] + stats["idle"] == stats["created"]
+
+    async def test_forked_process_gets_own_pool(self):
+        redis.ping()
+        parent_pool = redis_factory.pool()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child reports whether it got a fresh pool which works
+            fresh = redis_factory.pool() is not parent_pool and redis.ping()
+            os.write(write_end, b"1" if fresh else b"0")
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read_end, 1) == b"1"
+        assert redis_factory.pool() is parent_pool
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+
+from app.core.enums import Rotation
+from app.core.redis import keyspace_usage, redis
+from app.core.refresh_tokens import device_id, refresh_tokens
+
+pytestmark = pytest.mark.asyncio
+
+TTL = timedelta(days=1)
+DEVICE = "refresh-tokens-test"
+
+
+@pytest.fixture(name="user_id")
+def user_id_fixture() -> str:
+    user_id = str(uuid4())
+    yield user_id
+    redis.delete(refresh_tokens._key(user_id))
+
+
+class TestRefreshTokenStore:
+    """Test refresh tokens of user devices kept in one hash."""
+
+    async def test_rotate(self, user_id):
+        def rotate(jti: str, family: str, new_jti: str) -> Rotation:
+            return refresh_tokens.rotate(user_id, DEVICE, jti, family, new_jti, TTL)
+
+        refresh_tokens.store(user_id, DEVICE, "first", "family", TTL)
+        assert rotate("first", "family", "second") == Rotation.rotated
+        assert rotate("first", "other", "third") == Rotation.invalid
+        # Reuse of rotated token drops the family
+        assert rotate("first", "family", "third") == Rotation.reused
+        assert rotate("second", "family", "third") == Rotation.invalid
+
+    async def test_revoke(self, user_id):
+        refresh_tokens.store(user_id, DEVICE, "first", "family", TTL)
+        refresh_tokens.store(user_id, "other device", "jti", "family", TTL)
+        refresh_tokens.revoke(user_id, DEVICE)
+        rotation = refresh_tokens.rotate(
+            user_id, DEVICE, "first", "family", "second", TTL
+        )
+        assert rotation == Rotation.invalid
+        assert redis.hlen(refresh_tokens._key(user_id)) == 1
+
+    async def test_expired_devices_are_dropped(self, user_id):
+        key = refresh_tokens._key(user_id)
+        redis.hset(key, "expired", "jti|family|1")
+        redis.hset(key, "legacy", "jti|family")
+        refresh_tokens.store(user_id, DEVICE, "first", "family", TTL)
+
+        fields = redis.hgetall(key)
+        assert set(fields) == {"legacy", device_id(DEVICE)}
+        # Field stored without expiry gets the one of a new token
+        assert fields["legacy"].startswith("jti|family|")
+        assert 0 < redis.ttl(key) <= TTL.total_seconds()
+
+    async def test_hash_lives_with_latest_token(self, user_id):
+        refresh_tokens.store(user_id, DEVICE, "first", "family", TTL)
+        refresh_tokens.store(user_id, "short", "jti", "family", timedelta(hours=1))
+        assert redis.ttl(refresh_tokens._key(user_id)) > timedelta(hours=1).seconds
+
+
+class TestKeyspaceUsage:
+    """Test Redis memory report by key family."""
+
+    async def test_usage_by_family(self):
+        family = f"usage{uuid4().hex[:8]}:"
+        keys = [f"{family}{number}" for number in range(3)]
+        for key in keys:
+            redis.set(key, "x" * 100)
+        try:
+            rows = keyspace_usage(f"{family}*")
+        finally:
+            redis.delete(*keys)
+        assert len(rows) == 1
+        name, count, usage = rows[0]
+        assert (name, count) == (family, 3)
+        assert usage >= 300
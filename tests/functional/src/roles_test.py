@@ -4,6 +4,8 @@ from http import HTTPStatus
 import pytest
 
 from app.core.enums import DefaultRole
+from app.core.redis import redis
+from app.core.role_catalog import role_catalog
 from app.serializers.roles import RoleBody
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,62 @@ class TestGetRoles:
         assert response.status == HTTPStatus.OK
         logger.info("Roles: %s", response.body)
 
+    async def test_get_roles_list_not_modified(self, make_request, superadmin_token):
+        """Test roles list is not sent again until roles change."""
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            jwt=superadmin_token,
+        )
+        etag = response.headers["Etag"]
+
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            jwt=superadmin_token,
+            headers={"If-None-Match": etag},
+        )
+        assert response.status == HTTPStatus.NOT_MODIFIED
+        assert response.headers["Etag"] == etag
+
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/",
+            json={"name": "etag_role"},
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.CREATED
+        role_id = response.body["id"]
+
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            jwt=superadmin_token,
+            headers={"If-None-Match": etag},
+        )
+        assert response.status == HTTPStatus.OK
+        assert response.headers["Etag"] != etag
+
+        await make_request(
+            method="DELETE",
+            url=f"{PATH}/{role_id}/",
+            jwt=superadmin_token,
+        )
+
+    async def test_lost_version_does_not_reuse_etags(
+        self, app_client, superadmin_token
+    ):
+        """Test ETags seen before roles version was lost never come back."""
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        etags = []
+        for _ in range(3):
+            response = app_client.get(f"{PATH}/", headers=headers)
+            assert response.headers["ETag"] not in etags
+            etags.append(response.headers["ETag"])
+            # As after Redis restart
+            redis.delete(role_catalog.settings.version_key)
+            role_catalog._checked_at = 0
+
 
 class TestCreateRole:
     """Test create role method."""
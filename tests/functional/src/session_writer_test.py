@@ -0,0 +1,143 @@
+import importlib
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+
+from app.core.alchemy import db
+from app.core.config import SessionWriterSettings
+from app.core.redis import redis
+from app.core.session_writer import LoginEvent, SessionWriter
+from app.models.db_models import Session
+from app.serializers.auth import UserBody
+
+pytestmark = pytest.mark.asyncio
+
+auth_module = importlib.import_module("app.api.v1.auth")
+
+
+@pytest_asyncio.fixture(name="login_user", scope="module")
+async def login_user_fixture(make_request) -> UserBody:
+    response = await make_request(
+        method="POST",
+        url="/api/v1/auth/registration",
+        json={"login": f"writer_{uuid4().hex[:8]}", "password": "SuperStr0ng!"},
+    )
+    return UserBody(**response.body)
+
+
+@pytest.fixture(name="writer")
+def writer_fixture(app_client):
+    buffer = f"sessions:test:{uuid4().hex}"
+    settings = SessionWriterSettings(
+        enabled=True, buffer=buffer, dead_letters=f"{buffer}:dead"
+    )
+    writer = SessionWriter(settings)
+    writer._app = app_client.application
+    yield writer
+    redis.delete(settings.buffer, settings.dead_letters, f"{buffer}:lock")
+
+
+def written(app_client, *events: LoginEvent) -> int:
+    with app_client.application.app_context():
+        ids = [event.id for event in events]
+        return Session.query.filter(Session.id.in_(ids)).count()
+
+
+class TestSessionWriter:
+    """Test write-behind buffer of sessions history."""
+
+    async def test_record_then_flush(self, app_client, writer, login_user):
+        with app_client.application.app_context():
+            writer.record(login_user.id, "buffered")
+            db.session.rollback()
+        event = writer.last_login(login_user.id)
+        assert event.user_agent == "buffered"
+        assert written(app_client, event) == 0
+
+        assert writer.flush() == 1
+        assert written(app_client, event) == 1
+        assert redis.llen(writer.settings.buffer) == 0
+
+    async def test_full_buffer_writes_synchronously(
+        self, app_client, writer, login_user
+    ):
+        writer.settings.max_pending = 0
+        with app_client.application.app_context():
+            writer.record(login_user.id, "synchronous")
+            db.session.commit()
+        assert redis.llen(writer.settings.buffer) == 0
+        with app_client.application.app_context():
+            query = Session.query.filter_by(
+                user_id=login_user.id, user_agent="synchronous"
+            )
+            assert query.count() == 1
+
+    async def test_rejected_events_go_to_dead_letters(
+        self, app_client, writer, login_user
+    ):
+        good = LoginEvent(user_id=login_user.id, user_agent="good")
+        orphan = LoginEvent(user_id=uuid4(), user_agent="orphan")
+        raw_events = [orphan.json(), "not an event", good.json()]
+        redis.rpush(writer.settings.buffer, *raw_events)
+
+        assert writer.flush() == 3
+        assert written(app_client, good) == 1
+        assert redis.llen(writer.settings.buffer) == 0
+        dead = redis.lrange(writer.settings.dead_letters, 0, -1)
+        assert sorted(dead) == sorted(raw_events[:2])
+
+    async def test_batch_outliving_lock_is_kept(
+        self, app_client, writer, login_user, monkeypatch
+    ):
+        event = LoginEvent(user_id=login_user.id, user_agent="slow")
+        redis.rpush(writer.settings.buffer, event.json())
+        insert = writer._insert
+
+        def slow_insert(events):
+            insert(events)
+            # Lock expired and another flusher took it meanwhile
+            redis.set(f"{writer.settings.buffer}:lock", "other")
+
+        monkeypatch.setattr(writer, "_insert", slow_insert)
+        assert writer.flush() == 0
+        assert redis.lrange(writer.settings.buffer, 0, -1) == [event.json()]
+        assert written(app_client, event) == 1
+
+    async def test_history_merges_pending_login(self, app_client, writer, monkeypatch):
+        credentials = {"login": f"pending_{uuid4().hex[:8]}", "password": "QWERTy90!"}
+        user = app_client.post("/api/v1/auth/registration", json=credentials).json
+        for device in ("first", "second"):
+            response = app_client.post(
+                "/api/v1/auth/login", json=credentials, headers={"User-Agent": device}
+            )
+        headers = {"Authorization": f"Bearer {response.json['access_token']}"}
+        with app_client.application.app_context():
+            writer.record(user["id"], "buffered")
+            db.session.rollback()
+        monkeypatch.setattr(auth_module, "session_writer", writer)
+
+        path = "/api/v1/auth/history"
+        params = {"page_size": 2, "count": "true"}
+        response = app_client.get(path, query_string=params, headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        assert [row["user_agent"] for row in response.json] == ["buffered", "second"]
+        assert response.headers["X-Total-Count"] == "3"
+
+        cursor = response.headers["X-Next-Cursor"]
+        params = {"page_size": 2, "cursor": cursor}
+        response = app_client.get(path, query_string=params, headers=headers)
+        assert [row["user_agent"] for row in response.json] == ["first"]
+        assert "X-Next-Cursor" not in response.headers
+
+        params = {"page_size": 2, "page": 2}
+        response = app_client.get(path, query_string=params, headers=headers)
+        assert [row["user_agent"] for row in response.json] == ["first"]
+
+        # Once flushed, the same login is read from the database
+        writer.flush()
+        params = {"page_size": 2, "count": "true"}
+        response = app_client.get(path, query_string=params, headers=headers)
+        assert [row["user_agent"] for row in response.json] == ["buffered", "second"]
+        assert response.headers["X-Total-Count"] == "3"
@@ -0,0 +1,82 @@
+from uuid import uuid4
+
+import pytest
+
+from app.core.config import UserCacheSettings
+from app.core.redis import redis
+from app.core.user_cache import CachedUser, UserCache
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(name="make_cache")
+def make_cache_fixture():
+    """Create caches of separate workers sharing a key prefix of their own."""
+    prefix = f"uc:test:{uuid4().hex}:"
+
+    def inner() -> UserCache:
+        return UserCache(UserCacheSettings(key_prefix=prefix))
+
+    yield inner
+    keys = list(redis.scan_iter(f"{prefix}*"))
+    if keys:
+        redis.delete(*keys)
+
+
+@pytest.fixture(name="user")
+def user_fixture() -> CachedUser:
+    return CachedUser(id=uuid4(), login="cached", roles=["subscriber"])
+
+
+class Loader:
+    def __init__(self, user: CachedUser):
+        self.user = user
+        self.calls = 0
+
+    def __call__(self, _user_id: str) -> CachedUser:
+        self.calls += 1
+        return self.user
+
+
+class TestUserCache:
+    """Test two-tier user cache and its invalidation."""
+
+    async def test_hits_and_misses(self, make_cache, user):
+        cache, other_worker = make_cache(), make_cache()
+        loader = Loader(user)
+
+        assert cache.get_or_load(user.id, loader) == user
+        assert cache.get_or_load(user.id, loader) == user
+        assert other_worker.get_or_load(user.id, loader) == user
+        assert loader.calls == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["local_hits"] == 1
+        assert other_worker.stats()["redis_hits"] == 1
+
+    async def test_invalidation_reaches_other_workers(self, make_cache, user):
+        cache, other_worker = make_cache(), make_cache()
+        loader = Loader(user)
+        other_worker.get_or_load(user.id, loader)
+
+        cache.invalidate(user.id)
+        # What the listener of the other worker does on the message
+        other_worker._drop_local([str(user.id)])
+        loader.user = user.copy(update={"roles": []})
+        assert other_worker.get_or_load(user.id, loader).roles == []
+        assert loader.calls == 2
+
+    async def test_load_racing_invalidation_is_not_cached(self, make_cache, user):
+        cache = make_cache()
+        stale = Loader(user)
+
+        def racing_loader(user_id: str) -> CachedUser:
+            loaded = stale(user_id)
+            # Roles change after the user is read from the database
+            cache.invalidate(user_id)
+            return loaded
+
+        assert cache.get_or_load(user.id, racing_loader) == user
+        fresh = Loader(user.copy(update={"roles": []}))
+        assert cache.get_or_load(user.id, fresh).roles == []
+        assert fresh.calls == 1
+        assert make_cache().get_or_load(user.id, fresh).roles == []
@@ -1,13 +1,31 @@
+import gzip
+import json
 import logging
+from datetime import datetime, timedelta
 from http import HTTPStatus
+from typing import List
 from uuid import uuid4
 
 import pytest
 import pytest_asyncio
+from pydantic import ValidationError
+from sqlalchemy import event, false, select, text, update
 
-from app.serializers.auth import UserBody
+from app.core.alchemy import db, read_from_replica, replica_reads
+from app.core.config import SerializationSettings
+from app.core.enums import ImportCollision, LoginMatch, Provider
+from app.core.serialization import Serializer
+from app.core.user_import import (
+    ImportCollisionError,
+    ImportRecord,
+    ImportReport,
+    UserImporter,
+)
+from app.models.db_models import User
+from app.serializers.auth import HistoryBody, UserBody
 from app.serializers.roles import RoleBody
-from app.serializers.users import UserRolesBody
+from app.serializers.users import PaginationUsersBody, UserRolesBody
+from app.utils import load_user_from_replica, login_filter
 
 logger = logging.getLogger(__name__)
 pytestmark = pytest.mark.asyncio
@@ -54,6 +72,115 @@ class TestGetUserRoles:
         assert response.status == HTTPStatus.OK
         logger.info("Users and roles: %s", response.body)
 
+    async def test_get_roles_list_keyset(self, make_request, superadmin_token: str):
+        """Test next page is requested by last login of the previous one."""
+        params = {"per_page": 1, "exact_count": "true"}
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            params=params,
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.OK
+        assert response.body["count_is_estimate"] is False
+        assert response.body["page"] == 1
+        assert response.body["total_pages"] >= 1
+        first_login = response.body["results"][0]["user"]["login"]
+
+        params = {"per_page": 1, "after": response.body["next_after"]}
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            params=params,
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.OK
+        assert response.body["results"][0]["user"]["login"] > first_login
+        # Keyset page has no number
+        assert response.body["page"] is None
+        assert response.body["total_pages"] is None
+
+    async def test_get_roles_list_query_count(
+        self, app_client, count_queries, superadmin_token: str, temp_user
+    ):
+        """Test roles are loaded in one query whatever the page size is."""
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        # Role catalog may be due for reload, keep it out of the count
+        app_client.get(f"{PATH}/", headers=headers)
+        query_counts, page_sizes = [], []
+        for per_page in (1, 10):
+            with count_queries() as statements:
+                response = app_client.get(
+                    f"{PATH}/", query_string={"per_page": per_page}, headers=headers
+                )
+            assert response.status_code == HTTPStatus.OK
+            query_counts.append(len(statements))
+            page_sizes.append(len(response.json["results"]))
+        assert page_sizes[0] < page_sizes[1]
+        assert query_counts[0] == query_counts[1]
+
+    @pytest.mark.parametrize("params", [{"page": 0}, {"per_page": 101}])
+    async def test_get_roles_list_bad_page(
+        self, make_request, superadmin_token: str, params
+    ):
+        """Test out of range page numbers and sizes are rejected."""
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            params=params,
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.BAD_REQUEST
+
+
+class TestSearchUsers:
+    """Test login search is served by indexes."""
+
+    @staticmethod
+    def explain(app_client, match: LoginMatch) -> str:
+        with app_client.application.app_context():
+            # Tiny test table would be scanned sequentially anyway
+            db.session.execute(text("SET LOCAL enable_seqscan = off"))
+            query = User.query.filter(login_filter("Role_T", match))
+            statement = query.statement.compile(dialect=db.engine.dialect)
+            rows = (
+                db.session.connection()
+                .exec_driver_sql(f"EXPLAIN {statement}", statement.params)
+                .scalars()
+                .all()
+            )
+            db.session.rollback()
+        return "\n".join(rows)
+
+    async def test_prefix_search_uses_index(self, app_client, temp_user):
+        """Test prefix search uses lower(login) text_pattern_ops index."""
+        plan = self.explain(app_client, LoginMatch.prefix)
+        assert "ix_users_login_lower_pattern" in plan
+
+    async def test_contains_search_uses_index(self, app_client, temp_user):
+        """Test substring search uses pg_trgm index when it is installed."""
+        with app_client.application.app_context():
+            installed = db.session.execute(
+                text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                {"name": "ix_users_login_lower_trgm"},
+            ).scalar()
+        if not installed:
+            pytest.skip("pg_trgm extension is not available")
+        plan = self.explain(app_client, LoginMatch.contains)
+        assert "ix_users_login_lower_trgm" in plan
+
+    async def test_search_contains(self, make_request, superadmin_token, temp_user):
+        """Test substring search finds user by the middle of login."""
+        response = await make_request(
+            method="GET",
+            url=f"{PATH}/",
+            params={"search": "E_TEST", "match": "contains"},
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.OK
+        logins = [row["user"]["login"] for row in response.body["results"]]
+        assert temp_user.login in logins
+
 
 class TestSetRole:
     """Test grant role method."""
@@ -187,3 +314,269 @@ class TestDeleteRole:
             jwt=superadmin_token,
         )
         assert response.status == HTTPStatus.CONFLICT
+
+
+class TestRolesBatch:
+    """Test batch grant and revoke roles method."""
+
+    async def batch(self, make_request, token: str, *operations) -> list:
+        body = {
+            "operations": [
+                {"user_id": str(user_id), "role_id": role_id, "action": action}
+                for user_id, role_id, action in operations
+            ]
+        }
+        response = await make_request(
+            method="POST", url=f"{PATH}/roles:batch", json=body, jwt=token
+        )
+        assert response.status == HTTPStatus.OK
+        return [item["result"] for item in response.body["results"]]
+
+    async def test_success(
+        self,
+        make_request,
+        superadmin_token: str,
+        temp_role: RoleBody,
+        temp_user: UserBody,
+    ):
+        """Test every outcome is reported in request order."""
+        results = await self.batch(
+            make_request,
+            superadmin_token,
+            (temp_user.id, temp_role.id, "grant"),
+            (uuid4(), temp_role.id, "grant"),
+            (temp_user.id, 0, "revoke"),
+        )
+        assert results == ["granted", "not_found", "not_found"]
+
+        results = await self.batch(
+            make_request, superadmin_token, (temp_user.id, temp_role.id, "grant")
+        )
+        assert results == ["already_granted"]
+
+        results = await self.batch(
+            make_request, superadmin_token, (temp_user.id, temp_role.id, "revoke")
+        )
+        assert results == ["revoked"]
+
+        results = await self.batch(
+            make_request, superadmin_token, (temp_user.id, temp_role.id, "revoke")
+        )
+        assert results == ["not_granted"]
+
+    async def test_duplicate_pairs(
+        self,
+        make_request,
+        superadmin_token: str,
+        temp_role: RoleBody,
+        temp_user: UserBody,
+    ):
+        """Test the same pair can't be both granted and revoked."""
+        operations = [
+            {"user_id": str(temp_user.id), "role_id": temp_role.id, "action": action}
+            for action in ("grant", "revoke")
+        ]
+        response = await make_request(
+            method="POST",
+            url=f"{PATH}/roles:batch",
+            json={"operations": operations},
+            jwt=superadmin_token,
+        )
+        assert response.status == HTTPStatus.BAD_REQUEST
+
+
+class TestImportUsers:
+    """Test bulk users import command."""
+
+    async def test_import_and_resume(self, make_request, app_client, tmp_path):
+        source = tmp_path / "users.jsonl"
+        records = [
+            {"login": "imported_user", "password": "QWERTy90!", "roles": ["admin"]},
+            {"login": "imported_user_2", "password_hash": "pbkdf2:sha256:1$a$b"},
+            {"login": "no_password"},
+        ]
+        source.write_text("\n".join(json.dumps(record) for record in records))
+        runner = app_client.application.test_cli_runner()
+
+        result = runner.invoke(args=["import-users", str(source), "--workers", "0"])
+        assert result.exit_code == 0, result.output
+        checkpoint = tmp_path / "users.jsonl.checkpoint"
+        report = json.loads(checkpoint.read_text())
+        assert (report["processed"], report["created"], report["invalid"]) == (3, 2, 1)
+
+        response = await make_request(
+            method="POST",
+            url="/api/v1/auth/login",
+            json={"login": "imported_user", "password": "QWERTy90!"},
+        )
+        assert response.status == HTTPStatus.OK
+
+        # Everything is already done according to checkpoint
+        result = runner.invoke(args=["import-users", str(source)])
+        assert result.exit_code == 0, result.output
+        assert json.loads(checkpoint.read_text()) == report
+
+        args = ["import-users", str(source), "--restart", "--on-conflict", "fail"]
+        result = runner.invoke(args=args)
+        assert result.exit_code != 0
+
+    async def test_unknown_provider_is_invalid(self):
+        record = {"login": "social_user", "password": "QWERTy90!"}
+        parsed = ImportRecord.parse_obj({**record, "social": "google:1;yandex:2"})
+        assert [account.social_name for account in parsed.social] == [
+            Provider.google,
+            Provider.yandex,
+        ]
+        with pytest.raises(ValidationError):
+            ImportRecord.parse_obj({**record, "social": "myspace:1"})
+
+    async def test_concurrent_login_is_collision(self, app_client, monkeypatch):
+        login = f"race_{uuid4().hex[:8]}"
+        importer = UserImporter(ImportCollision.fail, workers=0)
+        records = [{"login": login, "password_hash": "pbkdf2:sha256:1$a$b"}]
+        with app_client.application.app_context():
+            importer.run(records, ImportReport(source="first"))
+            existing_logins = importer._existing_logins
+            # Same login is written between the check and the merge
+            checks = iter([[], None])
+            monkeypatch.setattr(
+                importer,
+                "_existing_logins",
+                lambda logins: next(checks) or existing_logins(logins),
+            )
+            with pytest.raises(ImportCollisionError, match=login):
+                importer.run(records, ImportReport(source="second"))
+
+
+class TestExport:
+    """Test NDJSON export endpoints."""
+
+    async def test_export_users(self, app_client, superadmin_token):
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        response = app_client.get("/api/v1/export/users", headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        assert response.is_streamed
+        users = [json.loads(line) for line in response.data.splitlines()]
+        assert "superuser" in {user["login"] for user in users}
+
+        headers["Accept-Encoding"] = "gzip"
+        response = app_client.get(
+            "/api/v1/export/users", query_string={"role": "admin"}, headers=headers
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        for line in gzip.decompress(response.data).splitlines():
+            assert "admin" in json.loads(line)["roles"]
+
+    async def test_export_users_rejects_dates(self, app_client, superadmin_token):
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        response = app_client.get(
+            "/api/v1/export/users",
+            query_string={"since": datetime.utcnow().isoformat()},
+            headers=headers,
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    async def test_export_sessions(self, app_client, superadmin_token):
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        since = datetime.utcnow() - timedelta(days=1)
+        response = app_client.get(
+            "/api/v1/export/sessions",
+            query_string={"since": since.isoformat()},
+            headers=headers,
+        )
+        assert response.status_code == HTTPStatus.OK
+        sessions = [json.loads(line) for line in response.data.splitlines()]
+        assert sessions
+        assert all(item["auth_date"] >= since.isoformat() for item in sessions)
+
+
+class TestSerialization:
+    """Test fast serialization backend gives the same body as pydantic."""
+
+    async def test_orjson_matches_pydantic(self, app_client):
+        page = {
+            "count": 1,
+            "count_is_estimate": True,
+            "total_pages": 1,
+            "page": 1,
+            "next_after": None,
+            "results": [
+                {
+                    "user": {"id": uuid4(), "login": "Тест"},
+                    "roles": [{"id": 1, "name": "admin"}],
+                }
+            ],
+        }
+        history = [
+            {"user_agent": "test", "auth_date": datetime(2022, 3, 1, 12, 30, 15, 5)},
+            {"user_agent": "test", "auth_date": datetime(2022, 3, 1)},
+        ]
+        backends = [
+            Serializer(SerializationSettings(backend=backend))
+            for backend in SerializationSettings.Backend
+        ]
+        with app_client.application.app_context():
+            pages = [item.response(page, PaginationUsersBody) for item in backends]
+            histories = [
+                item.response(history, HistoryBody, many=True) for item in backends
+            ]
+        assert len({json.dumps(item.get_json()) for item in pages}) == 1
+        assert len({json.dumps(item.get_json()) for item in histories}) == 1
+
+
+@pytest.fixture(name="replica")
+def replica_fixture(app_client):
+    """Route replica reads to a separate engine of the same database."""
+    app = app_client.application
+    binds = app.config["SQLALCHEMY_BINDS"]
+    app.config["SQLALCHEMY_BINDS"] = {
+        "replica_0": app.config["SQLALCHEMY_DATABASE_URI"]
+    }
+    with app.app_context():
+        engine = db.get_engine(app, bind="replica_0")
+    statements: List[str] = []
+
+    def collect(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", collect)
+    yield statements
+    event.remove(engine, "before_cursor_execute", collect)
+    app.config["SQLALCHEMY_BINDS"] = binds
+
+
+class TestReplicaRouting:
+    """Test read-only handlers are served by replicas."""
+
+    async def test_users_list_reads_replica(
+        self, app_client, replica, superadmin_token: str
+    ):
+        headers = {"Authorization": f"Bearer {superadmin_token}"}
+        response = app_client.get(f"{PATH}/", headers=headers)
+        assert response.status_code == HTTPStatus.OK
+        assert replica
+        # Lagging replica data must not be tagged with current version
+        assert "ETag" not in response.headers
+
+    async def test_reads_own_writes(self, app_client, replica):
+        with app_client.application.test_request_context(), replica_reads():
+            db.session.execute(select(1))
+            assert read_from_replica()
+            reads = len(replica)
+            db.session.execute(update(User).where(false()).values(login="x"))
+            db.session.execute(select(1))
+            db.session.rollback()
+        assert len(replica) == reads
+
+    async def test_lookup_keeps_primary_reads_fresh(
+        self, app_client, replica, count_queries, temp_user: UserBody
+    ):
+        """Test user looked up on replica is not reused by primary reads."""
+        with app_client.application.test_request_context():
+            assert load_user_from_replica(temp_user.id)
+            assert replica
+            with count_queries() as statements:
+                user = User.query.get(temp_user.id)
+            db.session.rollback()
+        assert user is not None
+        assert statements